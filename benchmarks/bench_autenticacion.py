@@ -0,0 +1,264 @@
+# benchmarks/bench_autenticacion.py
+"""
+Benchmark de carga del sistema de autenticación.
+
+Genera N usuarios sintéticos y ejecuta validar_credenciales, crear_usuario,
+cambiar_password y listar_usuarios desde muchos hilos concurrentes sobre un
+directorio de datos temporal (nunca toca data/ del proyecto). Informa de
+latencias p50/p95/p99, throughput y actualizaciones perdidas.
+
+Solo usa la API pública de controllers/auth.py, en un proceso aparte con
+el temporal como directorio de trabajo: el mismo script sirve para
+comparar el almacén CSV histórico con el de SQLite (--salida en cada uno).
+
+Uso:
+    python -m benchmarks.bench_autenticacion --usuarios 200 --hilos 16
+    python -m benchmarks.bench_autenticacion --salida antes.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+
+class RegistroLatencias:
+    """Acumula latencias (segundos) y errores por operación de forma thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}
+        self.errores = {}
+        self.duracion_fase = {}
+
+    def anotar(self, operacion, segundos, exito):
+        with self._lock:
+            self.latencias.setdefault(operacion, []).append(segundos)
+            if not exito:
+                self.errores[operacion] = self.errores.get(operacion, 0) + 1
+
+    def resumen(self):
+        resultado = {}
+        for operacion, valores in self.latencias.items():
+            arr = np.array(valores) * 1000.0
+            duracion = self.duracion_fase.get(operacion, 0.0)
+            resultado[operacion] = {
+                'llamadas': len(valores),
+                'errores': self.errores.get(operacion, 0),
+                'p50_ms': float(np.percentile(arr, 50)),
+                'p95_ms': float(np.percentile(arr, 95)),
+                'p99_ms': float(np.percentile(arr, 99)),
+                'max_ms': float(arr.max()),
+                'throughput_ops_s': float(len(valores) / duracion) if duracion > 0 else 0.0,
+            }
+        return resultado
+
+
+def generar_usuarios(n, semilla=42):
+    """Genera n usuarios sintéticos con contraseña y rol aleatorios"""
+    rng = random.Random(semilla)
+    roles = ["entrenador", "visor", "admin"]
+    usuarios = []
+    for i in range(n):
+        sufijo = ''.join(rng.choices(string.ascii_lowercase, k=4))
+        usuarios.append({
+            'usuario': f"bench_{i:05d}_{sufijo}",
+            'password': ''.join(rng.choices(string.ascii_letters + string.digits, k=10)),
+            'rol': rng.choice(roles),
+            'nombre_completo': f"Usuario Benchmark {i}",
+            'email': f"bench{i}@ejemplo.com",
+        })
+    return usuarios
+
+
+def _ejecutar_fase(registro, operacion, tareas, n_hilos):
+    """Lanza las tareas (callables que devuelven exito) en un pool y anota sus latencias"""
+    def ejecutar(tarea):
+        inicio = time.perf_counter()
+        try:
+            exito = tarea()
+        except Exception:
+            exito = False
+        registro.anotar(operacion, time.perf_counter() - inicio, exito)
+
+    inicio_fase = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_hilos) as pool:
+        list(pool.map(ejecutar, tareas))
+    registro.duracion_fase[operacion] = time.perf_counter() - inicio_fase
+
+
+def _medir(directorio, n_usuarios, n_hilos, rondas_bcrypt, validaciones_por_usuario, semilla):
+    """
+    Cuerpo del benchmark. Se ejecuta en un proceso nuevo con directorio como
+    directorio de trabajo: controllers.auth arranca sin estado y sus rutas
+    relativas (data/...) caen en el temporal. Solo usa la API pública de
+    controllers/auth.py, así que mide igual cualquier almacén de usuarios.
+    """
+    os.chdir(directorio)
+    os.makedirs("data", exist_ok=True)
+
+    import bcrypt
+    gensalt_original = bcrypt.gensalt
+    bcrypt.gensalt = lambda rounds=rondas_bcrypt, prefix=b"2b": gensalt_original(rounds, prefix)
+
+    from controllers import auth
+    auth.inicializar_sistema_usuarios()
+
+    usuarios = generar_usuarios(n_usuarios, semilla)
+    registro = RegistroLatencias()
+    rng = random.Random(semilla)
+
+    # Fase 1: altas concurrentes
+    creados = set()
+    lock_creados = threading.Lock()
+
+    def tarea_crear(u):
+        def tarea():
+            exito, _ = auth.crear_usuario(u['usuario'], u['password'], u['rol'],
+                                          u['nombre_completo'], u['email'])
+            if exito:
+                with lock_creados:
+                    creados.add(u['usuario'])
+            return exito
+        return tarea
+
+    _ejecutar_fase(registro, 'crear_usuario', [tarea_crear(u) for u in usuarios], n_hilos)
+
+    # Fase 2: logins concurrentes (mezcla de correctos e incorrectos)
+    def tarea_validar(u, correcta):
+        def tarea():
+            password = u['password'] if correcta else u['password'] + "x"
+            valido, _, _ = auth.validar_credenciales(u['usuario'], password)
+            return valido == correcta
+        return tarea
+
+    tareas = [tarea_validar(u, rng.random() < 0.8)
+              for u in usuarios for _ in range(validaciones_por_usuario)]
+    rng.shuffle(tareas)
+    _ejecutar_fase(registro, 'validar_credenciales', tareas, n_hilos)
+
+    # Fase 3: cambios de contraseña concurrentes
+    nuevas = {u['usuario']: u['password'] + "_v2" for u in usuarios}
+
+    def tarea_cambiar(u):
+        def tarea():
+            exito, _ = auth.cambiar_password(u['usuario'], u['password'], nuevas[u['usuario']])
+            return exito
+        return tarea
+
+    _ejecutar_fase(registro, 'cambiar_password', [tarea_cambiar(u) for u in usuarios], n_hilos)
+
+    # Fase 4: listados concurrentes
+    _ejecutar_fase(registro, 'listar_usuarios',
+                   [lambda: not auth.listar_usuarios().empty for _ in range(max(n_hilos * 4, 20))],
+                   n_hilos)
+
+    # Verificación de actualizaciones perdidas
+    df_final = auth.listar_usuarios()
+    presentes = set(df_final['usuario']) if not df_final.empty else set()
+    altas_perdidas = len(creados - presentes)
+
+    passwords_perdidas = 0
+    for u in usuarios:
+        if u['usuario'] in creados:
+            valido, _, _ = auth.validar_credenciales(u['usuario'], nuevas[u['usuario']])
+            if not valido:
+                passwords_perdidas += 1
+
+    return {
+        'operaciones': registro.resumen(),
+        'actualizaciones_perdidas': {
+            'altas': altas_perdidas,
+            'cambios_password': passwords_perdidas,
+            'usuarios_esperados': len(creados) + 1,  # + admin
+            'usuarios_presentes': len(presentes),
+        },
+    }
+
+
+def ejecutar_benchmark(n_usuarios=200, n_hilos=16, rondas_bcrypt=4, validaciones_por_usuario=3,
+                       semilla=42, directorio=None):
+    """
+    Ejecuta el benchmark completo y devuelve un diccionario con el informe.
+    rondas_bcrypt: coste de bcrypt.gensalt. El valor de producción es 12; con
+    valores bajos se mide el coste del almacén y no el del hash.
+    """
+    directorio_propio = directorio is None
+    directorio = os.path.abspath(directorio or tempfile.mkdtemp(prefix="bench_auth_"))
+
+    try:
+        # spawn: proceso limpio, sin el estado de auth de quien llama
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            resultado = pool.submit(
+                _medir, directorio, n_usuarios, n_hilos, rondas_bcrypt, validaciones_por_usuario, semilla
+            ).result()
+    finally:
+        if directorio_propio:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    return {
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'parametros': {
+            'usuarios': n_usuarios,
+            'hilos': n_hilos,
+            'rondas_bcrypt': rondas_bcrypt,
+            'validaciones_por_usuario': validaciones_por_usuario,
+            'semilla': semilla,
+        },
+        **resultado,
+    }
+
+
+def imprimir_informe(informe):
+    print(f"\n🔐 Benchmark de autenticación ({informe['fecha']})")
+    p = informe['parametros']
+    print(f"   usuarios={p['usuarios']} hilos={p['hilos']} rondas_bcrypt={p['rondas_bcrypt']}\n")
+    print(f"{'operación':<22}{'llamadas':>9}{'errores':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}")
+    for operacion, m in informe['operaciones'].items():
+        print(f"{operacion:<22}{m['llamadas']:>9}{m['errores']:>9}{m['p50_ms']:>10.2f}"
+              f"{m['p95_ms']:>10.2f}{m['p99_ms']:>10.2f}{m['throughput_ops_s']:>10.1f}")
+    perdidas = informe['actualizaciones_perdidas']
+    print(f"\nActualizaciones perdidas: altas={perdidas['altas']} "
+          f"cambios_password={perdidas['cambios_password']} "
+          f"({perdidas['usuarios_presentes']}/{perdidas['usuarios_esperados']} usuarios presentes)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de carga de la autenticación")
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--hilos", type=int, default=16)
+    parser.add_argument("--rondas-bcrypt", type=int, default=4,
+                        help="Coste de bcrypt (producción: 12)")
+    parser.add_argument("--validaciones", type=int, default=3,
+                        help="Logins por usuario en la fase de validación")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", help="Ruta del informe JSON")
+    args = parser.parse_args(argv)
+
+    informe = ejecutar_benchmark(args.usuarios, args.hilos, args.rondas_bcrypt,
+                                 args.validaciones, args.semilla)
+    imprimir_informe(informe)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"\n📄 Informe guardado en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# benchmarks/bench_motores.py
+"""
+Benchmark de los motores de entrenamiento del predictor táctico.
+
+Compara el motor "multioutput" (un RandomForest por principio) con el motor
+"nativo" (un único RandomForest multi-etiqueta) sobre los mismos datos:
+tiempo de entrenamiento, latencia de predicción (por franja y por microciclo
+completo), tamaño del fichero del modelo y accuracy/F1 sobre el conjunto de
+prueba, más el acierto top-5 (fracción de las sugerencias que el histórico
+contiene para esa franja). También se mide el artefacto de inferencia .npz
+(tamaño y tiempo de carga en frío sin scikit-learn). Los modelos se guardan en un
+directorio temporal (nunca en models/).
+
+Uso:
+    python -m benchmarks.bench_motores
+    python -m benchmarks.bench_motores --sintetico --registros 20000 --principios 300
+    python -m benchmarks.bench_motores --salida motores.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+PLANIFICACION_CSV = os.path.join(BASE_DIR, "data", "planificacion_microciclos.csv")
+
+
+def generar_planificacion_sintetica(n_registros=5000, n_principios=120, n_categorias=15, semilla=42):
+    """
+    Genera un histórico de planificación con estructura aprendible: cada
+    (categoría, bloque) tiene un pequeño conjunto de principios preferidos.
+    """
+    from controllers.modelo_prediccion import DIAS_SEMANA, BLOQUES_SESION
+
+    rng = random.Random(semilla)
+    categorias = [f"Categoria {i:02d}" for i in range(n_categorias)]
+    principios = [f"Principio {i:04d}" for i in range(n_principios)]
+    preferidos = {
+        (c, b): rng.sample(principios, k=min(8, n_principios))
+        for c in categorias for b in BLOQUES_SESION
+    }
+
+    filas = []
+    for _ in range(n_registros):
+        categoria = rng.choice(categorias)
+        bloque = rng.choice(BLOQUES_SESION)
+        principio = rng.choice(preferidos[(categoria, bloque)]) if rng.random() < 0.8 else rng.choice(principios)
+        filas.append({
+            'id_temporada': 1,
+            'categoria': categoria,
+            'microciclo': f"Microciclo {rng.randint(1, 40)}",
+            'dia': rng.choice(DIAS_SEMANA),
+            'bloque': bloque,
+            'principio': principio,
+        })
+    return pd.DataFrame(filas)
+
+
+def _percentiles_ms(valores):
+    arr = np.array(valores) * 1000.0
+    return {
+        'p50_ms': float(np.percentile(arr, 50)),
+        'p95_ms': float(np.percentile(arr, 95)),
+        'max_ms': float(arr.max()),
+    }
+
+
+def medir_motor(motor, df, directorio, muestras_franja=100, repeticiones_microciclo=3, semilla=42):
+    """Entrena con el motor indicado y mide entrenamiento, tamaño y latencias"""
+    from controllers.modelo_prediccion import PredictorTactico
+    from controllers.registro_modelos import FICHERO_ARBOLES
+
+    ruta = os.path.join(directorio, f"predictor_{motor}.pkl")
+    predictor = PredictorTactico(model_path=ruta, motor=motor)
+
+    inicio = time.perf_counter()
+    exito, mensaje = predictor.entrenar_modelo(df.copy())
+    tiempo_entrenamiento = time.perf_counter() - inicio
+    if not exito:
+        return {'motor': motor, 'error': mensaje}
+
+    stats = predictor.obtener_estadisticas_modelo()
+    
+    # Carga en frío desde el registro (artefacto .npz, sin unpickle)
+    inicio = time.perf_counter()
+    en_frio = PredictorTactico(model_path=ruta, motor=motor)
+    en_frio._asegurar_artefacto()
+    tiempo_carga = time.perf_counter() - inicio
+    ruta_npz = en_frio.registro.ruta_fichero(en_frio.version_activa, FICHERO_ARBOLES)
+
+    # Latencia por franja, sin caché: muestra de combinaciones vistas (misma para ambos motores)
+    categorias = stats.get('categorias', [])
+    combinaciones = [(c, b, d) for c in categorias
+                     for b in stats.get('bloques', []) for d in stats.get('dias', [])]
+    combinaciones = random.Random(semilla).sample(combinaciones, min(muestras_franja, len(combinaciones)))
+
+    # Principios reales por franja para medir la calidad del ranking (top-5)
+    reales = df.astype({'categoria': str, 'bloque': str, 'dia': str}).groupby(
+        ['categoria', 'bloque', 'dia'])['principio'].apply(set).to_dict()
+
+    latencias_franja = []
+    aciertos_top5 = []
+    for categoria, bloque, dia in combinaciones:
+        inicio = time.perf_counter()
+        sugerencias, _, _ = predictor._predecir_principios_sin_cache(categoria, bloque, dia)
+        latencias_franja.append(time.perf_counter() - inicio)
+        esperados = reales.get((categoria, bloque, dia), set())
+        if esperados:
+            acertadas = sum(1 for s in sugerencias if s['principio'] in esperados)
+            aciertos_top5.append(acertadas / min(5, len(esperados)))
+
+    # Latencia del microciclo completo (35 franjas en un lote)
+    latencias_microciclo = []
+    for _ in range(repeticiones_microciclo):
+        for categoria in categorias[:5]:
+            inicio = time.perf_counter()
+            predictor.predecir_microciclo(categoria)
+            latencias_microciclo.append(time.perf_counter() - inicio)
+
+    return {
+        'motor': motor,
+        'tiempo_entrenamiento_s': tiempo_entrenamiento,
+        'tamano_modelo_kb': os.path.getsize(predictor.ruta_artefacto()) / 1024.0,
+        'tamano_numpy_kb': os.path.getsize(ruta_npz) / 1024.0 if os.path.exists(ruta_npz) else None,
+        'carga_en_frio_s': tiempo_carga,
+        'accuracy': stats.get('accuracy', 0.0),
+        'f1_score': stats.get('f1_score', 0.0),
+        'acierto_top5': float(np.mean(aciertos_top5)) if aciertos_top5 else 0.0,
+        'total_principios': stats.get('total_principios', 0),
+        'combinaciones_unicas': stats.get('combinaciones_unicas', 0),
+        'prediccion_franja': _percentiles_ms(latencias_franja) if latencias_franja else {},
+        'prediccion_microciclo': _percentiles_ms(latencias_microciclo) if latencias_microciclo else {},
+    }
+
+
+def ejecutar_benchmark(df, motores=None, muestras_franja=100):
+    """Ejecuta el benchmark de todos los motores sobre el mismo DataFrame"""
+    from controllers.modelo_prediccion import MOTORES_DISPONIBLES
+
+    motores = motores or MOTORES_DISPONIBLES
+    directorio = tempfile.mkdtemp(prefix="bench_motores_")
+    try:
+        resultados = [medir_motor(motor, df, directorio, muestras_franja) for motor in motores]
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    return {
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'registros': len(df),
+        'motores': resultados,
+    }
+
+
+def imprimir_informe(informe):
+    print(f"\n🌲 Benchmark de motores ({informe['fecha']}) — {informe['registros']:,} registros\n")
+    print(f"{'motor':<13}{'fit s':>9}{'KB':>11}{'KB npz':>9}{'carga s':>9}{'acc':>7}{'F1':>7}{'top5':>7}"
+          f"{'franja p50':>12}{'franja p95':>12}{'semana p50':>12}")
+    for r in informe['motores']:
+        if 'error' in r:
+            print(f"{r['motor']:<13}ERROR: {r['error']}")
+            continue
+        franja = r['prediccion_franja']
+        semana = r['prediccion_microciclo']
+        print(f"{r['motor']:<13}{r['tiempo_entrenamiento_s']:>9.2f}{r['tamano_modelo_kb']:>11.0f}"
+              f"{r['tamano_numpy_kb'] or 0:>9.0f}{r['carga_en_frio_s']:>9.3f}"
+              f"{r['accuracy']:>7.2f}{r['f1_score']:>7.2f}{r['acierto_top5']:>7.2f}"
+              f"{franja.get('p50_ms', 0):>10.2f}ms{franja.get('p95_ms', 0):>10.2f}ms"
+              f"{semana.get('p50_ms', 0):>10.2f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de motores del predictor táctico")
+    parser.add_argument("--sintetico", action="store_true",
+                        help="Usar datos sintéticos en lugar de data/planificacion_microciclos.csv")
+    parser.add_argument("--registros", type=int, default=5000)
+    parser.add_argument("--principios", type=int, default=120)
+    parser.add_argument("--categorias", type=int, default=15)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--muestras", type=int, default=100,
+                        help="Franjas muestreadas para la latencia por franja")
+    parser.add_argument("--salida", help="Ruta del informe JSON")
+    args = parser.parse_args(argv)
+
+    if args.sintetico or not os.path.exists(PLANIFICACION_CSV):
+        df = generar_planificacion_sintetica(args.registros, args.principios, args.categorias, args.semilla)
+    else:
+        df = pd.read_csv(PLANIFICACION_CSV)
+
+    informe = ejecutar_benchmark(df, muestras_franja=args.muestras)
+    imprimir_informe(informe)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"\n📄 Informe guardado en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+# benchmarks/bench_predictor.py
+"""
+Benchmark del predictor táctico a distintos tamaños del histórico.
+
+Genera históricos de planificación sintéticos con la forma de los reales
+(categorías × temporadas × semanas × franjas día/bloque, con tantos
+principios posibles como el glosario) a varias escalas del histórico actual
+(por defecto 1×, 10× y 100× FILAS_BASE) y, para cada una, mide:
+    - entrenar_modelo: tiempo y pico de memoria (tracemalloc)
+    - tamaño del artefacto (.pkl y .npz de la versión) y carga en frío
+    - predecir_principios: latencia por franja (sin caché) y por microciclo
+      completo (predecir_microciclo, 35 franjas en un lote)
+    - analizar_similitud_microciclos y predecir_carga_semanal: primera
+      llamada (construye el índice/cubo) y consultas siguientes (p50/p95)
+
+El informe JSON incluye el commit y las versiones de las librerías, y con
+--comparar se contrasta con el de otra versión. Todo se ejecuta con el
+directorio de trabajo en un temporal: el modelo, el registro y los índices
+derivados (data/indices/) nunca se escriben en el repositorio.
+
+Uso:
+    python -m benchmarks.bench_predictor
+    python -m benchmarks.bench_predictor --escalas 1 10 100 1000
+    python -m benchmarks.bench_predictor --salida predictor.json --comparar anterior.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from benchmarks.bench_motores import _percentiles_ms
+
+GLOSARIO_CSV = os.path.join(BASE_DIR, "data", "glosario_tactico.csv")
+
+# Filas de data/planificacion_microciclos.csv cuando se añadió el benchmark
+FILAS_BASE = 136
+ESCALAS_POR_DEFECTO = [1, 10, 100]
+
+# Forma de una semana real: ~4 días de entrenamiento, ~2 bloques por día,
+# 1-3 principios por bloque (≈ 17 filas por microciclo)
+SEMANAS_TEMPORADA = 40
+SEMANAS_FASE = 10
+PRINCIPIOS_GLOSARIO = 61
+CATEGORIAS_CLUB = [
+    "Prebenjamín A", "Benjamín A", "Benjamín B", "Alevín A", "Alevín B",
+    "Infantil A", "Infantil B", "Cadete A", "Cadete B", "Juvenil A",
+    "Juvenil B", "Juvenil C", "Juvenil D", "Reserva / Equipo B",
+]
+TEMPORADA_INICIAL = 27
+
+# Métricas que se contrastan con --comparar (las de percentiles, por su p50)
+METRICAS_COMPARABLES = [
+    'entrenamiento_s', 'pico_memoria_mb', 'tamano_modelo_kb', 'tamano_numpy_kb', 'carga_en_frio_s',
+    'prediccion_franja', 'prediccion_microciclo',
+    'similitud_primera_s', 'similitud_consulta',
+    'carga_primera_s', 'carga_consulta',
+]
+
+
+def principios_glosario():
+    """Principios del glosario; si no está, tantos nombres sintéticos como tiene"""
+    try:
+        principios = pd.read_csv(GLOSARIO_CSV)['principio'].dropna().astype(str).str.strip().tolist()
+    except (OSError, KeyError, ValueError):
+        principios = []
+    return principios or [f"Principio {i:03d}" for i in range(PRINCIPIOS_GLOSARIO)]
+
+
+def generar_historico(n_filas, n_categorias=len(CATEGORIAS_CLUB), principios=None, semilla=42):
+    """
+    Histórico sintético de al menos n_filas filas, semana a semana: por cada
+    temporada y semana, un microciclo de cada categoría. Cada categoría
+    entrena unos días fijos y tiene principios preferidos por bloque que
+    cambian con la fase de la temporada (cada SEMANAS_FASE semanas).
+    Los nombres de microciclo incluyen categoría y temporada para que cada
+    semana sea un microciclo distinto al buscar similares.
+    """
+    from controllers.modelo_prediccion import DIAS_SEMANA, BLOQUES_SESION
+
+    rng = random.Random(semilla)
+    principios = principios or principios_glosario()
+    categorias = (CATEGORIAS_CLUB * (n_categorias // len(CATEGORIAS_CLUB) + 1))[:n_categorias]
+    categorias = [c if i < len(CATEGORIAS_CLUB) else f"{c} {i // len(CATEGORIAS_CLUB) + 1}"
+                  for i, c in enumerate(categorias)]
+    n_fases = -(-SEMANAS_TEMPORADA // SEMANAS_FASE)
+
+    dias_categoria = {c: sorted(rng.sample(range(6), k=rng.choice([3, 4, 4, 5]))) for c in categorias}
+    preferidos = {
+        (c, b, f): rng.sample(principios, k=min(6, len(principios)))
+        for c in categorias for b in BLOQUES_SESION for f in range(n_fases)
+    }
+
+    filas = []
+    temporada = TEMPORADA_INICIAL
+    while len(filas) < n_filas:
+        for semana in range(SEMANAS_TEMPORADA):
+            fase = semana // SEMANAS_FASE
+            for categoria in categorias:
+                nombre = f"{categoria} T{temporada} Semana {semana + 1}"
+                for d in dias_categoria[categoria]:
+                    for bloque in rng.sample(BLOQUES_SESION, k=rng.choice([1, 2, 2, 3])):
+                        for _ in range(rng.choice([1, 2, 2, 3])):
+                            if rng.random() < 0.8:
+                                principio = rng.choice(preferidos[(categoria, bloque, fase)])
+                            else:
+                                principio = rng.choice(principios)
+                            filas.append((temporada, categoria, nombre, DIAS_SEMANA[d], bloque, principio))
+                if len(filas) >= n_filas:
+                    break
+            if len(filas) >= n_filas:
+                break
+        temporada += 1
+
+    df = pd.DataFrame(filas, columns=['id_temporada', 'categoria', 'nombre_microciclo', 'dia', 'bloque', 'principio'])
+    df['principios'] = df['principio']
+    return df
+
+
+@contextlib.contextmanager
+def _en_directorio(directorio):
+    """Directorio de trabajo temporal: las rutas relativas (data/indices/) caen en él"""
+    anterior = os.getcwd()
+    os.chdir(directorio)
+    try:
+        yield
+    finally:
+        os.chdir(anterior)
+
+
+def _medir_llamadas(funcion, argumentos):
+    latencias = []
+    for args in argumentos:
+        inicio = time.perf_counter()
+        funcion(*args)
+        latencias.append(time.perf_counter() - inicio)
+    return _percentiles_ms(latencias) if latencias else {}
+
+
+def medir_tamano(df, directorio, escala=None, muestras=100, repeticiones_microciclo=3,
+                 medir_memoria=True, semilla=42):
+    """Entrena sobre df y mide entrenamiento, artefacto y latencias de consulta"""
+    from controllers.modelo_prediccion import PredictorTactico, UMBRAL_SIMILITUD_APROXIMADA
+    from controllers.registro_modelos import FICHERO_ARBOLES
+
+    rng = random.Random(semilla)
+    resultado = {
+        'escala': escala,
+        'filas': len(df),
+        'categorias': int(df['categoria'].nunique()),
+        'microciclos': int(df['nombre_microciclo'].nunique()),
+        'principios': int(df['principio'].nunique()),
+    }
+
+    ruta = os.path.join(directorio, "predictor.pkl")
+    predictor = PredictorTactico(model_path=ruta)
+
+    # Entrenamiento (el pico es el de las asignaciones que ve tracemalloc:
+    # Python y numpy; lo que reserva internamente scikit-learn no cuenta)
+    if medir_memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    exito, mensaje = predictor.entrenar_modelo(df.copy())
+    resultado['entrenamiento_s'] = time.perf_counter() - inicio
+    if medir_memoria:
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        resultado['pico_memoria_mb'] = pico / (1024.0 * 1024.0)
+    if not exito:
+        resultado['error'] = mensaje
+        return resultado
+
+    stats = predictor.obtener_estadisticas_modelo()
+    resultado['combinaciones_unicas'] = stats.get('combinaciones_unicas', 0)
+
+    # Artefacto de la versión y carga en frío desde el registro
+    inicio = time.perf_counter()
+    en_frio = PredictorTactico(model_path=ruta)
+    en_frio._asegurar_artefacto()
+    resultado['carga_en_frio_s'] = time.perf_counter() - inicio
+    ruta_npz = en_frio.registro.ruta_fichero(en_frio.version_activa, FICHERO_ARBOLES)
+    resultado['tamano_modelo_kb'] = os.path.getsize(predictor.ruta_artefacto()) / 1024.0
+    resultado['tamano_numpy_kb'] = os.path.getsize(ruta_npz) / 1024.0 if os.path.exists(ruta_npz) else None
+
+    # predecir_principios: por franja sin caché y microciclo completo en un lote
+    categorias = stats.get('categorias', [])
+    combinaciones = [(c, b, d) for c in categorias
+                     for b in stats.get('bloques', []) for d in stats.get('dias', [])]
+    combinaciones = rng.sample(combinaciones, min(muestras, len(combinaciones)))
+    resultado['prediccion_franja'] = _medir_llamadas(predictor._predecir_principios_sin_cache, combinaciones)
+
+    # Como el editor: temporada = id_temporada numérico (no 'AAAA-MM')
+    temporada = df['id_temporada'].iloc[0]
+    sugerencias, mensaje = predictor.predecir_microciclo(categorias[0], temporada)
+    if not any(sugerencias.values()):
+        resultado['error'] = f"predecir_microciclo con temporada={temporada}: {mensaje}"
+        return resultado
+    resultado['prediccion_microciclo'] = _medir_llamadas(
+        predictor.predecir_microciclo,
+        [(c, temporada) for _ in range(repeticiones_microciclo) for c in categorias[:5]],
+    )
+
+    # Similares: la primera llamada construye (y guarda) el índice disperso
+    nombres = sorted(df['nombre_microciclo'].astype(str).unique())
+    referencias = rng.sample(nombres, min(muestras, len(nombres)))
+    inicio = time.perf_counter()
+    predictor.analizar_similitud_microciclos(df, referencias[0])
+    resultado['similitud_primera_s'] = time.perf_counter() - inicio
+    resultado['similitud_aproximada'] = len(nombres) >= UMBRAL_SIMILITUD_APROXIMADA
+    resultado['similitud_consulta'] = _medir_llamadas(
+        predictor.analizar_similitud_microciclos, [(df, nombre) for nombre in referencias])
+
+    # Carga semanal: la primera llamada construye (y guarda) el cubo
+    todas = sorted(df['categoria'].astype(str).unique())
+    inicio = time.perf_counter()
+    predictor.predecir_carga_semanal(df, todas[0])
+    resultado['carga_primera_s'] = time.perf_counter() - inicio
+    resultado['carga_consulta'] = _medir_llamadas(
+        predictor.predecir_carga_semanal, [(df, c) for _ in range(repeticiones_microciclo) for c in todas])
+
+    return resultado
+
+
+def _version_codigo():
+    """Commit actual del repositorio (None si no hay git)"""
+    try:
+        salida = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+            capture_output=True, text=True, timeout=10,
+        )
+        if salida.returncode != 0:
+            return None
+        return salida.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _entorno():
+    import sklearn
+
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'cpus': os.cpu_count(),
+    }
+
+
+def ejecutar_benchmark(escalas=None, filas_base=FILAS_BASE, n_categorias=len(CATEGORIAS_CLUB),
+                       muestras=100, medir_memoria=True, semilla=42):
+    """Genera un histórico por escala y lo mide; cada escala en su propio temporal"""
+    escalas = escalas or ESCALAS_POR_DEFECTO
+    principios = principios_glosario()
+
+    # Calentamiento: las importaciones de scikit-learn y las primeras
+    # llamadas no deben cargarse a la primera escala
+    directorio = tempfile.mkdtemp(prefix="bench_predictor_")
+    try:
+        with _en_directorio(directorio):
+            medir_tamano(generar_historico(filas_base, n_categorias, principios, semilla), directorio,
+                         muestras=5, repeticiones_microciclo=1, medir_memoria=False, semilla=semilla)
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    resultados = []
+    for escala in escalas:
+        df = generar_historico(int(filas_base * escala), n_categorias, principios, semilla)
+        directorio = tempfile.mkdtemp(prefix="bench_predictor_")
+        try:
+            with _en_directorio(directorio):
+                resultados.append(medir_tamano(df, directorio, escala, muestras,
+                                               medir_memoria=medir_memoria, semilla=semilla))
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+    return {
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'version': _version_codigo(),
+        'entorno': _entorno(),
+        'parametros': {
+            'filas_base': filas_base,
+            'categorias': n_categorias,
+            'principios_glosario': len(principios),
+            'muestras': muestras,
+            'semilla': semilla,
+        },
+        'tamanos': resultados,
+    }
+
+
+def _valor_comparable(resultado, metrica):
+    valor = resultado.get(metrica)
+    if isinstance(valor, dict):
+        valor = valor.get('p50_ms')
+    return float(valor) if isinstance(valor, (int, float)) else None
+
+
+def comparar_informes(actual, anterior):
+    """
+    Contrasta dos informes escala a escala (mismas filas_base y escala).
+    Retorna: lista de {escala, metrica, anterior, actual, ratio}; ratio > 1 = peor
+    """
+    previos = {r.get('escala'): r for r in anterior.get('tamanos', [])}
+    filas = []
+    for resultado in actual.get('tamanos', []):
+        previo = previos.get(resultado.get('escala'))
+        if previo is None:
+            continue
+        for metrica in METRICAS_COMPARABLES:
+            a, b = _valor_comparable(previo, metrica), _valor_comparable(resultado, metrica)
+            if a is None or b is None:
+                continue
+            filas.append({
+                'escala': resultado['escala'],
+                'metrica': metrica,
+                'anterior': a,
+                'actual': b,
+                'ratio': b / a if a > 0 else None,
+            })
+    return filas
+
+
+def imprimir_informe(informe):
+    print(f"\n📈 Benchmark del predictor ({informe['fecha']}, versión {informe['version'] or '?'})\n")
+    print(f"{'escala':>7}{'filas':>9}{'micro':>7}{'fit s':>8}{'MB':>8}{'KB pkl':>9}{'KB npz':>9}"
+          f"{'franja':>10}{'semana':>10}{'simil 1ª':>10}{'simil':>10}{'carga 1ª':>10}{'carga':>10}")
+    for r in informe['tamanos']:
+        if 'error' in r:
+            print(f"{r['escala']:>6}×{r['filas']:>9,}  ERROR: {r['error']}")
+            continue
+        print(f"{r['escala']:>6}×{r['filas']:>9,}{r['microciclos']:>7,}{r['entrenamiento_s']:>8.2f}"
+              f"{r.get('pico_memoria_mb', 0):>8.1f}{r['tamano_modelo_kb']:>9.0f}{r['tamano_numpy_kb'] or 0:>9.0f}"
+              f"{r['prediccion_franja'].get('p50_ms', 0):>8.2f}ms{r['prediccion_microciclo'].get('p50_ms', 0):>8.2f}ms"
+              f"{r['similitud_primera_s'] * 1000:>8.1f}ms{r['similitud_consulta'].get('p50_ms', 0):>8.2f}ms"
+              f"{r['carga_primera_s'] * 1000:>8.1f}ms{r['carga_consulta'].get('p50_ms', 0):>8.2f}ms")
+    print("\n(franja, semana, simil y carga: p50 por llamada; 1ª: primera llamada, construye índice/cubo)")
+
+
+def imprimir_comparacion(filas, version_anterior=None):
+    print(f"\n🔁 Comparación con la versión {version_anterior or '?'} (ratio > 1: más lento / más grande)\n")
+    print(f"{'escala':>7}  {'métrica':<24}{'anterior':>12}{'actual':>12}{'ratio':>8}")
+    for f in filas:
+        ratio = f"{f['ratio']:.2f}" if f['ratio'] is not None else "-"
+        print(f"{f['escala']:>6}×  {f['metrica']:<24}{f['anterior']:>12.3f}{f['actual']:>12.3f}{ratio:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del predictor táctico por tamaño del histórico")
+    parser.add_argument("--escalas", type=float, nargs="+", default=ESCALAS_POR_DEFECTO,
+                        help="Múltiplos de --filas-base a generar")
+    parser.add_argument("--filas-base", type=int, default=FILAS_BASE)
+    parser.add_argument("--categorias", type=int, default=len(CATEGORIAS_CLUB))
+    parser.add_argument("--muestras", type=int, default=100,
+                        help="Franjas y microciclos muestreados para las latencias")
+    parser.add_argument("--sin-memoria", action="store_true",
+                        help="No medir el pico de memoria (tracemalloc ralentiza el entrenamiento)")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", help="Ruta del informe JSON")
+    parser.add_argument("--comparar", help="Informe JSON de otra versión con el que comparar")
+    args = parser.parse_args(argv)
+
+    escalas = [int(e) if float(e).is_integer() else e for e in args.escalas]
+    informe = ejecutar_benchmark(escalas, args.filas_base, args.categorias, args.muestras,
+                                 not args.sin_memoria, args.semilla)
+    imprimir_informe(informe)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+        informe['comparacion'] = {
+            'version_anterior': anterior.get('version'),
+            'metricas': comparar_informes(informe, anterior),
+        }
+        imprimir_comparacion(informe['comparacion']['metricas'], anterior.get('version'))
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"\n📄 Informe guardado en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+# benchmarks/bench_procesos.py
+"""
+Benchmark del predictor con varios procesos (workers de Streamlit detrás de
+un proxy).
+
+Entrena un modelo sintético en un registro temporal y arranca N procesos a
+la vez que cargan la versión activa de una de dos formas:
+    - "npz": artefacto de inferencia mapeado en memoria (lo que hace
+      obtener_predictor): los árboles y la tabla de probabilidades se leen
+      de la caché de páginas, compartida por todos los procesos
+    - "pkl": deserializando el .pkl de la versión en cada proceso
+De cada proceso se mide el tiempo de carga y la memoria que añade la carga
+(RSS, PSS y privada, de /proc/self/smaps_rollup; solo en Linux). Con todos
+vivos a la vez, la PSS reparte las páginas compartidas entre ellos.
+
+También mide el cambio en caliente: un proceso consulta obtener_predictor()
+en bucle mientras se activa otra versión del registro, y se toma el tiempo
+hasta que predice con la nueva.
+
+Uso:
+    python -m benchmarks.bench_procesos
+    python -m benchmarks.bench_procesos --procesos 8 --escala 100
+    python -m benchmarks.bench_procesos --salida procesos.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from benchmarks.bench_predictor import FILAS_BASE, _en_directorio, generar_historico
+
+MODOS = ["npz", "pkl"]
+SMAPS_ROLLUP = "/proc/self/smaps_rollup"
+# Espera máxima del cambio en caliente
+TIMEOUT_CAMBIO_S = 60
+
+
+def memoria_proceso():
+    """RSS, PSS y memoria privada del proceso en MB (None fuera de Linux)"""
+    try:
+        with open(SMAPS_ROLLUP, encoding='ascii') as f:
+            campos = {}
+            for linea in f:
+                partes = linea.split()
+                if len(partes) == 3 and partes[2] == 'kB':
+                    campos[partes[0].rstrip(':')] = int(partes[1]) / 1024.0
+    except OSError:
+        return None
+    return {
+        'rss_mb': campos.get('Rss', 0.0),
+        'pss_mb': campos.get('Pss', 0.0),
+        'privada_mb': campos.get('Private_Clean', 0.0) + campos.get('Private_Dirty', 0.0),
+    }
+
+
+def _diferencia(despues, antes):
+    if despues is None or antes is None:
+        return None
+    return {clave: despues[clave] - antes[clave] for clave in despues}
+
+
+def _proceso_carga(directorio, modo, barrera, resultados):
+    """Carga la versión activa como indica modo, predice y mide (todos a la vez)"""
+    os.chdir(directorio)
+    from controllers.modelo_prediccion import PredictorTactico
+
+    antes = memoria_proceso()
+    inicio = time.perf_counter()
+    predictor = PredictorTactico()
+    if modo == "pkl":
+        cargado = predictor._cargar_pickle(predictor.version_activa)
+    else:
+        cargado = predictor._asegurar_artefacto()
+    tiempo_carga = time.perf_counter() - inicio
+
+    categoria = (predictor.stats.get('categorias') or [None])[0]
+    inicio = time.perf_counter()
+    predictor.predecir_microciclo(categoria)
+    primera_prediccion = time.perf_counter() - inicio
+
+    # Memoria con todos los procesos cargados, para que la PSS reparta lo compartido
+    barrera.wait()
+    despues = memoria_proceso()
+    resultados.put({
+        'modo': modo,
+        'cargado': bool(cargado),
+        'carga_s': tiempo_carga,
+        'primera_prediccion_s': primera_prediccion,
+        'memoria_mb': _diferencia(despues, antes),
+    })
+    barrera.wait()
+
+
+def medir_modo(directorio, modo, n_procesos):
+    contexto = multiprocessing.get_context("spawn")
+    barrera = contexto.Barrier(n_procesos)
+    resultados = contexto.Queue()
+    procesos = [
+        contexto.Process(target=_proceso_carga, args=(directorio, modo, barrera, resultados))
+        for _ in range(n_procesos)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    medidas = [resultados.get() for _ in procesos]
+    for proceso in procesos:
+        proceso.join()
+
+    def media(clave, sub=None):
+        valores = [m[clave][sub] if sub else m[clave] for m in medidas if m[clave] is not None]
+        return float(np.mean(valores)) if valores else None
+
+    return {
+        'modo': modo,
+        'procesos': n_procesos,
+        'cargados': sum(m['cargado'] for m in medidas),
+        'carga_s': media('carga_s'),
+        'primera_prediccion_s': media('primera_prediccion_s'),
+        'rss_mb': media('memoria_mb', 'rss_mb'),
+        'pss_mb': media('memoria_mb', 'pss_mb'),
+        'privada_mb': media('memoria_mb', 'privada_mb'),
+    }
+
+
+def _proceso_cambio(directorio, listo, activada, resultados):
+    """Consulta obtener_predictor() hasta que sirve la versión activada por el padre"""
+    os.chdir(directorio)
+    from controllers.modelo_prediccion import obtener_predictor
+
+    predictor = obtener_predictor()
+    categoria = (predictor.stats.get('categorias') or [None])[0]
+    predictor.predecir_microciclo(categoria)
+    inicial = predictor.model_id
+    listo.set()
+
+    limite = time.time() + TIMEOUT_CAMBIO_S
+    while time.time() < limite:
+        predictor = obtener_predictor()
+        if predictor.model_id != inicial:
+            predictor.predecir_microciclo(categoria)
+            resultados.put({'cambio_s': time.time() - activada.value, 'version': predictor.version_activa})
+            return
+        time.sleep(0.001)
+    resultados.put({'cambio_s': None, 'version': None})
+
+
+def medir_cambio_en_caliente(directorio, version):
+    """Activa version con un proceso sirviendo la anterior y mide cuánto tarda en servirla"""
+    from controllers.registro_modelos import RegistroModelos
+
+    contexto = multiprocessing.get_context("spawn")
+    listo = contexto.Event()
+    activada = contexto.Value('d', 0.0)
+    resultados = contexto.Queue()
+    proceso = contexto.Process(target=_proceso_cambio, args=(directorio, listo, activada, resultados))
+    proceso.start()
+    listo.wait(TIMEOUT_CAMBIO_S)
+
+    activada.value = time.time()
+    RegistroModelos(os.path.join(directorio, "models", "registro")).activar(version)
+    resultado = resultados.get()
+    proceso.join()
+    return dict(resultado, esperada=version)
+
+
+def ejecutar_benchmark(n_procesos=4, escala=100, modos=None, semilla=42):
+    """Registro temporal con dos versiones; mide cada modo de carga y el cambio en caliente"""
+    from controllers.modelo_prediccion import PredictorTactico
+    from controllers.registro_modelos import FICHERO_ARBOLES
+
+    modos = modos or MODOS
+    df = generar_historico(int(FILAS_BASE * escala), semilla=semilla)
+    directorio = tempfile.mkdtemp(prefix="bench_procesos_")
+    try:
+        with _en_directorio(directorio):
+            predictor = PredictorTactico()
+            exito, mensaje = predictor.entrenar_modelo(df.copy())
+            if not exito:
+                return {'error': mensaje}
+            version_inicial = predictor.version_activa
+            # Segunda versión (la que se activará en caliente); la primera queda activa
+            exito, mensaje = predictor.entrenar_modelo(df.sample(frac=0.9, random_state=semilla), forzar=True)
+            if not exito:
+                return {'error': mensaje}
+            version_nueva = predictor.version_activa
+            predictor.registro.activar(version_inicial)
+            tamanos = {
+                'pkl_kb': os.path.getsize(predictor.registro.ruta_modelo(version_inicial)) / 1024.0,
+                'npz_kb': os.path.getsize(predictor.registro.ruta_fichero(version_inicial, FICHERO_ARBOLES)) / 1024.0,
+            }
+
+        resultados = [medir_modo(directorio, modo, n_procesos) for modo in modos]
+        cambio = medir_cambio_en_caliente(directorio, version_nueva)
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    return {
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'registros': len(df),
+        'artefacto': tamanos,
+        'modos': resultados,
+        'cambio_en_caliente': cambio,
+    }
+
+
+def imprimir_informe(informe):
+    if 'error' in informe:
+        print(f"ERROR: {informe['error']}")
+        return
+    artefacto = informe['artefacto']
+    print(f"\n🧵 Benchmark multiproceso ({informe['fecha']}) — {informe['registros']:,} registros, "
+          f".pkl {artefacto['pkl_kb']:.0f} KB, .npz {artefacto['npz_kb']:.0f} KB\n")
+    print(f"{'modo':<6}{'procesos':>10}{'carga s':>10}{'1ª pred ms':>12}{'RSS MB':>10}{'PSS MB':>10}{'privada MB':>12}")
+    for r in informe['modos']:
+        memoria = [r[c] for c in ('rss_mb', 'pss_mb', 'privada_mb')]
+        memoria = "".join(f"{v:>10.1f}" if v is not None else f"{'-':>10}" for v in memoria)
+        print(f"{r['modo']:<6}{r['procesos']:>10}{r['carga_s']:>10.3f}{r['primera_prediccion_s'] * 1000:>12.2f}{memoria}")
+    print("\n(memoria: la que añade la carga del modelo en cada proceso, media)")
+
+    cambio = informe['cambio_en_caliente']
+    if cambio['cambio_s'] is None:
+        print(f"\n🔁 Cambio en caliente: sin cambio en {TIMEOUT_CAMBIO_S}s")
+    else:
+        print(f"\n🔁 Cambio en caliente: {cambio['cambio_s'] * 1000:.1f} ms hasta predecir con {cambio['version']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del predictor con varios procesos")
+    parser.add_argument("--procesos", type=int, default=4)
+    parser.add_argument("--escala", type=float, default=100,
+                        help="Tamaño del histórico sintético (múltiplo de FILAS_BASE)")
+    parser.add_argument("--modos", nargs="+", choices=MODOS, default=MODOS)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", help="Ruta del informe JSON")
+    args = parser.parse_args(argv)
+
+    informe = ejecutar_benchmark(args.procesos, args.escala, args.modos, args.semilla)
+    imprimir_informe(informe)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"\n📄 Informe guardado en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# benchmarks/bench_similitud.py
+"""
+Benchmark de la búsqueda de microciclos similares: exacta (índice disperso,
+producto matriz × vector sobre todos los microciclos) frente a aproximada
+(candidatos MinHash/LSH reordenados con la similitud exacta).
+
+Mide el tiempo de construcción de cada índice, la latencia por consulta
+(p50/p95), el número medio de candidatos y el recall@k de la búsqueda
+aproximada respecto a la exacta (fracción de los k resultados exactos que
+también devuelve la aproximada; los empates con el k-ésimo cuentan como
+acierto). Los índices se construyen en memoria, nunca en data/indices/.
+
+Uso:
+    python -m benchmarks.bench_similitud
+    python -m benchmarks.bench_similitud --microciclos 50000 --contexto
+    python -m benchmarks.bench_similitud --salida similitud.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from benchmarks.bench_motores import _percentiles_ms
+
+
+def generar_archivo_sintetico(n_microciclos=20000, n_principios=300, n_categorias=14,
+                              principios_por_microciclo=12, variacion=0.3, semilla=42):
+    """
+    Archivo de muchas temporadas: cada categoría tiene unos pocos "estilos"
+    (conjuntos de principios) y cada microciclo parte de uno de ellos
+    cambiando una fracción de sus principios, de modo que hay vecinos reales.
+    """
+    from controllers.modelo_prediccion import DIAS_SEMANA, BLOQUES_SESION
+
+    rng = random.Random(semilla)
+    principios = [f"Principio {i:04d}" for i in range(n_principios)]
+    estilos = {
+        c: [rng.sample(principios, principios_por_microciclo) for _ in range(5)]
+        for c in range(n_categorias)
+    }
+
+    filas = []
+    for m in range(n_microciclos):
+        categoria = m % n_categorias
+        conjunto = list(rng.choice(estilos[categoria]))
+        for i in range(len(conjunto)):
+            if rng.random() < variacion:
+                conjunto[i] = rng.choice(principios)
+        for principio in set(conjunto):
+            filas.append({
+                'id_temporada': m // 500,
+                'categoria': f"Categoria {categoria:02d}",
+                'nombre_microciclo': f"T{m // 500:03d} Microciclo {m:06d}",
+                'dia': rng.choice(DIAS_SEMANA),
+                'bloque': rng.choice(BLOQUES_SESION),
+                'principio': principio,
+            })
+    return pd.DataFrame(filas)
+
+
+def _recall(exactos, aproximados):
+    if not exactos:
+        return 1.0
+    umbral = exactos[-1][1] - 1e-9
+    aciertos = sum(1 for _, s in aproximados if s >= umbral)
+    return min(aciertos, len(exactos)) / len(exactos)
+
+
+def ejecutar_benchmark(df, k=5, consultas=200, con_contexto=False, semilla=42):
+    from controllers.indice_similitud import IndiceSimilitud
+    from controllers.lsh_similitud import IndiceLSH
+
+    inicio = time.perf_counter()
+    exacto = IndiceSimilitud.desde_dataframe(df)
+    construccion_exacta = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    lsh = IndiceLSH.desde_dataframe(df, con_contexto=con_contexto)
+    lsh.filas_en(exacto)
+    construccion_lsh = time.perf_counter() - inicio
+
+    referencias = random.Random(semilla).sample(exacto.nombres, min(consultas, exacto.n_microciclos))
+    latencias_exactas, latencias_aproximadas, recalls, n_candidatos = [], [], [], []
+    for nombre in referencias:
+        inicio = time.perf_counter()
+        exactos = exacto.similares(nombre, k)
+        latencias_exactas.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        candidatos = lsh.filas_en(exacto)[lsh.filas_candidatas(nombre)]
+        aproximados = exacto.similares(nombre, k, candidatos)
+        latencias_aproximadas.append(time.perf_counter() - inicio)
+
+        n_candidatos.append(len(candidatos))
+        recalls.append(_recall(exactos, aproximados))
+
+    return {
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'microciclos': exacto.n_microciclos,
+        'principios': len(exacto.principios),
+        'k': k,
+        'consultas': len(referencias),
+        'con_contexto': con_contexto,
+        'construccion_exacta_s': construccion_exacta,
+        'construccion_lsh_s': construccion_lsh,
+        'exacta': _percentiles_ms(latencias_exactas),
+        'aproximada': _percentiles_ms(latencias_aproximadas),
+        'candidatos_medios': float(np.mean(n_candidatos)),
+        'recall_medio': float(np.mean(recalls)),
+        'recall_minimo': float(np.min(recalls)),
+    }
+
+
+def imprimir_informe(informe):
+    print(f"\n🔍 Benchmark de similitud ({informe['fecha']}) — {informe['microciclos']:,} microciclos, "
+          f"{informe['principios']} principios, k={informe['k']}"
+          f"{', con contexto dia|bloque' if informe['con_contexto'] else ''}\n")
+    print(f"{'búsqueda':<12}{'índice s':>10}{'p50':>11}{'p95':>11}{'candidatos':>12}{'recall':>9}")
+    print(f"{'exacta':<12}{informe['construccion_exacta_s']:>10.2f}"
+          f"{informe['exacta']['p50_ms']:>9.2f}ms{informe['exacta']['p95_ms']:>9.2f}ms"
+          f"{informe['microciclos'] - 1:>12,}{1.0:>9.3f}")
+    print(f"{'aproximada':<12}{informe['construccion_lsh_s']:>10.2f}"
+          f"{informe['aproximada']['p50_ms']:>9.2f}ms{informe['aproximada']['p95_ms']:>9.2f}ms"
+          f"{informe['candidatos_medios']:>12,.0f}{informe['recall_medio']:>9.3f}")
+    print(f"\nRecall mínimo en una consulta: {informe['recall_minimo']:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de similitud exacta frente a MinHash/LSH")
+    parser.add_argument("--microciclos", type=int, default=20000)
+    parser.add_argument("--principios", type=int, default=300)
+    parser.add_argument("--categorias", type=int, default=14)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--contexto", action="store_true",
+                        help="Incluir tokens dia|bloque|principio en las firmas")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", help="Ruta del informe JSON")
+    args = parser.parse_args(argv)
+
+    df = generar_archivo_sintetico(args.microciclos, args.principios, args.categorias, semilla=args.semilla)
+    informe = ejecutar_benchmark(df, args.k, args.consultas, args.contexto, args.semilla)
+    imprimir_informe(informe)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+        print(f"\n📄 Informe guardado en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# controllers/asignaciones.py
+
+import os
+import re
+
+import pandas as pd
+
+from controllers.cache_ficheros import CacheFicheros
+from controllers.planificador import normalize_for_matching
+
+# Configuración
+STAFF_CSV = "data/staff_por_categoria.csv"
+COLUMNAS_STAFF = ["categoria", "entrenador", "staff", "fecha"]
+
+# Separadores habituales en el campo libre de entrenadores: "Pablo, Lucas, Diego y David"
+_SEPARADORES_NOMBRES = re.compile(r"\s*(?:,|;|/|\n|\s+y\s+|\s+e\s+|&)\s*", flags=re.IGNORECASE)
+
+
+def separar_nombres(texto):
+    """Divide un campo libre de nombres en nombres individuales"""
+    if texto is None or (isinstance(texto, float) and pd.isna(texto)):
+        return []
+    return [n.strip() for n in _SEPARADORES_NOMBRES.split(str(texto)) if n and n.strip()]
+
+
+class IndiceAsignaciones:
+    """
+    Índice de asignaciones del cuerpo técnico, construido una sola vez a
+    partir de staff_por_categoria.csv:
+    - entrenador (normalizado) → conjunto de categorías
+    - categoría → entrenadores asignados
+    Las comparaciones usan normalize_for_matching (sin acentos, minúsculas).
+    """
+
+    def __init__(self, df_staff):
+        self.filas = {}                     # categoria → fila original (dict)
+        self.entrenadores_por_categoria = {}  # categoria → [nombres tal cual]
+        self.categorias_por_entrenador = {}   # nombre normalizado → {categorias}
+
+        if df_staff is None or df_staff.empty or "categoria" not in df_staff.columns:
+            return
+
+        for fila in df_staff.to_dict("records"):
+            categoria = fila.get("categoria")
+            if categoria is None or (isinstance(categoria, float) and pd.isna(categoria)):
+                continue
+            categoria = str(categoria)
+            self.filas[categoria] = fila
+
+            nombres = separar_nombres(fila.get("entrenador"))
+            self.entrenadores_por_categoria[categoria] = nombres
+            for nombre in nombres:
+                clave = normalize_for_matching(nombre)
+                if clave:
+                    self.categorias_por_entrenador.setdefault(clave, set()).add(categoria)
+
+    def fila(self, categoria):
+        """Fila del staff de la categoría (entrenador, staff, fecha) o None"""
+        return self.filas.get(categoria)
+
+    def entrenadores_de(self, categoria):
+        return list(self.entrenadores_por_categoria.get(categoria, []))
+
+    def categorias_de(self, usuario, nombre_completo=None):
+        """Categorías asignadas a un usuario, buscando por usuario y por nombre completo"""
+        categorias = set()
+        for identificador in (usuario, nombre_completo):
+            clave = normalize_for_matching(identificador)
+            if clave:
+                categorias |= self.categorias_por_entrenador.get(clave, set())
+        return categorias
+
+    def esta_asignado(self, usuario, nombre_completo, categoria):
+        return categoria in self.categorias_de(usuario, nombre_completo)
+
+
+def _leer_asignaciones(ruta):
+    try:
+        df_staff = pd.read_csv(ruta) if os.path.exists(ruta) else pd.DataFrame(columns=COLUMNAS_STAFF)
+    except pd.errors.EmptyDataError:
+        df_staff = pd.DataFrame(columns=COLUMNAS_STAFF)
+    return IndiceAsignaciones(df_staff)
+
+
+# Caché del índice compartida por todas las sesiones
+_cache_indice = CacheFicheros(_leer_asignaciones)
+
+
+def obtener_indice_asignaciones():
+    """
+    Devuelve el índice de asignaciones. Solo se vuelve a leer el CSV si
+    ha cambiado en disco o se ha invalidado explícitamente.
+    """
+    with _cache_indice.lock:
+        return _cache_indice.obtener(STAFF_CSV)
+
+
+def invalidar_indice_asignaciones():
+    """Fuerza la reconstrucción del índice en el próximo acceso"""
+    with _cache_indice.lock:
+        _cache_indice.invalidar()
@@ -0,0 +1,469 @@
+# controllers/auditoria.py
+
+import csv
+import fcntl
+import glob
+import gzip
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import atexit
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# Configuración
+LOG_ACTIVO = "data/logs_editor_avanzado.csv"
+SEGMENTOS_DIR = "data/logs_auditoria"
+COLUMNAS_LOG = ['timestamp', 'usuario', 'accion', 'detalles']
+
+MAX_BYTES_SEGMENTO = 5 * 1024 * 1024   # Rotar al superar 5 MB
+MAX_DIAS_SEGMENTO = 30                 # Rotar segmentos con más de 30 días
+COMPRIMIR_SEGMENTOS = True             # Guardar segmentos cerrados como .csv.gz
+
+FSYNC_CADA_N = 20          # Forzar fsync cada N eventos...
+FSYNC_CADA_SEGUNDOS = 2.0  # ...o si han pasado más de estos segundos
+INTENTOS_ESCRITURA = 3     # Reintentos si otro proceso rota el segmento a la vez
+
+
+class EscritorAuditoria:
+    """
+    Escritor append-only del log de auditoría.
+    Cada evento es una única línea CSV escrita con O_APPEND, de modo que
+    varios administradores (hilos o procesos) pueden registrar acciones
+    sin leer ni reescribir el fichero completo.
+    La rotación se serializa entre procesos con flock sobre <log>.lock:
+    exclusivo para rotar, compartido para añadir, así ningún evento cae en
+    un segmento que se está renombrando o comprimiendo.
+    """
+
+    def __init__(self, log_activo=LOG_ACTIVO, segmentos_dir=SEGMENTOS_DIR,
+                 max_bytes=MAX_BYTES_SEGMENTO, max_dias=MAX_DIAS_SEGMENTO,
+                 comprimir=COMPRIMIR_SEGMENTOS, fsync_cada_n=FSYNC_CADA_N,
+                 fsync_cada_segundos=FSYNC_CADA_SEGUNDOS):
+        self.log_activo = log_activo
+        self.segmentos_dir = segmentos_dir
+        self.max_bytes = max_bytes
+        self.max_dias = max_dias
+        self.comprimir = comprimir
+        self.fsync_cada_n = fsync_cada_n
+        self.fsync_cada_segundos = fsync_cada_segundos
+
+        self._lock = threading.Lock()
+        self._fd = None
+        self._fd_bloqueo = None
+        self._pendientes = 0
+        self._ultimo_fsync = time.monotonic()
+        self._inicio_segmento = None
+        self._indices = {}          # Índices de segmentos cerrados (inmutables)
+        self._cache_activo = None   # (firma, DataFrame) del segmento activo
+
+    # ---------- Escritura ----------
+
+    def registrar(self, accion, detalles, usuario, timestamp=None):
+        """
+        Añade un evento al segmento activo.
+        Retorna: (exitoso, mensaje)
+        """
+        evento = {
+            'timestamp': timestamp or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'usuario': usuario,
+            'accion': accion,
+            'detalles': detalles
+        }
+
+        linea = self._serializar(evento)
+        try:
+            with self._lock:
+                for intento in range(INTENTOS_ESCRITURA):
+                    try:
+                        if self._debe_rotar():
+                            with self._bloqueo(fcntl.LOCK_EX):
+                                # Otro proceso puede haber rotado mientras se esperaba el lock
+                                if not self._segmento_vigente():
+                                    self._cerrar_fd()
+                                    self._inicio_segmento = None
+                                if self._debe_rotar():
+                                    self._rotar()
+
+                        with self._bloqueo(fcntl.LOCK_SH):
+                            if not self._segmento_vigente():
+                                self._cerrar_fd()
+                                self._inicio_segmento = None
+                            fd = self._abrir()
+                            os.write(fd, linea)
+                        break
+                    except FileNotFoundError:
+                        # La rotación de otro proceso se adelantó: reabrir y reintentar
+                        self._cerrar_fd()
+                        self._inicio_segmento = None
+                        if intento == INTENTOS_ESCRITURA - 1:
+                            raise
+
+                self._pendientes += 1
+                ahora = time.monotonic()
+                if (self._pendientes >= self.fsync_cada_n or
+                        ahora - self._ultimo_fsync >= self.fsync_cada_segundos):
+                    self._sincronizar()
+
+            return True, "Evento registrado"
+
+        except Exception as e:
+            return False, f"Error al registrar evento: {str(e)}"
+
+    def flush(self):
+        """Fuerza el volcado a disco de los eventos pendientes"""
+        with self._lock:
+            self._sincronizar()
+
+    def cerrar(self):
+        """Sincroniza y cierra el descriptor del segmento activo"""
+        with self._lock:
+            self._cerrar_fd()
+            if self._fd_bloqueo is not None:
+                os.close(self._fd_bloqueo)
+                self._fd_bloqueo = None
+
+    @contextmanager
+    def _bloqueo(self, modo):
+        """flock sobre <log>.lock, compartido entre procesos (LOCK_SH o LOCK_EX)"""
+        if self._fd_bloqueo is None:
+            os.makedirs(os.path.dirname(self.log_activo) or ".", exist_ok=True)
+            self._fd_bloqueo = os.open(self.log_activo + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd_bloqueo, modo)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd_bloqueo, fcntl.LOCK_UN)
+
+    def _serializar(self, evento):
+        """Convierte un evento en una única línea CSV (sin saltos internos)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow([
+            str(evento.get(col, '')).replace('\r', ' ').replace('\n', ' ')
+            for col in COLUMNAS_LOG
+        ])
+        return buffer.getvalue().encode('utf-8')
+
+    def _abrir(self):
+        if self._fd is not None:
+            return self._fd
+
+        os.makedirs(os.path.dirname(self.log_activo) or ".", exist_ok=True)
+        cabecera = (",".join(COLUMNAS_LOG) + "\n").encode('utf-8')
+        nuevo = False
+        if not os.path.exists(self.log_activo):
+            # Se crea ya con cabecera (os.link falla si otro proceso se adelanta)
+            temporal = f"{self.log_activo}.{os.getpid()}.tmp"
+            with open(temporal, 'wb') as f:
+                f.write(cabecera)
+            try:
+                os.link(temporal, self.log_activo)
+                nuevo = True
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(temporal)
+
+        self._fd = os.open(self.log_activo, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if not nuevo and os.fstat(self._fd).st_size == 0:
+            os.write(self._fd, cabecera)
+            nuevo = True
+        if nuevo:
+            self._inicio_segmento = time.time()
+        elif self._inicio_segmento is None:
+            self._inicio_segmento = self._leer_inicio_segmento()
+        return self._fd
+
+    def _segmento_vigente(self):
+        """Detecta si otro proceso ha rotado el segmento que tenemos abierto"""
+        if self._fd is None:
+            return True
+        try:
+            return os.fstat(self._fd).st_ino == os.stat(self.log_activo).st_ino
+        except OSError:
+            return False
+
+    def _sincronizar(self):
+        if self._fd is not None and self._pendientes:
+            os.fsync(self._fd)
+        self._pendientes = 0
+        self._ultimo_fsync = time.monotonic()
+
+    def _cerrar_fd(self):
+        if self._fd is not None:
+            self._sincronizar()
+            os.close(self._fd)
+            self._fd = None
+
+    # ---------- Rotación ----------
+
+    def _leer_inicio_segmento(self):
+        """Fecha del primer evento del segmento activo (o su mtime si no hay)"""
+        try:
+            with open(self.log_activo, 'r', encoding='utf-8', newline='') as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                primera = next(reader, None)
+            if primera:
+                return datetime.strptime(primera[0], '%Y-%m-%d %H:%M:%S').timestamp()
+        except Exception:
+            pass
+        try:
+            return os.path.getmtime(self.log_activo)
+        except OSError:
+            return time.time()
+
+    def _debe_rotar(self):
+        if not os.path.exists(self.log_activo):
+            return False
+
+        try:
+            if os.path.getsize(self.log_activo) >= self.max_bytes:
+                return True
+        except OSError:
+            return False
+
+        if self._inicio_segmento is None:
+            self._inicio_segmento = self._leer_inicio_segmento()
+        edad_dias = (time.time() - self._inicio_segmento) / 86400
+        return edad_dias >= self.max_dias
+
+    def _rotar(self):
+        """Cierra el segmento activo y lo mueve (comprimido) a SEGMENTOS_DIR"""
+        self._cerrar_fd()
+        os.makedirs(self.segmentos_dir, exist_ok=True)
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        nombre = os.path.splitext(os.path.basename(self.log_activo))[0]
+        destino = os.path.join(self.segmentos_dir, f"{nombre}_{timestamp}.csv")
+
+        # Se trabaja sobre un .tmp para que los lectores nunca vean un segmento a medias
+        temporal = destino + '.tmp'
+        os.replace(self.log_activo, temporal)
+        self._inicio_segmento = None
+
+        if self.comprimir:
+            with open(temporal, 'rb') as f_in, gzip.open(temporal + '.gz', 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            destino += '.gz'
+            os.replace(temporal + '.gz', destino)
+            os.remove(temporal)
+        else:
+            os.replace(temporal, destino)
+
+        try:
+            self._indice(destino)
+        except Exception as e:
+            print(f"No se pudo indexar el segmento {destino}: {e}")
+
+        return destino
+
+    def rotar(self):
+        """Rotación manual del segmento activo. Retorna la ruta del segmento cerrado."""
+        with self._lock, self._bloqueo(fcntl.LOCK_EX):
+            if not os.path.exists(self.log_activo):
+                return None
+            return self._rotar()
+
+    # ---------- Lectura ----------
+
+    def listar_segmentos(self):
+        """Segmentos cerrados en orden cronológico, seguidos del segmento activo"""
+        nombre = os.path.splitext(os.path.basename(self.log_activo))[0]
+        cerrados = glob.glob(os.path.join(self.segmentos_dir, f"{nombre}_*.csv"))
+        cerrados += glob.glob(os.path.join(self.segmentos_dir, f"{nombre}_*.csv.gz"))
+        segmentos = sorted(cerrados)
+        if os.path.exists(self.log_activo):
+            segmentos.append(self.log_activo)
+        return segmentos
+
+    def cargar(self):
+        """Lee todos los segmentos y devuelve un DataFrame con los eventos"""
+        with self._lock:
+            self._sincronizar()
+
+        frames = []
+        for segmento in self.listar_segmentos():
+            try:
+                frames.append(pd.read_csv(segmento, dtype=str, keep_default_na=False))
+            except pd.errors.EmptyDataError:
+                continue
+            except Exception as e:
+                print(f"Error al leer segmento de auditoría {segmento}: {e}")
+
+        if not frames:
+            return pd.DataFrame(columns=COLUMNAS_LOG)
+        return pd.concat(frames, ignore_index=True)
+
+    # ---------- Índices y consultas ----------
+
+    def _leer_segmento(self, segmento):
+        try:
+            return pd.read_csv(segmento, dtype=str, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame(columns=COLUMNAS_LOG)
+
+    def _leer_activo(self):
+        """Lee el segmento activo, reutilizando la lectura si no ha cambiado"""
+        with self._lock:
+            self._sincronizar()
+        try:
+            st_activo = os.stat(self.log_activo)
+        except OSError:
+            return pd.DataFrame(columns=COLUMNAS_LOG)
+
+        firma = (st_activo.st_ino, st_activo.st_size, st_activo.st_mtime_ns)
+        if self._cache_activo is None or self._cache_activo[0] != firma:
+            self._cache_activo = (firma, self._leer_segmento(self.log_activo))
+        return self._cache_activo[1]
+
+    def _indice(self, segmento):
+        """
+        Índice de un segmento cerrado: rango de timestamps y postings
+        (número de fila) por usuario y por acción. Se persiste junto al
+        segmento en <segmento>.idx.json y se construye bajo demanda para
+        segmentos antiguos que no lo tengan.
+        """
+        if segmento in self._indices:
+            return self._indices[segmento]
+
+        ruta_idx = segmento + '.idx.json'
+        indice = None
+        if os.path.exists(ruta_idx):
+            try:
+                with open(ruta_idx, 'r', encoding='utf-8') as f:
+                    indice = json.load(f)
+            except Exception:
+                indice = None
+
+        if indice is None:
+            df = self._leer_segmento(segmento)
+            indice = {
+                'filas': len(df),
+                'ts_min': df['timestamp'].min() if len(df) else None,
+                'ts_max': df['timestamp'].max() if len(df) else None,
+                'usuarios': {str(k): v.tolist() for k, v in df.groupby('usuario').indices.items()},
+                'acciones': {str(k): v.tolist() for k, v in df.groupby('accion').indices.items()},
+            }
+            temporal = ruta_idx + '.tmp'
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(indice, f, ensure_ascii=False)
+            os.replace(temporal, ruta_idx)
+
+        self._indices[segmento] = indice
+        return indice
+
+    def valores_filtros(self):
+        """Usuarios y acciones presentes en el histórico, sin leer los segmentos"""
+        usuarios, acciones = set(), set()
+        for segmento in self.listar_segmentos():
+            if segmento == self.log_activo:
+                df = self._leer_activo()
+                usuarios.update(df['usuario'].unique())
+                acciones.update(df['accion'].unique())
+            else:
+                indice = self._indice(segmento)
+                usuarios.update(indice['usuarios'].keys())
+                acciones.update(indice['acciones'].keys())
+        return sorted(usuarios), sorted(acciones)
+
+    def consultar(self, desde=None, hasta=None, usuario=None, accion=None, pagina=1, por_pagina=50):
+        """
+        Consulta paginada del log, del evento más reciente al más antiguo.
+        desde/hasta: cadenas 'YYYY-MM-DD HH:MM:SS' (o datetime), ambos inclusive.
+        Los segmentos fuera de la ventana temporal o sin el usuario/acción
+        pedidos se descartan con su índice y nunca se leen; los que caen
+        enteros en la ventana se cuentan con los postings y solo se leen si
+        aportan filas a la página pedida.
+        Retorna: (DataFrame con la página, total de eventos que cumplen el filtro)
+        """
+        if isinstance(desde, datetime):
+            desde = desde.strftime('%Y-%m-%d %H:%M:%S')
+        if isinstance(hasta, datetime):
+            hasta = hasta.strftime('%Y-%m-%d %H:%M:%S')
+
+        def filtrar(df):
+            mask = pd.Series(True, index=df.index)
+            if desde:
+                mask &= df['timestamp'] >= desde
+            if hasta:
+                mask &= df['timestamp'] <= hasta
+            if usuario:
+                mask &= df['usuario'] == usuario
+            if accion:
+                mask &= df['accion'] == accion
+            return df[mask]
+
+        # Cada bloque: (número de filas que aporta, función que las carga)
+        bloques = []
+        for segmento in reversed(self.listar_segmentos()):
+            if segmento == self.log_activo:
+                df_activo = filtrar(self._leer_activo())
+                bloques.append((len(df_activo), lambda df=df_activo: df))
+                continue
+
+            indice = self._indice(segmento)
+            if not indice['filas']:
+                continue
+            if (desde and indice['ts_max'] < desde) or (hasta and indice['ts_min'] > hasta):
+                continue
+            if usuario and usuario not in indice['usuarios']:
+                continue
+            if accion and accion not in indice['acciones']:
+                continue
+
+            filas = None
+            if usuario:
+                filas = set(indice['usuarios'][usuario])
+            if accion:
+                postings = set(indice['acciones'][accion])
+                filas = postings if filas is None else filas & postings
+            if filas is not None and not filas:
+                continue
+
+            cubierto = (not desde or indice['ts_min'] >= desde) and (not hasta or indice['ts_max'] <= hasta)
+            if cubierto:
+                # El conteo sale del índice; la lectura se aplaza hasta que haga falta
+                n = indice['filas'] if filas is None else len(filas)
+                bloques.append((n, lambda seg=segmento: filtrar(self._leer_segmento(seg))))
+            else:
+                df_seg = filtrar(self._leer_segmento(segmento))
+                bloques.append((len(df_seg), lambda df=df_seg: df))
+
+        total = sum(n for n, _ in bloques)
+        inicio = max(pagina - 1, 0) * por_pagina
+        fin = inicio + por_pagina
+
+        partes = []
+        acumulado = 0
+        for n, cargar in bloques:
+            if acumulado + n > inicio and acumulado < fin:
+                df_bloque = cargar().iloc[::-1]
+                desde_fila = max(inicio - acumulado, 0)
+                hasta_fila = min(fin - acumulado, n)
+                partes.append(df_bloque.iloc[desde_fila:hasta_fila])
+            acumulado += n
+            if acumulado >= fin:
+                break
+
+        if not partes:
+            return pd.DataFrame(columns=COLUMNAS_LOG), total
+        return pd.concat(partes, ignore_index=True)[COLUMNAS_LOG], total
+
+
+# Instancia compartida por todas las sesiones del proceso
+escritor_global = None
+
+def obtener_escritor():
+    """Obtiene la instancia global del escritor de auditoría"""
+    global escritor_global
+    if escritor_global is None:
+        escritor_global = EscritorAuditoria()
+        atexit.register(escritor_global.cerrar)
+    return escritor_global
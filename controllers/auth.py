@@ -3,12 +3,14 @@
 import pandas as pd
 import bcrypt
 import os
+import threading
 import streamlit as st
 from datetime import datetime
-import shutil
+from controllers.repositorio_usuarios import RepositorioUsuariosSQLite
 
 # Configuración
-USUARIOS_CSV = "data/usuarios.csv"
+USUARIOS_DB = "data/usuarios.db"
+USUARIOS_CSV = "data/usuarios.csv"  # Formato histórico: origen de la migración y destino de exportación
 COLUMNAS_REQUERIDAS = ["usuario", "password", "rol"]
 COLUMNAS_COMPLETAS = ["usuario", "password", "rol", "nombre_completo", "email", "fecha_creacion", "activo"]
 
@@ -22,118 +24,63 @@ ADMIN_DEFAULT = {
     "activo": True
 }
 
-def crear_backup_usuarios():
-    """Crea un backup del archivo de usuarios antes de modificarlo"""
-    if os.path.exists(USUARIOS_CSV):
-        backup_dir = "data/backups"
-        os.makedirs(backup_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = os.path.join(backup_dir, f"usuarios_{timestamp}.bak")
-        
-        try:
-            shutil.copy2(USUARIOS_CSV, backup_path)
-            return backup_path
-        except:
-            pass
-    return None
+# Repositorio compartido por todas las sesiones del proceso
+repositorio_global = None
+_sistema_inicializado = False
+_lock_inicializacion = threading.Lock()
 
-def validar_estructura_csv():
-    """
-    Valida que el archivo CSV existe y tiene la estructura correcta.
-    Retorna: (es_valido, mensaje_error)
-    """
-    # Crear directorio si no existe
-    os.makedirs(os.path.dirname(USUARIOS_CSV), exist_ok=True)
-    
-    # Verificar si el archivo existe
-    if not os.path.exists(USUARIOS_CSV):
-        return False, "El archivo no existe"
-    
-    try:
-        # Intentar leer el archivo
-        df = pd.read_csv(USUARIOS_CSV)
-        
-        # Verificar si está vacío
-        if df.empty:
-            return False, "El archivo está vacío"
-        
-        # Verificar columnas requeridas
-        columnas_faltantes = [col for col in COLUMNAS_REQUERIDAS if col not in df.columns]
-        if columnas_faltantes:
-            return False, f"Faltan columnas requeridas: {', '.join(columnas_faltantes)}"
-        
-        # Verificar que hay al menos un registro
-        if len(df) == 0:
-            return False, "No hay usuarios en el archivo"
-        
-        return True, "Estructura válida"
-        
-    except pd.errors.EmptyDataError:
-        return False, "El archivo está vacío o corrupto"
-    except Exception as e:
-        return False, f"Error al leer el archivo: {str(e)}"
+def obtener_repositorio():
+    """Obtiene el repositorio de usuarios global (SQLite)"""
+    global repositorio_global
+    if repositorio_global is None:
+        repositorio_global = RepositorioUsuariosSQLite(USUARIOS_DB)
+    return repositorio_global
+
+def usar_repositorio(repositorio):
+    """Sustituye el repositorio global (p.ej. para apuntar a otro directorio de datos)"""
+    global repositorio_global, _sistema_inicializado
+    with _lock_inicializacion:
+        repositorio_global = repositorio
+        _sistema_inicializado = False
 
 def inicializar_sistema_usuarios():
     """
-    Inicializa el sistema de usuarios creando el archivo con estructura correcta
-    y usuario admin por defecto si es necesario.
+    Inicializa el sistema de usuarios: crea el esquema, migra el CSV
+    histórico si la base de datos está vacía y garantiza el usuario admin.
+    Solo trabaja la primera vez en cada proceso.
     """
-    es_valido, mensaje = validar_estructura_csv()
+    global _sistema_inicializado
+    if _sistema_inicializado:
+        return True
     
-    if not es_valido:
-        print(f"⚠️ Sistema de usuarios no válido: {mensaje}")
-        print("🔧 Inicializando sistema de usuarios...")
+    with _lock_inicializacion:
+        if _sistema_inicializado:
+            return True
         
-        # Crear backup si existe archivo corrupto
-        if os.path.exists(USUARIOS_CSV):
-            backup = crear_backup_usuarios()
-            if backup:
-                print(f"📦 Backup creado: {backup}")
+        repo = obtener_repositorio()
+        repo.inicializar()
         
-        # Crear estructura completa
-        df_nuevo = pd.DataFrame(columns=COLUMNAS_COMPLETAS)
+        # Migración inicial desde el CSV histórico
+        if repo.contar() == 0 and os.path.exists(USUARIOS_CSV):
+            print("🔧 Migrando usuarios desde CSV...")
+            exito, mensaje = repo.importar_csv(USUARIOS_CSV)
+            print(("✅ " if exito else "⚠️ ") + mensaje)
         
-        # Crear usuario admin por defecto
-        password_hash = bcrypt.hashpw(
-            ADMIN_DEFAULT["password_plain"].encode('utf-8'),
-            bcrypt.gensalt()
-        ).decode('utf-8')
-        
-        admin_registro = {
-            "usuario": ADMIN_DEFAULT["usuario"],
-            "password": password_hash,
-            "rol": ADMIN_DEFAULT["rol"],
-            "nombre_completo": ADMIN_DEFAULT["nombre_completo"],
-            "email": ADMIN_DEFAULT["email"],
-            "fecha_creacion": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "activo": True
-        }
-        
-        df_nuevo = pd.concat([df_nuevo, pd.DataFrame([admin_registro])], ignore_index=True)
-        
-        # Guardar archivo
-        df_nuevo.to_csv(USUARIOS_CSV, index=False)
-        print("✅ Sistema de usuarios inicializado correctamente")
-        print("👤 Usuario admin creado: admin / admin123")
-        
-        return True
-    else:
-        # Verificar si existe usuario admin
-        df = pd.read_csv(USUARIOS_CSV)
-        if not any(df['usuario'] == 'admin'):
+        if repo.obtener(ADMIN_DEFAULT["usuario"]) is None:
             print("⚠️ No se encontró usuario admin, creando...")
             crear_usuario_admin_si_no_existe()
+            print("👤 Usuario admin creado: admin / admin123")
         
+        _sistema_inicializado = True
         return True
 
 def crear_usuario_admin_si_no_existe():
     """Crea el usuario admin si no existe en el sistema"""
     try:
-        df = pd.read_csv(USUARIOS_CSV)
+        repo = obtener_repositorio()
         
         # Verificar si ya existe
-        if any(df['usuario'] == 'admin'):
+        if repo.obtener(ADMIN_DEFAULT["usuario"]) is not None:
             return False, "El usuario admin ya existe"
         
         # Crear hash de password
@@ -142,8 +89,7 @@ def crear_usuario_admin_si_no_existe():
             bcrypt.gensalt()
         ).decode('utf-8')
         
-        # Crear registro completo
-        nuevo_admin = {
+        exito, mensaje = repo.crear({
             "usuario": ADMIN_DEFAULT["usuario"],
             "password": password_hash,
             "rol": ADMIN_DEFAULT["rol"],
@@ -151,19 +97,10 @@ def crear_usuario_admin_si_no_existe():
             "email": ADMIN_DEFAULT.get("email", ""),
             "fecha_creacion": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "activo": True
-        }
-        
-        # Añadir columnas faltantes si es necesario
-        for col in COLUMNAS_COMPLETAS:
-            if col not in df.columns:
-                df[col] = ""
-        
-        # Añadir el nuevo usuario
-        df = pd.concat([df, pd.DataFrame([nuevo_admin])], ignore_index=True)
-        
-        # Guardar
-        df.to_csv(USUARIOS_CSV, index=False)
+        })
         
+        if not exito:
+            return False, mensaje
         return True, "Usuario admin creado correctamente"
         
     except Exception as e:
@@ -178,21 +115,14 @@ def validar_credenciales(usuario, password):
     inicializar_sistema_usuarios()
     
     try:
-        # Leer usuarios
-        df = pd.read_csv(USUARIOS_CSV)
-        
-        # Buscar usuario (case insensitive)
-        usuario_lower = usuario.lower()
-        df_usuario = df[df['usuario'].str.lower() == usuario_lower]
+        # Buscar usuario (case insensitive, por índice)
+        usuario_data = obtener_repositorio().obtener(usuario)
         
-        if df_usuario.empty:
+        if usuario_data is None:
             return False, "Usuario no encontrado", None
         
-        # Obtener datos del usuario
-        usuario_data = df_usuario.iloc[0]
-        
         # Verificar si está activo
-        if 'activo' in df.columns and not usuario_data.get('activo', True):
+        if not usuario_data.get('activo', True):
             return False, "Usuario desactivado", None
         
         # Verificar password
@@ -207,8 +137,8 @@ def validar_credenciales(usuario, password):
             datos_usuario = {
                 "usuario": usuario_data['usuario'],
                 "rol": usuario_data['rol'],
-                "nombre_completo": usuario_data.get('nombre_completo', usuario_data['usuario']),
-                "email": usuario_data.get('email', '')
+                "nombre_completo": usuario_data.get('nombre_completo') or usuario_data['usuario'],
+                "email": usuario_data.get('email') or ''
             }
             return True, "Login exitoso", datos_usuario
         else:
@@ -226,21 +156,14 @@ def crear_usuario(usuario, password, rol, nombre_completo="", email=""):
     inicializar_sistema_usuarios()
     
     try:
-        # Leer usuarios existentes
-        df = pd.read_csv(USUARIOS_CSV)
-        
-        # Verificar si el usuario ya existe
-        if any(df['usuario'].str.lower() == usuario.lower()):
-            return False, "El usuario ya existe"
-        
         # Crear hash de password
         password_hash = bcrypt.hashpw(
             password.encode('utf-8'),
             bcrypt.gensalt()
         ).decode('utf-8')
         
-        # Crear nuevo registro
-        nuevo_usuario = {
+        # La unicidad la garantiza el índice único (sin lectura previa)
+        return obtener_repositorio().crear({
             "usuario": usuario,
             "password": password_hash,
             "rol": rol,
@@ -248,24 +171,7 @@ def crear_usuario(usuario, password, rol, nombre_completo="", email=""):
             "email": email,
             "fecha_creacion": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "activo": True
-        }
-        
-        # Asegurar que todas las columnas existen
-        for col in COLUMNAS_COMPLETAS:
-            if col not in df.columns:
-                df[col] = ""
-        
-        # Añadir nuevo usuario
-        df = pd.concat([df, pd.DataFrame([nuevo_usuario])], ignore_index=True)
-        
-        # Eliminar duplicados por si acaso (basándose en el campo usuario)
-        df = df.drop_duplicates(subset=['usuario'], keep='last')
-        
-        # Guardar
-        crear_backup_usuarios()  # Backup antes de guardar
-        df.to_csv(USUARIOS_CSV, index=False)
-        
-        return True, "Usuario creado correctamente"
+        })
         
     except Exception as e:
         return False, f"Error al crear usuario: {str(e)}"
@@ -282,29 +188,13 @@ def cambiar_password(usuario, password_actual, password_nueva):
         return False, "Contraseña actual incorrecta"
     
     try:
-        # Leer usuarios
-        df = pd.read_csv(USUARIOS_CSV)
-        
-        # Buscar usuario
-        mask = df['usuario'].str.lower() == usuario.lower()
-        
-        if not any(mask):
-            return False, "Usuario no encontrado"
-        
         # Crear nuevo hash
         password_hash = bcrypt.hashpw(
             password_nueva.encode('utf-8'),
             bcrypt.gensalt()
         ).decode('utf-8')
         
-        # Actualizar password
-        df.loc[mask, 'password'] = password_hash
-        
-        # Guardar
-        crear_backup_usuarios()
-        df.to_csv(USUARIOS_CSV, index=False)
-        
-        return True, "Contraseña actualizada correctamente"
+        return obtener_repositorio().actualizar_password(usuario, password_hash)
         
     except Exception as e:
         return False, f"Error al cambiar contraseña: {str(e)}"
@@ -315,7 +205,8 @@ def listar_usuarios():
     Retorna: DataFrame con usuarios (sin passwords)
     """
     try:
-        df = pd.read_csv(USUARIOS_CSV)
+        inicializar_sistema_usuarios()
+        df = obtener_repositorio().listar()
         
         # Remover columna de password por seguridad
         columnas_mostrar = [col for col in df.columns if col != 'password']
@@ -334,25 +225,28 @@ def eliminar_usuario(usuario):
         return False, "No se puede eliminar el usuario admin"
     
     try:
-        df = pd.read_csv(USUARIOS_CSV)
-        
-        # Crear backup antes de eliminar
-        crear_backup_usuarios()
-        
-        # Filtrar usuario
-        df_filtrado = df[df['usuario'].str.lower() != usuario.lower()]
-        
-        if len(df_filtrado) == len(df):
-            return False, "Usuario no encontrado"
-        
-        # Guardar
-        df_filtrado.to_csv(USUARIOS_CSV, index=False)
-        
-        return True, "Usuario eliminado correctamente"
+        inicializar_sistema_usuarios()
+        return obtener_repositorio().eliminar(usuario)
         
     except Exception as e:
         return False, f"Error al eliminar usuario: {str(e)}"
 
+def migrar_usuarios_desde_csv(ruta_csv=USUARIOS_CSV):
+    """
+    Importa usuarios desde un CSV con el formato histórico (usuarios.csv).
+    Retorna: (exitoso, mensaje)
+    """
+    inicializar_sistema_usuarios()
+    return obtener_repositorio().importar_csv(ruta_csv)
+
+def exportar_usuarios_a_csv(ruta_csv=USUARIOS_CSV):
+    """
+    Exporta los usuarios al formato CSV histórico (incluye hashes, no contraseñas).
+    Retorna: (exitoso, mensaje)
+    """
+    inicializar_sistema_usuarios()
+    return obtener_repositorio().exportar_csv(ruta_csv)
+
 # Función para mostrar formulario de login en Streamlit
 def mostrar_login():
     """Muestra el formulario de login en Streamlit"""
@@ -0,0 +1,230 @@
+# controllers/bitsets_principios.py
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from controllers.cache_ficheros import CacheFicheros
+from controllers.modelo_prediccion import DIAS_SEMANA, BLOQUES_SESION
+
+# Configuración
+GLOSARIO_CSV = "data/glosario_tactico.csv"
+PLANIFICACION_CSV = "data/planificacion_microciclos.csv"
+BITS_POR_PALABRA = 64
+
+COLUMNAS_SEMANA = ['id_temporada', 'categoria', 'nombre_microciclo']
+FRANJAS = [(dia, bloque) for dia in DIAS_SEMANA for bloque in BLOQUES_SESION]
+
+
+def popcount(bits):
+    """Número de bits a 1 de cada conjunto (suma sobre el último eje)"""
+    return np.bitwise_count(bits).sum(axis=-1, dtype=np.int64)
+
+
+class EspacioPrincipios:
+    """
+    Asignación principio → bit. Primero los principios del glosario, en su
+    orden; después los que solo aparecen en la planificación (texto libre),
+    ordenados. Cada conjunto ocupa n_palabras enteros uint64.
+    """
+
+    def __init__(self, principios):
+        self.principios = list(dict.fromkeys(str(p) for p in principios))
+        self.ids = {p: i for i, p in enumerate(self.principios)}
+
+    @classmethod
+    def desde_glosario(cls, df_glosario, df_planificacion=None):
+        glosario = df_glosario['principio'].dropna().astype(str).tolist() if df_glosario is not None and 'principio' in df_glosario.columns else []
+        extra = []
+        if df_planificacion is not None and 'principio' in df_planificacion.columns:
+            conocidos = set(glosario)
+            extra = sorted(set(df_planificacion['principio'].dropna().astype(str)) - conocidos)
+        return cls(glosario + extra)
+
+    @property
+    def n_principios(self):
+        return len(self.principios)
+
+    @property
+    def n_palabras(self):
+        return max(1, -(-self.n_principios // BITS_POR_PALABRA))
+
+    def codificar(self, principios):
+        """Bitset (n_palabras,) uint64 de una lista de principios; los desconocidos se ignoran"""
+        bits = np.zeros(self.n_palabras, dtype=np.uint64)
+        for principio in principios:
+            i = self.ids.get(str(principio))
+            if i is not None:
+                bits[i // BITS_POR_PALABRA] |= np.uint64(1) << np.uint64(i % BITS_POR_PALABRA)
+        return bits
+
+    def decodificar(self, bits):
+        """Principios de un bitset"""
+        marcados = np.unpackbits(np.ascontiguousarray(bits).view(np.uint8), bitorder='little')
+        return [self.principios[i] for i in np.flatnonzero(marcados[:self.n_principios])]
+
+    def conocidos(self, principios):
+        return [p for p in principios if str(p) in self.ids]
+
+
+class ConjuntosPrincipios:
+    """
+    Principios de cada semana (id_temporada, categoria, nombre_microciclo)
+    como bitsets empaquetados:
+        semanas   DataFrame con las columnas de COLUMNAS_SEMANA, una fila por semana
+        bits      (n_semanas, n_palabras) uint64, principios de la semana
+        franjas   (n_semanas, len(FRANJAS), n_palabras) uint64, principios de
+                  cada (dia, bloque); None si no se ha pedido
+    Las consultas (Jaccard, solapamiento, contención) se resuelven con
+    operaciones de bits y popcount sobre todo el archivo a la vez.
+    """
+
+    def __init__(self, espacio, semanas, bits, franjas=None):
+        self.espacio = espacio
+        self.semanas = semanas.reset_index(drop=True)
+        self.bits = bits
+        self.franjas = franjas
+        self._tamanos = popcount(bits)
+
+    @classmethod
+    def desde_dataframe(cls, df, espacio, con_franjas=True):
+        """Construcción vectorizada: un bitwise_or.at por bit encendido"""
+        columnas = COLUMNAS_SEMANA + ['principio']
+        if df is None or df.empty or any(c not in df.columns for c in columnas):
+            vacio = pd.DataFrame(columns=COLUMNAS_SEMANA)
+            franjas = np.zeros((0, len(FRANJAS), espacio.n_palabras), dtype=np.uint64) if con_franjas else None
+            return cls(espacio, vacio, np.zeros((0, espacio.n_palabras), dtype=np.uint64), franjas)
+
+        datos = df.dropna(subset=columnas)
+        ids = datos['principio'].astype(str).map(espacio.ids)
+        datos, ids = datos[ids.notna()], ids[ids.notna()].to_numpy(dtype=np.int64)
+
+        claves = datos[COLUMNAS_SEMANA].astype(str)
+        grupos = claves.groupby(COLUMNAS_SEMANA, sort=True)
+        filas = grupos.ngroup().to_numpy()
+        semanas = pd.DataFrame(list(grupos.size().index), columns=COLUMNAS_SEMANA)
+
+        palabras = ids // BITS_POR_PALABRA
+        mascaras = np.left_shift(np.uint64(1), (ids % BITS_POR_PALABRA).astype(np.uint64))
+
+        bits = np.zeros((len(semanas), espacio.n_palabras), dtype=np.uint64)
+        np.bitwise_or.at(bits, (filas, palabras), mascaras)
+
+        franjas = None
+        if con_franjas and 'dia' in datos.columns and 'bloque' in datos.columns:
+            # FRANJAS recorre días × bloques: índice = dia * n_bloques + bloque
+            dia = datos['dia'].astype(str).map({d: i for i, d in enumerate(DIAS_SEMANA)})
+            bloque = datos['bloque'].astype(str).map({b: i for i, b in enumerate(BLOQUES_SESION)})
+            validas = (dia.notna() & bloque.notna()).to_numpy()
+            indice_franja = (dia * len(BLOQUES_SESION) + bloque).to_numpy()[validas].astype(np.int64)
+            franjas = np.zeros((len(semanas), len(FRANJAS), espacio.n_palabras), dtype=np.uint64)
+            np.bitwise_or.at(franjas, (filas[validas], indice_franja, palabras[validas]), mascaras[validas])
+        return cls(espacio, semanas, bits, franjas)
+
+    @property
+    def n_semanas(self):
+        return len(self.semanas)
+
+    @property
+    def bytes(self):
+        return self.bits.nbytes + (self.franjas.nbytes if self.franjas is not None else 0)
+
+    def _consulta(self, principios):
+        return self.espacio.codificar(principios)
+
+    def _conjuntos(self, franja=None):
+        """Bitsets de cada semana, o de una franja (dia, bloque) concreta"""
+        if franja is None:
+            return self.bits
+        if self.franjas is None:
+            raise ValueError("El índice se construyó sin franjas")
+        return self.franjas[:, FRANJAS.index(tuple(franja))]
+
+    # Consultas vectorizadas sobre todas las semanas
+
+    def interseccion(self, principios, franja=None):
+        """|semana ∩ consulta|"""
+        return popcount(self._conjuntos(franja) & self._consulta(principios))
+
+    def jaccard(self, principios, franja=None):
+        """|semana ∩ consulta| / |semana ∪ consulta|"""
+        consulta = self._consulta(principios)
+        conjuntos = self._conjuntos(franja)
+        union = popcount(conjuntos | consulta)
+        return np.divide(popcount(conjuntos & consulta), union, out=np.zeros(len(union)), where=union > 0)
+
+    def solapamiento(self, principios, franja=None):
+        """Coeficiente de solapamiento: |semana ∩ consulta| / min(|semana|, |consulta|)"""
+        consulta = self._consulta(principios)
+        conjuntos = self._conjuntos(franja)
+        minimo = np.minimum(popcount(conjuntos), popcount(consulta))
+        return np.divide(popcount(conjuntos & consulta), minimo, out=np.zeros(len(conjuntos)), where=minimo > 0)
+
+    def contiene_todos(self, principios, franja=None):
+        """Máscara de las semanas que usaron todos los principios indicados"""
+        consulta = self._consulta(principios)
+        return ((self._conjuntos(franja) & consulta) == consulta).all(axis=-1)
+
+    def contiene_alguno(self, principios, franja=None):
+        """Máscara de las semanas que usaron al menos uno de los principios"""
+        return ((self._conjuntos(franja) & self._consulta(principios)) != 0).any(axis=-1)
+
+    def franjas_con_todos(self, principios):
+        """(n_semanas, len(FRANJAS)) máscara de las franjas que contienen todos los principios"""
+        if self.franjas is None:
+            raise ValueError("El índice se construyó sin franjas")
+        consulta = self._consulta(principios)
+        return ((self.franjas & consulta) == consulta).all(axis=-1)
+
+    def cobertura(self, mascara=None):
+        """
+        Número de semanas que usaron cada principio (sobre las semanas de la
+        máscara; por defecto, todas). Retorna: Series principio → semanas
+        """
+        bits = self.bits if mascara is None else self.bits[mascara]
+        marcados = np.unpackbits(np.ascontiguousarray(bits).view(np.uint8), axis=1, bitorder='little')
+        return pd.Series(marcados[:, :self.espacio.n_principios].sum(axis=0), index=self.espacio.principios, dtype=np.int64)
+
+    def buscar(self, principios, modo="todos", franja=None, categoria=None, limite=None):
+        """
+        Semanas que cumplen la consulta, ordenadas por Jaccard con ella.
+        modo: "todos" (contienen todos los principios) o "alguno"
+        Retorna: DataFrame con COLUMNAS_SEMANA + comunes, jaccard, principios_semana
+        """
+        mascara = (self.contiene_todos if modo == "todos" else self.contiene_alguno)(principios, franja)
+        if categoria is not None:
+            mascara &= (self.semanas['categoria'] == str(categoria)).to_numpy()
+        filas = np.flatnonzero(mascara)
+
+        jaccard = self.jaccard(principios, franja)[filas]
+        orden = np.argsort(-jaccard, kind='stable')[:limite]
+        filas = filas[orden]
+
+        resultado = self.semanas.iloc[filas].reset_index(drop=True)
+        resultado['comunes'] = self.interseccion(principios, franja)[filas]
+        resultado['jaccard'] = jaccard[orden]
+        resultado['principios_semana'] = self._tamanos[filas]
+        return resultado
+
+
+def _construir_conjuntos(rutas):
+    ruta_planificacion, ruta_glosario = rutas
+    df = pd.read_csv(ruta_planificacion) if os.path.exists(ruta_planificacion) else pd.DataFrame(columns=COLUMNAS_SEMANA)
+    df.columns = df.columns.astype(str).str.strip().str.lower()
+    glosario = pd.read_csv(ruta_glosario) if os.path.exists(ruta_glosario) else None
+    espacio = EspacioPrincipios.desde_glosario(glosario, df)
+    return ConjuntosPrincipios.desde_dataframe(df, espacio)
+
+
+# Caché compartida por todas las sesiones
+_cache_conjuntos = CacheFicheros(_construir_conjuntos)
+
+
+def obtener_conjuntos_principios(ruta_planificacion=PLANIFICACION_CSV, ruta_glosario=GLOSARIO_CSV):
+    """
+    Devuelve los bitsets de todas las semanas. Solo se reconstruyen si la
+    planificación o el glosario han cambiado en disco.
+    """
+    with _cache_conjuntos.lock:
+        return _cache_conjuntos.obtener((ruta_planificacion, ruta_glosario))
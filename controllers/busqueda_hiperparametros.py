@@ -0,0 +1,308 @@
+# controllers/busqueda_hiperparametros.py
+"""
+Búsqueda de hiperparámetros del predictor táctico por halving sucesivo.
+
+Se muestrean candidatos (motor, número de árboles, profundidad, hojas,
+características por nodo) y se evalúan con validación cruzada agrupada: las
+franjas de una misma categoría y mes nunca están a la vez en entrenamiento
+y en prueba. Cada ronda evalúa a los supervivientes con más datos (1/9, 1/3
+y el total de los grupos) y pasa a la siguiente el tercio mejor por F1.
+
+Las evaluaciones (candidato × pliegue) se reparten en un pool de procesos y
+la búsqueda se detiene al agotar el presupuesto de tiempo: los pliegues
+pendientes se cancelan y cada candidato queda con la última ronda que
+completó. El resultado (precisión, tiempo de ajuste, latencia y tamaño de
+cada candidato) se guarda en el registro de modelos.
+"""
+
+import math
+import multiprocessing
+import os
+import random
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from controllers.modelo_prediccion import (
+    PredictorTactico,
+    MOTORES_DISPONIBLES,
+    MOTOR_NATIVO,
+    MOTOR_MULTIOUTPUT,
+    DIAS_SEMANA,
+    BLOQUES_SESION,
+)
+from controllers.registro_modelos import RegistroModelos
+
+# Configuración
+PRESUPUESTO_S = 120
+N_CANDIDATOS = 24
+N_PLIEGUES = 3
+ETA = 3                   # cada ronda conserva 1/ETA de los candidatos
+N_RONDAS = 3              # fracciones de los grupos: 1/ETA², 1/ETA, 1
+MIN_FRANJAS_RONDA = 60    # ninguna ronda evalúa con menos franjas que estas (o todas)
+MIN_FRANJAS = 10
+
+ESPACIO_BUSQUEDA = {
+    'motor': MOTORES_DISPONIBLES,
+    'n_estimators': [10, 25, 50, 100, 200],
+    'max_depth': [5, 10, 15, 20, None],
+    'min_samples_leaf': [1, 2, 4, 8],
+    'max_features': ['sqrt', 0.5, None],
+}
+
+# Configuraciones actuales de cada motor: siempre se evalúan, como referencia
+CANDIDATOS_REFERENCIA = [
+    {'motor': MOTOR_NATIVO, 'n_estimators': 50, 'max_depth': 10, 'min_samples_leaf': 1, 'max_features': 'sqrt'},
+    {'motor': MOTOR_MULTIOUTPUT, 'n_estimators': 50, 'max_depth': 5, 'min_samples_leaf': 1, 'max_features': 'sqrt'},
+]
+
+# Franjas de un microciclo: tamaño del lote con el que se mide la latencia
+FRANJAS_MICROCICLO = len(DIAS_SEMANA) * len(BLOQUES_SESION)
+
+
+def preparar_datos(df):
+    """
+    Franjas del histórico codificadas como en el entrenamiento.
+    Retorna: (X DataFrame con FEATURES_CODIFICADAS, y ndarray multi-etiqueta,
+    grupos ndarray categoria|mes de cada franja)
+    """
+    from sklearn.preprocessing import MultiLabelBinarizer
+
+    franjas = PredictorTactico.franjas_historico(df)
+    if len(franjas) < MIN_FRANJAS:
+        raise ValueError(f"Se necesitan al menos {MIN_FRANJAS} combinaciones únicas. Actualmente: {len(franjas)}")
+
+    claves = pd.DataFrame(list(franjas), columns=['categoria', 'bloque', 'dia', 'mes_temporada'])
+    # factorize ordenado da los mismos códigos que LabelEncoder
+    X = pd.DataFrame({
+        f'{col}_encoded': pd.factorize(claves[col], sort=True)[0] for col in ['categoria', 'bloque', 'dia']
+    })
+    X['mes_temporada'] = claves['mes_temporada'].to_numpy()
+    y = MultiLabelBinarizer().fit_transform(list(franjas.values()))
+    grupos = (claves['categoria'] + '|' + claves['mes_temporada'].astype(str)).to_numpy()
+    return X[PredictorTactico.FEATURES_CODIFICADAS], y, grupos
+
+
+def muestrear_candidatos(n_candidatos=N_CANDIDATOS, semilla=42):
+    """Candidatos de referencia más combinaciones aleatorias distintas del espacio"""
+    rng = random.Random(semilla)
+    candidatos = [dict(c) for c in CANDIDATOS_REFERENCIA]
+    vistos = {tuple(sorted(c.items(), key=lambda kv: kv[0])) for c in candidatos}
+    combinaciones = math.prod(len(v) for v in ESPACIO_BUSQUEDA.values())
+    while len(candidatos) < min(n_candidatos, combinaciones):
+        candidato = {clave: rng.choice(valores) for clave, valores in ESPACIO_BUSQUEDA.items()}
+        firma = tuple(sorted(candidato.items(), key=lambda kv: kv[0]))
+        if firma not in vistos:
+            vistos.add(firma)
+            candidatos.append(candidato)
+    return candidatos[:max(n_candidatos, 1)]
+
+
+def _rondas(grupos, semilla=42):
+    """Filas de cada ronda: subconjuntos crecientes de grupos completos"""
+    unicos = np.unique(grupos)
+    orden = np.random.default_rng(semilla).permutation(unicos)
+    rondas = []
+    for r in range(N_RONDAS):
+        fraccion = ETA ** (r - N_RONDAS + 1)
+        elegidos = orden[:max(N_PLIEGUES, math.ceil(len(orden) * fraccion))]
+        filas = np.flatnonzero(np.isin(grupos, elegidos))
+        if len(filas) < min(MIN_FRANJAS_RONDA, len(grupos)) and r < N_RONDAS - 1:
+            continue
+        if rondas and len(filas) == len(rondas[-1]):
+            continue
+        rondas.append(filas)
+    return rondas
+
+
+# Datos del proceso del pool (se envían una vez por proceso, no por tarea)
+_datos_proceso = None
+
+
+def _iniciar_proceso(X, y):
+    global _datos_proceso
+    _datos_proceso = (X, y)
+
+
+def _evaluar_pliegue(candidato, filas_train, filas_test):
+    """
+    Ajusta un candidato en un pliegue y mide F1 macro, accuracy, tiempo de
+    ajuste, latencia de un lote del tamaño de un microciclo y nodos totales.
+    """
+    from sklearn.metrics import accuracy_score, f1_score
+
+    X, y = _datos_proceso
+    parametros = {k: v for k, v in candidato.items() if k != 'motor'}
+    modelo = PredictorTactico._crear_modelo(candidato['motor'], n_jobs=1, hiperparametros=parametros)
+
+    inicio = time.perf_counter()
+    modelo.fit(X.iloc[filas_train], y[filas_train])
+    tiempo_ajuste = time.perf_counter() - inicio
+
+    X_test, y_test = X.iloc[filas_test], y[filas_test]
+    y_pred = PredictorTactico._probabilidades_estimador(modelo, X_test, y.shape[1]) > 0.5
+
+    lote = X_test.iloc[np.resize(np.arange(len(X_test)), FRANJAS_MICROCICLO)]
+    inicio = time.perf_counter()
+    PredictorTactico._probabilidades_estimador(modelo, lote, y.shape[1])
+    latencia = time.perf_counter() - inicio
+
+    estimadores = getattr(modelo, 'estimators_', [])
+    arboles = [a for e in estimadores for a in getattr(e, 'estimators_', [e])]
+    return {
+        'f1': float(f1_score(y_test, y_pred, average='macro', zero_division=0)),
+        'accuracy': float(accuracy_score(y_test, y_pred)),
+        'tiempo_ajuste_s': tiempo_ajuste,
+        'latencia_lote_ms': latencia * 1000,
+        'nodos': int(sum(a.tree_.node_count for a in arboles)),
+    }
+
+
+def _resumir(candidato, ronda, n_franjas, pliegues):
+    return dict(
+        candidato,
+        ronda=ronda,
+        franjas_ronda=int(n_franjas),
+        f1=float(np.mean([p['f1'] for p in pliegues])),
+        f1_desviacion=float(np.std([p['f1'] for p in pliegues])),
+        accuracy=float(np.mean([p['accuracy'] for p in pliegues])),
+        tiempo_ajuste_s=round(float(np.mean([p['tiempo_ajuste_s'] for p in pliegues])), 4),
+        latencia_lote_ms=round(float(np.mean([p['latencia_lote_ms'] for p in pliegues])), 3),
+        nodos=int(np.mean([p['nodos'] for p in pliegues])),
+    )
+
+
+def _cerrar_pool(executor, abortar=False):
+    """
+    Cierra el pool de evaluación. Al agotar el presupuesto o cancelar no se
+    espera a los ajustes en curso: se terminan sus procesos, que si no
+    seguirían ocupando CPU (y al proceso de entrenamiento) hasta acabar.
+    """
+    # shutdown() suelta la referencia a los procesos: se toman antes
+    procesos = list((executor._processes or {}).values()) if abortar else []
+    executor.shutdown(wait=not abortar, cancel_futures=True)
+    for proceso in procesos:
+        if proceso.is_alive():
+            proceso.terminate()
+    for proceso in procesos:
+        proceso.join(timeout=5)
+        if proceso.is_alive():
+            proceso.kill()
+            proceso.join()
+
+
+def buscar_hiperparametros(df, presupuesto_s=PRESUPUESTO_S, n_candidatos=N_CANDIDATOS, procesos=None,
+                           semilla=42, progreso=None, cancelado=None):
+    """
+    Halving sucesivo con presupuesto de tiempo.
+    progreso: callable(fraccion, mensaje); cancelado: callable() -> bool
+    Retorna: dict con los candidatos (ordenados: última ronda alcanzada y F1)
+    y el mejor de ellos
+    """
+    from sklearn.model_selection import GroupKFold
+
+    inicio = time.perf_counter()
+    limite = inicio + presupuesto_s
+    X, y, grupos = preparar_datos(df)
+    candidatos = muestrear_candidatos(n_candidatos, semilla)
+    rondas = _rondas(grupos, semilla)
+    if len(np.unique(grupos)) < 2:
+        raise ValueError("Se necesitan al menos 2 grupos (categoría y mes) para la validación cruzada")
+
+    resumenes = {}
+    vivos = list(range(len(candidatos)))
+    agotado = interrumpida = False
+    evaluaciones = 0
+    procesos = procesos or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(
+        max_workers=procesos, mp_context=multiprocessing.get_context("spawn"),
+        initializer=_iniciar_proceso, initargs=(X, y)
+    )
+    try:
+        for ronda, filas in enumerate(rondas):
+            n_pliegues = min(N_PLIEGUES, len(np.unique(grupos[filas])))
+            pliegues = [
+                (filas[train], filas[test])
+                for train, test in GroupKFold(n_splits=n_pliegues).split(filas, groups=grupos[filas])
+            ]
+            futuros = {
+                executor.submit(_evaluar_pliegue, candidatos[i], train, test): i
+                for i in vivos for train, test in pliegues
+            }
+            resultados = {i: [] for i in vivos}
+            pendientes = set(futuros)
+            while pendientes:
+                restante = limite - time.perf_counter()
+                if restante <= 0:
+                    agotado = True
+                    break
+                if cancelado is not None and cancelado():
+                    interrumpida = True
+                    break
+                hechos, pendientes = wait(pendientes, timeout=min(restante, 1.0), return_when=FIRST_COMPLETED)
+                for futuro in hechos:
+                    try:
+                        resultados[futuros[futuro]].append(futuro.result())
+                    except Exception as e:
+                        resultados[futuros[futuro]].append(None)
+                        resumenes.setdefault(futuros[futuro], dict(candidatos[futuros[futuro]], error=str(e)))
+                    evaluaciones += 1
+                if progreso is not None:
+                    progreso(
+                        min((time.perf_counter() - inicio) / presupuesto_s, 1.0),
+                        f"ronda {ronda + 1}/{len(rondas)}: {len(futuros) - len(pendientes)}/{len(futuros)} evaluaciones"
+                    )
+            for futuro in pendientes:
+                futuro.cancel()
+
+            # Solo cuentan los candidatos con todos los pliegues de la ronda
+            completos = [
+                i for i in vivos
+                if len(resultados[i]) == len(pliegues) and all(p is not None for p in resultados[i])
+            ]
+            for i in completos:
+                resumenes[i] = _resumir(candidatos[i], ronda, len(filas), resultados[i])
+            if agotado or interrumpida or not completos:
+                break
+            completos.sort(key=lambda i: (-resumenes[i]['f1'], resumenes[i]['tiempo_ajuste_s']))
+            vivos = completos[:max(1, math.ceil(len(completos) / ETA))]
+    finally:
+        _cerrar_pool(executor, abortar=agotado or interrumpida)
+
+    evaluados = sorted(
+        (r for r in resumenes.values() if 'f1' in r),
+        key=lambda r: (-r['ronda'], -r['f1'], r['tiempo_ajuste_s'])
+    )
+    return {
+        'id': datetime.now().strftime('%Y%m%d_%H%M%S_') + uuid.uuid4().hex[:6],
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'huella_datos': PredictorTactico.huella_datos(df),
+        'presupuesto_s': presupuesto_s,
+        'duracion_s': round(time.perf_counter() - inicio, 2),
+        'agotado': agotado,
+        'cancelada': interrumpida,
+        'procesos': procesos,
+        'franjas': int(len(X)),
+        'grupos': int(len(np.unique(grupos))),
+        'franjas_por_ronda': [int(len(f)) for f in rondas],
+        'evaluaciones': evaluaciones,
+        'candidatos': evaluados + [r for r in resumenes.values() if 'f1' not in r],
+        'sin_evaluar': len(candidatos) - len(resumenes),
+        'mejor': evaluados[0] if evaluados else None,
+    }
+
+
+def ejecutar_y_registrar(df, registro=None, **opciones):
+    """Ejecuta la búsqueda y la guarda en el registro de modelos. Retorna: el resultado"""
+    resultado = buscar_hiperparametros(df, **opciones)
+    (registro or RegistroModelos()).registrar_busqueda(resultado)
+    return resultado
+
+
+def hiperparametros_de(candidato):
+    """(motor, hiperparámetros) de un candidato, para PredictorTactico.entrenar_modelo"""
+    return candidato['motor'], {k: candidato[k] for k in ESPACIO_BUSQUEDA if k != 'motor'}
@@ -0,0 +1,83 @@
+# controllers/cache_ficheros.py
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Configuración
+INDICES_DIR = "data/indices"
+
+# Piezas comunes de los índices derivados de data/indices: sin dependencias
+# de ningún índice, para que importarlas no cargue los demás módulos.
+
+
+def huella_filas(df, columnas=('nombre_microciclo', 'principio')):
+    """
+    Huella de las filas (columnas) de un histórico: la misma con cualquier
+    orden de filas. Sirve para saber si un índice guardado corresponde a
+    los datos que se consultan.
+    """
+    columnas = list(columnas)
+    if df is None or df.empty or any(c not in df.columns for c in columnas):
+        return None
+    datos = df[columnas].dropna().astype(str)
+    suma = pd.util.hash_pandas_object(datos, index=False).to_numpy(dtype=np.uint64).sum(dtype=np.uint64)
+    return f"{len(datos)}:{int(suma):016x}"
+
+
+def firma_fichero(ruta):
+    """(mtime_ns, tamaño) del fichero, o None si no existe: cambia si otro proceso lo reescribe"""
+    try:
+        st_fichero = os.stat(ruta)
+        return (st_fichero.st_mtime_ns, st_fichero.st_size)
+    except OSError:
+        return None
+
+
+class CacheFicheros:
+    """
+    Objetos derivados de ficheros, compartidos por todas las sesiones del
+    proceso. La clave es la ruta del fichero (o una tupla de rutas, si el
+    objeto sale de varios):
+        obtener(rutas)           el objeto en caché; si la firma de algún fichero
+                                 ha cambiado (otro proceso lo ha reescrito) se
+                                 vuelve a cargar con cargar(rutas)
+        publicar(objeto, ruta)   objeto.guardar(ruta) (escritura atómica) y lo
+                                 deja en caché; sin disco sigue sirviendo desde memoria
+        invalidar()              fuerza la recarga en el próximo acceso
+    Quien consulta y después publica debe tener lock durante todo el proceso.
+    Los objetos publicados no se modifican: para cambiar uno se construye
+    otro y se publica, así quien lo esté leyendo nunca lo ve a medias.
+    """
+
+    def __init__(self, cargar):
+        self.cargar = cargar
+        self.lock = threading.Lock()
+        self._entradas = {}
+
+    @staticmethod
+    def firma(rutas):
+        if isinstance(rutas, str):
+            return firma_fichero(rutas)
+        return tuple(firma_fichero(ruta) for ruta in rutas)
+
+    def obtener(self, rutas):
+        firma = self.firma(rutas)
+        firma_cache, objeto = self._entradas.get(rutas, (None, None))
+        if objeto is None or firma != firma_cache:
+            objeto = self.cargar(rutas)
+            self._entradas[rutas] = (firma, objeto)
+        return objeto
+
+    def publicar(self, objeto, ruta):
+        try:
+            objeto.guardar(ruta)
+            firma = firma_fichero(ruta)
+        except OSError:
+            firma = None
+        self._entradas[ruta] = (firma, objeto)
+
+    def invalidar(self):
+        self._entradas.clear()
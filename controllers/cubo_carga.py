@@ -0,0 +1,174 @@
+# controllers/cubo_carga.py
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from controllers.cache_ficheros import INDICES_DIR, CacheFicheros
+
+# Configuración
+CUBO_CARGA = os.path.join(INDICES_DIR, "cubo_carga.npz")
+COLUMNAS_CUBO = ['categoria', 'nombre_microciclo', 'dia']
+# Los vacíos (NaN) se guardan como texto vacío: read_csv nunca produce ""
+SIN_VALOR = ""
+
+
+def _claves(df):
+    """Columnas del cubo como texto, con los vacíos como SIN_VALOR"""
+    claves = df[COLUMNAS_CUBO]
+    return claves.astype(object).where(claves.notna(), SIN_VALOR).astype(str)
+
+
+def contar(df):
+    """Filas por (categoria, nombre_microciclo, dia): DataFrame COLUMNAS_CUBO + n"""
+    if df is None or df.empty or any(c not in df.columns for c in COLUMNAS_CUBO):
+        return pd.DataFrame({c: pd.Series(dtype=str) for c in COLUMNAS_CUBO}).assign(n=pd.Series(dtype=np.int64))
+    return _claves(df).value_counts(sort=False).rename('n').reset_index()
+
+
+def huella_cubo(df):
+    """
+    Huella de las columnas del cubo, vacíos incluidos. Se hashean las
+    columnas tal cual (sin pasarlas a texto): es lo que cuesta cada consulta.
+    """
+    if df is None or df.empty or any(c not in df.columns for c in COLUMNAS_CUBO):
+        return None
+    suma = pd.util.hash_pandas_object(df[COLUMNAS_CUBO], index=False).to_numpy(dtype=np.uint64).sum(dtype=np.uint64)
+    return f"{len(df)}:{int(suma):016x}"
+
+
+class CuboCarga:
+    """
+    Agregado categoria × microciclo × dia → número de filas planificadas
+    (principios). predecir_carga_semanal se sirve de aquí en lugar de
+    filtrar y agrupar el histórico completo en cada llamada.
+        conteos   DataFrame COLUMNAS_CUBO + n (solo n > 0)
+        huella    huella_cubo() de los datos con los que corresponde
+    """
+
+    def __init__(self, conteos, huella=None):
+        self.conteos = conteos[conteos['n'] > 0].reset_index(drop=True)
+        self.huella = huella
+        self._resumen = None
+
+    @classmethod
+    def desde_dataframe(cls, df):
+        return cls(contar(df), huella_cubo(df))
+
+    def aplicar(self, eliminadas, nuevas, huella=None):
+        """Cubo nuevo tras quitar las filas eliminadas y sumar las nuevas"""
+        delta = contar(eliminadas)
+        delta['n'] = -delta['n']
+        conteos = (
+            pd.concat([self.conteos, delta, contar(nuevas)], ignore_index=True)
+            .groupby(COLUMNAS_CUBO, sort=False)['n'].sum().reset_index()
+        )
+        return CuboCarga(conteos, huella)
+
+    @property
+    def categorias(self):
+        return sorted(c for c in self.conteos['categoria'].unique() if c != SIN_VALOR)
+
+    def resumen(self):
+        """
+        Carga semanal de todas las categorías a la vez (una fila por categoría),
+        con las mismas cuentas que hacía predecir_carga_semanal categoría a categoría
+        """
+        if self._resumen is not None:
+            return self._resumen
+
+        conteos = self.conteos[self.conteos['categoria'] != SIN_VALOR]
+        completos = conteos[(conteos['nombre_microciclo'] != SIN_VALOR) & (conteos['dia'] != SIN_VALOR)]
+
+        por_micro = completos.groupby(['categoria', 'nombre_microciclo'])['n'].agg(['sum', 'mean', 'std'])
+        por_categoria = por_micro.groupby('categoria').agg(
+            total_principios_semana=('sum', 'mean'),
+            promedio_por_dia=('mean', 'mean'),
+            desviacion=('std', 'mean'),
+            microciclos_analizados=('sum', 'size'),
+            rango_min=('sum', 'min'),
+            rango_max=('sum', 'max'),
+        )
+        por_categoria.loc[por_categoria['microciclos_analizados'] <= 1, 'desviacion'] = 0.0
+        dias = conteos[conteos['dia'] != SIN_VALOR].groupby('categoria')['dia'].nunique()
+        por_categoria['dias_activos'] = dias.reindex(por_categoria.index).fillna(0).astype(np.int64)
+
+        self._resumen = por_categoria
+        return por_categoria
+
+    def carga(self, categoria):
+        """Carga semanal de una categoría (mismo diccionario que predecir_carga_semanal) o None"""
+        resumen = self.resumen()
+        if categoria not in resumen.index:
+            return None
+        fila = resumen.loc[categoria]
+        return {
+            'total_principios_semana': float(fila['total_principios_semana']),
+            'promedio_por_dia': float(fila['promedio_por_dia']),
+            'desviacion': float(fila['desviacion']),
+            'dias_activos': int(fila['dias_activos']),
+            'microciclos_analizados': int(fila['microciclos_analizados']),
+            'rango_sugerido': {
+                'min': int(fila['rango_min']),
+                'max': int(fila['rango_max'])
+            }
+        }
+
+    def guardar(self, ruta=CUBO_CARGA):
+        """Escritura atómica (fichero temporal + os.replace)"""
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f,
+                **{c: self.conteos[c].to_numpy(dtype=str) for c in COLUMNAS_CUBO},
+                n=self.conteos['n'].to_numpy(dtype=np.int64),
+                huella=np.asarray(self.huella or "", dtype=str),
+            )
+        os.replace(tmp, ruta)
+
+    @classmethod
+    def cargar(cls, ruta=CUBO_CARGA):
+        """Carga un cubo guardado; None si no existe o no se puede leer"""
+        try:
+            with np.load(ruta) as datos:
+                conteos = pd.DataFrame({c: datos[c].astype(object) for c in COLUMNAS_CUBO})
+                conteos['n'] = datos['n']
+                return cls(conteos, str(datos['huella']) or None)
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+# Caché del cubo compartida por todas las sesiones
+_cache_cubo = CacheFicheros(CuboCarga.cargar)
+
+
+def obtener_cubo_carga(df, ruta=CUBO_CARGA):
+    """
+    Cubo correspondiente a df: el guardado si su huella coincide; si no,
+    se reconstruye a partir de df y se guarda.
+    """
+    huella = huella_cubo(df)
+    with _cache_cubo.lock:
+        cubo = _cache_cubo.obtener(ruta)
+        if cubo is None or cubo.huella != huella:
+            cubo = CuboCarga.desde_dataframe(df)
+            _cache_cubo.publicar(cubo, ruta)
+        return cubo
+
+
+def actualizar_cubo_tras_guardado(df_anterior, eliminadas, nuevas, df_nuevo, ruta=CUBO_CARGA):
+    """
+    Actualiza el cubo tras guardar planificación: si correspondía a los
+    datos anteriores se restan las filas eliminadas y se suman las nuevas;
+    si no, se reconstruye con los datos nuevos.
+    """
+    with _cache_cubo.lock:
+        cubo = _cache_cubo.obtener(ruta)
+        if cubo is not None and cubo.huella == huella_cubo(df_anterior):
+            cubo = cubo.aplicar(eliminadas, nuevas, huella_cubo(df_nuevo))
+        else:
+            cubo = CuboCarga.desde_dataframe(df_nuevo)
+        _cache_cubo.publicar(cubo, ruta)
+        return cubo
@@ -11,6 +11,8 @@ from controllers.planificador import (
     limpiar_y_migrar_datos,
 )
 from controllers.proteccion import es_admin, obtener_info_usuario
+from controllers.auditoria import obtener_escritor
+from controllers.trabajos_entrenamiento import actualizar_modelo_tras_guardado
 
 def mostrar_editor_avanzado(id_temporada, categoria, microciclo_nombre):
     """
@@ -203,6 +205,9 @@ def mostrar_editor_avanzado(id_temporada, categoria, microciclo_nombre):
                             usuario=info_usuario['usuario']
                         )
                         
+                        # Incorporar el cambio al modelo de sugerencias (en segundo plano)
+                        actualizar_modelo_tras_guardado(usuario=info_usuario['usuario'])
+                        
                         st.rerun()
                     else:
                         st.error(msg)
@@ -245,40 +250,55 @@ def mostrar_editor_avanzado(id_temporada, categoria, microciclo_nombre):
         st.markdown("#### 🔍 Registro de Auditoría")
         st.info("Historial de cambios realizados en el Editor Avanzado")
         
-        # Cargar logs si existen
-        logs = cargar_logs_auditoria()
-        
-        if logs:
-            # Filtrar por este microciclo si es posible
-            df_logs = pd.DataFrame(logs)
-            
-            # Mostrar logs más recientes primero
-            df_logs = df_logs.sort_values('timestamp', ascending=False)
-            
-            # Filtros
-            col1, col2 = st.columns(2)
+        escritor = obtener_escritor()
+        usuarios_unicos, acciones_unicas = escritor.valores_filtros()
+
+        if usuarios_unicos or acciones_unicas:
+            # Filtros (se resuelven con los índices de cada segmento)
+            col1, col2, col3 = st.columns(3)
             with col1:
-                usuarios_unicos = df_logs['usuario'].unique()
                 usuario_filtro = st.selectbox(
                     "Filtrar por usuario",
-                    ["Todos"] + list(usuarios_unicos)
+                    ["Todos"] + usuarios_unicos
                 )
             
             with col2:
-                acciones_unicas = df_logs['accion'].unique()
                 accion_filtro = st.selectbox(
                     "Filtrar por acción",
-                    ["Todas"] + list(acciones_unicas)
+                    ["Todas"] + acciones_unicas
                 )
+
+            with col3:
+                rango_fechas = st.date_input(
+                    "Rango de fechas",
+                    value=(),
+                    help="Deja vacío para ver todo el historial"
+                )
+
+            desde = hasta = None
+            if isinstance(rango_fechas, (list, tuple)) and len(rango_fechas) == 2:
+                desde = f"{rango_fechas[0]} 00:00:00"
+                hasta = f"{rango_fechas[1]} 23:59:59"
+
+            por_pagina = 50
+            pagina = st.session_state.get("auditoria_pagina", 1)
+
+            filtros = {
+                "desde": desde,
+                "hasta": hasta,
+                "usuario": None if usuario_filtro == "Todos" else usuario_filtro,
+                "accion": None if accion_filtro == "Todas" else accion_filtro,
+            }
+            df_mostrar, total = escritor.consultar(pagina=pagina, por_pagina=por_pagina, **filtros)
+            total_paginas = max(1, -(-total // por_pagina))
+
+            # Si los filtros reducen el resultado, volver a la última página válida
+            if pagina > total_paginas:
+                pagina = total_paginas
+                st.session_state["auditoria_pagina"] = pagina
+                df_mostrar, total = escritor.consultar(pagina=pagina, por_pagina=por_pagina, **filtros)
             
-            # Aplicar filtros
-            df_mostrar = df_logs.copy()
-            if usuario_filtro != "Todos":
-                df_mostrar = df_mostrar[df_mostrar['usuario'] == usuario_filtro]
-            if accion_filtro != "Todas":
-                df_mostrar = df_mostrar[df_mostrar['accion'] == accion_filtro]
-            
-            # Mostrar tabla
+            # Mostrar tabla (más recientes primero)
             st.dataframe(
                 df_mostrar[['timestamp', 'usuario', 'accion', 'detalles']],
                 use_container_width=True,
@@ -290,10 +310,23 @@ def mostrar_editor_avanzado(id_temporada, categoria, microciclo_nombre):
                     "detalles": "Detalles"
                 }
             )
+
+            # Paginación
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                if st.button("⬅️ Anterior", disabled=pagina <= 1, key="auditoria_prev_btn"):
+                    st.session_state["auditoria_pagina"] = pagina - 1
+                    st.rerun()
+            with col2:
+                st.caption(f"Página {pagina} de {total_paginas} · {total} registros")
+            with col3:
+                if st.button("Siguiente ➡️", disabled=pagina >= total_paginas, key="auditoria_next_btn"):
+                    st.session_state["auditoria_pagina"] = pagina + 1
+                    st.rerun()
             
             # Exportar logs (solo admin)
             if st.button("📥 Exportar logs completos", disabled=not es_admin()):
-                df_export = pd.DataFrame(logs)
+                df_export = pd.DataFrame(cargar_logs_auditoria())
                 csv = df_export.to_csv(index=False)
                 st.download_button(
                     label="Descargar CSV",
@@ -306,36 +339,21 @@ def mostrar_editor_avanzado(id_temporada, categoria, microciclo_nombre):
 
 # Funciones auxiliares de auditoría
 def guardar_log_auditoria(accion, detalles, usuario):
-    """Guarda un registro de auditoría"""
-    log_file = "data/logs_editor_avanzado.csv"
-    
-    nuevo_log = {
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'usuario': usuario,
-        'accion': accion,
-        'detalles': detalles
-    }
-    
-    try:
-        if os.path.exists(log_file):
-            df_logs = pd.read_csv(log_file)
-        else:
-            df_logs = pd.DataFrame(columns=['timestamp', 'usuario', 'accion', 'detalles'])
-        
-        df_logs = pd.concat([df_logs, pd.DataFrame([nuevo_log])], ignore_index=True)
-        df_logs.to_csv(log_file, index=False)
-        
-    except Exception as e:
-        print(f"Error al guardar log: {e}")
+    """Guarda un registro de auditoría (append-only, con rotación de segmentos)"""
+    exito, mensaje = obtener_escritor().registrar(accion, detalles, usuario)
+    if not exito:
+        print(f"Error al guardar log: {mensaje}")
 
 def cargar_logs_auditoria():
-    """Carga los logs de auditoría"""
-    log_file = "data/logs_editor_avanzado.csv"
-    
+    """Carga los logs de auditoría de todos los segmentos"""
     try:
-        if os.path.exists(log_file):
-            df_logs = pd.read_csv(log_file)
-            return df_logs.to_dict('records')
+        return obtener_escritor().cargar().to_dict('records')
+    except Exception:
         return []
-    except:
-        return []
\ No newline at end of file
+
+def consultar_logs_auditoria(desde=None, hasta=None, usuario=None, accion=None, pagina=1, por_pagina=50):
+    """
+    Consulta paginada de los logs de auditoría.
+    Retorna: (DataFrame con la página, total de registros)
+    """
+    return obtener_escritor().consultar(desde, hasta, usuario, accion, pagina, por_pagina)
@@ -3,7 +3,7 @@
 import streamlit as st
 import pandas as pd
 import os
-from controllers.planificador import guardar_planificacion, cargar_datos_csv, normalize_for_matching
+from controllers.planificador import guardar_microciclo, cargar_datos_csv, normalize_for_matching
 
 DATA_PATH = "data"
 GLOSARIO_PATH = os.path.join(DATA_PATH, "glosario_tactico.csv")
@@ -51,6 +51,16 @@ def mostrar_editor_microciclo(temporada, categoria, microciclo, glosario_df):
     # Contenedor para tracking de cambios
     cambios_pendientes = []
     
+    # Sugerencias ML para todas las franjas en una sola llamada
+    sugerencias_ml = {}
+    if st.checkbox("💡 Mostrar sugerencias ML", key="mostrar_sugerencias_ml"):
+        from controllers.modelo_prediccion import obtener_predictor
+        sugerencias_ml, mensaje_ml = obtener_predictor().predecir_microciclo(
+            categoria, temporada, dias_semana, bloques, n_sugerencias=3
+        )
+        if not any(sugerencias_ml.values()):
+            st.caption(f"ℹ️ {mensaje_ml}")
+    
     # Crear estructura de edición
     for dia in dias_semana:
         with st.expander(f"📅 {dia}"):
@@ -81,6 +91,11 @@ def mostrar_editor_microciclo(temporada, categoria, microciclo, glosario_df):
                     help=f"Selecciona principios tácticos para {bloque} del {dia}"
                 )
                 
+                if sugerencias_ml.get((dia, bloque)):
+                    st.caption("💡 Sugerencias: " + ", ".join(
+                        f"{s['principio']} ({s['porcentaje']})" for s in sugerencias_ml[(dia, bloque)]
+                    ))
+                
                 # Detectar cambios para mostrar indicador
                 if set(seleccionados) != set(principios_guardados):
                     cambios_pendientes.append({
@@ -121,37 +136,30 @@ def mostrar_editor_microciclo(temporada, categoria, microciclo, glosario_df):
             
             errores = []
             exitos = 0
-            total_items = len(dias_semana) * len(bloques)
-            current = 0
             
-            # Guardar cada combinación día/bloque
-            for dia in dias_semana:
-                for bloque in bloques:
-                    current += 1
-                    progress_bar.progress(current / total_items)
-                    status_text.text(f"Guardando {dia} - {bloque}...")
-                    
-                    seleccionados = st.session_state.get(f"{dia}_{bloque}", [])
-                    
-                    # Usar la función de guardado inteligente
-                    # (que ya elimina duplicados automáticamente)
-                    try:
-                        success, mensaje = guardar_planificacion(
-                            id_temporada=temporada,
-                            categoria=categoria,
-                            nombre_microciclo=microciclo,
-                            dia=dia,
-                            bloque=bloque,
-                            principios=seleccionados
-                        )
-                        
-                        if success:
-                            exitos += 1
-                        else:
-                            errores.append(f"{dia}/{bloque}: {mensaje}")
-                            
-                    except Exception as e:
-                        errores.append(f"{dia}/{bloque}: Error - {str(e)}")
+            def progreso(dia, bloque, fraccion):
+                progress_bar.progress(fraccion)
+                status_text.text(f"Guardando {dia} - {bloque}...")
+            
+            # Guardar cada combinación día/bloque (guardado inteligente, que ya
+            # elimina duplicados); los índices se actualizan una vez al final
+            franjas = {
+                (dia, bloque): st.session_state.get(f"{dia}_{bloque}", [])
+                for dia in dias_semana for bloque in bloques
+            }
+            resultados = guardar_microciclo(
+                id_temporada=temporada,
+                categoria=categoria,
+                nombre_microciclo=microciclo,
+                franjas=franjas,
+                progreso=progreso
+            )
+            
+            for (dia, bloque), (success, mensaje) in resultados.items():
+                if success:
+                    exitos += 1
+                else:
+                    errores.append(f"{dia}/{bloque}: {mensaje}")
             
             # Limpiar progress bar
             progress_bar.empty()
@@ -166,6 +174,17 @@ def mostrar_editor_microciclo(temporada, categoria, microciclo, glosario_df):
             else:
                 st.success(f"✅ **Microciclo guardado correctamente**")
                 st.write(f"Se actualizaron {exitos} bloques exitosamente")
+                
+                # Incorporar el microciclo al modelo de sugerencias (en segundo plano)
+                from controllers.proteccion import obtener_info_usuario
+                from controllers.trabajos_entrenamiento import (
+                    actualizar_modelo_tras_guardado, MENSAJE_ACTUALIZACION_PENDIENTE
+                )
+                lanzado, mensaje = actualizar_modelo_tras_guardado(usuario=(obtener_info_usuario() or {}).get('usuario'))
+                if lanzado:
+                    st.caption("🤖 Actualizando el modelo de sugerencias en segundo plano")
+                elif mensaje == MENSAJE_ACTUALIZACION_PENDIENTE:
+                    st.caption(f"🤖 {mensaje}")
                 st.balloons()
                 
                 # Recargar para actualizar el estado
@@ -0,0 +1,226 @@
+# controllers/indice_similitud.py
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from controllers.cache_ficheros import INDICES_DIR, CacheFicheros, huella_filas
+
+# Configuración
+INDICE_SIMILITUD = os.path.join(INDICES_DIR, "similitud_microciclos.npz")
+
+# scipy.sparse se importa dentro de las funciones que lo usan (como
+# scikit-learn en modelo_prediccion): importar este módulo desde el
+# planificador no debe pagar su importación.
+
+
+def matriz_normalizada(filas, columnas, forma):
+    """CSR con un 1 por (fila, columna) y cada fila normalizada a norma L2 = 1"""
+    from scipy import sparse
+
+    por_fila = np.bincount(filas, minlength=forma[0])
+    valores = 1.0 / np.sqrt(por_fila[filas]) if len(filas) else np.zeros(0)
+    return sparse.csr_matrix((valores, (filas, columnas)), shape=forma)
+
+
+class IndiceSimilitud:
+    """
+    Índice de similitud entre microciclos por sus principios:
+        matriz    CSR (microciclos × principios), cada fila es el vector 0/1
+                  de principios del microciclo normalizado a norma L2 = 1
+        nombres   fila → microciclo (y filas: microciclo → fila)
+        principios columna → principio (y columnas: principio → columna)
+        huella    huella_filas() de los datos con los que se construyó
+    La similitud coseno entre dos microciclos es el producto escalar de sus
+    filas, así que una consulta es un producto matriz dispersa × vector.
+    """
+
+    def __init__(self, matriz, nombres, principios, huella=None):
+        self.matriz = matriz.tocsr()
+        self.nombres = list(nombres)
+        self.principios = list(principios)
+        self.filas = {nombre: fila for fila, nombre in enumerate(self.nombres)}
+        self.columnas = {principio: columna for columna, principio in enumerate(self.principios)}
+        self.huella = huella
+
+    @classmethod
+    def desde_dataframe(cls, df):
+        """Construye el índice de un histórico (vectorizado, sin bucles por microciclo)"""
+        datos = (
+            df[['nombre_microciclo', 'principio']].dropna().astype(str).drop_duplicates()
+            if 'nombre_microciclo' in df.columns and 'principio' in df.columns
+            else pd.DataFrame(columns=['nombre_microciclo', 'principio'])
+        )
+        filas, nombres = pd.factorize(datos['nombre_microciclo'], sort=True)
+        columnas, principios = pd.factorize(datos['principio'], sort=True)
+
+        matriz = matriz_normalizada(filas, columnas, (len(nombres), len(principios)))
+        return cls(matriz, nombres, principios, huella_filas(df))
+
+    @property
+    def n_microciclos(self):
+        return len(self.nombres)
+
+    def copia(self):
+        """Copia independiente (las filas se modifican sobre la copia, nunca sobre el publicado)"""
+        return IndiceSimilitud(self.matriz.copy(), self.nombres, self.principios, self.huella)
+
+    def aplicar(self, df_nuevo, microciclos):
+        """
+        Índice nuevo con las filas de los microciclos indicados rehechas a
+        partir de df_nuevo. No modifica este: quien lo esté consultando sigue
+        viendo un índice completo y coherente.
+        """
+        indice = self.copia()
+        nombres = df_nuevo['nombre_microciclo'].astype(str)
+        for nombre in {str(m) for m in microciclos}:
+            principios = df_nuevo.loc[nombres == nombre, 'principio'].dropna().astype(str).unique()
+            indice.actualizar_microciclo(nombre, principios)
+        indice.huella = huella_filas(df_nuevo)
+        return indice
+
+    def contiene(self, nombre):
+        return str(nombre) in self.filas
+
+    def _vector(self, principios):
+        """Fila CSR (1 × n_principios) normalizada; añade columnas para principios nuevos"""
+        from scipy import sparse
+
+        principios = sorted({str(p) for p in principios})
+        for principio in principios:
+            if principio not in self.columnas:
+                self.columnas[principio] = len(self.principios)
+                self.principios.append(principio)
+        if self.matriz.shape[1] < len(self.principios):
+            self.matriz.resize((self.matriz.shape[0], len(self.principios)))
+
+        columnas = np.array([self.columnas[p] for p in principios], dtype=np.int64)
+        valores = np.full(len(columnas), 1.0 / np.sqrt(len(columnas))) if len(columnas) else np.zeros(0)
+        return sparse.csr_matrix(
+            (valores, (np.zeros(len(columnas), dtype=np.int64), columnas)), shape=(1, len(self.principios))
+        )
+
+    def actualizar_microciclo(self, nombre, principios):
+        """
+        Sustituye (o añade) la fila de un microciclo. Sin principios, el
+        microciclo se elimina del índice.
+        """
+        from scipy import sparse
+
+        nombre = str(nombre)
+        fila = self.filas.get(nombre)
+        principios = [p for p in principios if pd.notna(p)]
+
+        if not principios:
+            if fila is None:
+                return
+            conservar = np.ones(self.n_microciclos, dtype=bool)
+            conservar[fila] = False
+            self.matriz = self.matriz[conservar]
+            del self.nombres[fila]
+            self.filas = {n: i for i, n in enumerate(self.nombres)}
+            return
+
+        vector = self._vector(principios)
+        if fila is None:
+            self.matriz = sparse.vstack([self.matriz, vector], format='csr')
+            self.filas[nombre] = len(self.nombres)
+            self.nombres.append(nombre)
+        else:
+            self.matriz = sparse.vstack(
+                [self.matriz[:fila], vector, self.matriz[fila + 1:]], format='csr'
+            )
+
+    def similares(self, nombre, n=3, candidatos=None):
+        """
+        Los n microciclos más parecidos al indicado (sin incluirlo).
+        candidatos: filas entre las que buscar (p. ej. las de un índice LSH);
+        por defecto, todas
+        Retorna: [(nombre, similitud)] de mayor a menor similitud, o None si
+        el microciclo no está en el índice
+        """
+        fila = self.filas.get(str(nombre))
+        if fila is None:
+            return None
+
+        # CSR × vector denso: mucho más rápido que el producto disperso × disperso
+        referencia = self.matriz[fila].toarray().ravel()
+        if candidatos is None:
+            filas = np.arange(self.n_microciclos)
+            similitudes = self.matriz @ referencia
+        else:
+            filas = np.unique(np.asarray(candidatos, dtype=np.int64))
+            filas = filas[(filas >= 0) & (filas < self.n_microciclos)]
+            similitudes = self.matriz[filas] @ referencia
+        similitudes[filas == fila] = -np.inf
+
+        k = min(int(n), int((filas != fila).sum()))
+        if k <= 0:
+            return []
+        mejores = np.argpartition(-similitudes, k - 1)[:k]
+        mejores = mejores[np.argsort(-similitudes[mejores], kind='stable')]
+        return [(self.nombres[filas[i]], float(similitudes[i])) for i in mejores]
+
+    def guardar(self, ruta=INDICE_SIMILITUD):
+        """Escritura atómica (fichero temporal + os.replace)"""
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f,
+                datos=self.matriz.data, indices=self.matriz.indices, indptr=self.matriz.indptr,
+                forma=np.asarray(self.matriz.shape, dtype=np.int64),
+                nombres=np.asarray(self.nombres, dtype=str),
+                principios=np.asarray(self.principios, dtype=str),
+                huella=np.asarray(self.huella or "", dtype=str),
+            )
+        os.replace(tmp, ruta)
+
+    @classmethod
+    def cargar(cls, ruta=INDICE_SIMILITUD):
+        """Carga un índice guardado; None si no existe o no se puede leer"""
+        from scipy import sparse
+
+        try:
+            with np.load(ruta) as datos:
+                matriz = sparse.csr_matrix(
+                    (datos['datos'], datos['indices'], datos['indptr']), shape=tuple(datos['forma'])
+                )
+                return cls(matriz, datos['nombres'].tolist(), datos['principios'].tolist(), str(datos['huella']) or None)
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+# Caché del índice compartida por todas las sesiones
+_cache_indice = CacheFicheros(IndiceSimilitud.cargar)
+
+
+def obtener_indice_similitud(df, ruta=INDICE_SIMILITUD):
+    """
+    Índice correspondiente a df: el guardado si su huella coincide; si no,
+    se reconstruye a partir de df y se guarda.
+    """
+    huella = huella_filas(df)
+    with _cache_indice.lock:
+        indice = _cache_indice.obtener(ruta)
+        if indice is None or indice.huella != huella:
+            indice = IndiceSimilitud.desde_dataframe(df)
+            _cache_indice.publicar(indice, ruta)
+        return indice
+
+
+def actualizar_indice_tras_guardado(df_anterior, df_nuevo, microciclos, ruta=INDICE_SIMILITUD):
+    """
+    Actualiza el índice tras guardar planificación: si el índice correspondía
+    a los datos anteriores solo se rehacen las filas de los microciclos
+    tocados; si no, se reconstruye entero con los datos nuevos.
+    """
+    with _cache_indice.lock:
+        indice = _cache_indice.obtener(ruta)
+        if indice is not None and indice.huella == huella_filas(df_anterior):
+            indice = indice.aplicar(df_nuevo, microciclos)
+        else:
+            indice = IndiceSimilitud.desde_dataframe(df_nuevo)
+        _cache_indice.publicar(indice, ruta)
+        return indice
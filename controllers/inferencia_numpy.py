@@ -0,0 +1,303 @@
+# controllers/inferencia_numpy.py
+"""
+Inferencia del predictor táctico sin scikit-learn.
+
+exportar_artefacto aplana los árboles del bosque (característica, umbral,
+hijos y probabilidad de la clase positiva en las hojas) en arrays contiguos
+y los guarda, junto con las clases de los encoders, los principios y la
+tabla de probabilidades, en un único .npz sin comprimir.
+
+cargar_artefacto lo abre con memory-map (los arrays se leen de la caché de
+páginas del sistema operativo, sin copiarlos ni deserializar objetos) y
+BosqueNumpy evalúa un lote de filas recorriendo todos los árboles a la vez
+con NumPy. Abrir el artefacto no importa scikit-learn ni hace unpickle.
+"""
+
+import struct
+import zipfile
+
+import numpy as np
+
+# Versión del formato del .npz
+FORMATO_ARTEFACTO = 1
+
+# Columnas categóricas cuyos encoders se exportan (mismo orden que las features)
+COLUMNAS_CODIFICADAS = ['categoria', 'bloque', 'dia']
+
+# Elementos (filas × árboles × salidas) evaluados por tanda, para acotar memoria
+ELEMENTOS_POR_TANDA = 4_000_000
+
+
+class ClasesCodificadas:
+    """
+    Sustituto ligero de LabelEncoder / MultiLabelBinarizer para predecir:
+    el predictor solo necesita su atributo classes_.
+    """
+
+    def __init__(self, clases):
+        self.classes_ = np.array([str(c) for c in clases], dtype=object)
+
+
+def _arboles(modelo):
+    """
+    Recorre los árboles del modelo.
+    Produce: (tree_, columnas de principio que predice, clases de cada salida)
+    """
+    miembros = getattr(modelo, 'miembros', None)
+    if miembros is not None:
+        # ModeloIncremental: cada miembro predice un subconjunto de columnas
+        for estimador, columnas_miembro in miembros:
+            for tree, columnas, clases in _arboles(estimador):
+                yield tree, [int(columnas_miembro[c]) for c in columnas], clases
+        return
+
+    estimadores = getattr(modelo, 'estimators_', None)
+    if estimadores is None:
+        raise ValueError("El modelo no está ajustado")
+
+    if estimadores and hasattr(estimadores[0], 'estimators_'):
+        # MultiOutputClassifier: un bosque por principio
+        for principio, bosque in enumerate(estimadores):
+            for arbol in bosque.estimators_:
+                yield arbol.tree_, [principio], [bosque.classes_]
+        return
+
+    # Bosque multi-etiqueta: cada árbol predice todos los principios
+    clases = modelo.classes_
+    if not isinstance(clases, list):
+        clases = [clases]
+    columnas = list(range(len(clases)))
+    for arbol in estimadores:
+        yield arbol.tree_, columnas, clases
+
+
+def _valores_hojas(tree, clases):
+    """Probabilidad de la clase positiva de cada salida en cada nodo: (n_nodos, n_salidas)"""
+    valores = np.zeros((tree.node_count, len(clases)), dtype=np.float64)
+    for salida, clases_salida in enumerate(clases):
+        clases_salida = list(clases_salida)
+        if 1 not in clases_salida:
+            continue
+        recuentos = tree.value[:, salida, :len(clases_salida)]
+        totales = recuentos.sum(axis=1)
+        totales[totales == 0] = 1.0
+        valores[:, salida] = recuentos[:, clases_salida.index(1)] / totales
+    return valores
+
+
+def aplanar_bosque(modelo):
+    """
+    Aplana los árboles en arrays contiguos con índices de nodo globales.
+    hijos[2*nodo] es el hijo izquierdo y hijos[2*nodo + 1] el derecho. Las
+    hojas apuntan a sí mismas, así que recorrer `profundidad` pasos deja
+    cada fila en su hoja sea cual sea la profundidad de su rama.
+    Si los árboles predicen distinto número de principios (modelo
+    incremental), las columnas se rellenan con -1 y valor 0.
+    """
+    caracteristica, umbral, hijos, fila_hoja = [], [], [], []
+    valores, raices, columnas = [], [], []
+    desplazamiento = 0
+    hojas_previas = 0
+    profundidad = 0
+
+    for tree, columnas_arbol, clases in _arboles(modelo):
+        n = tree.node_count
+        es_hoja = tree.children_left == -1
+        propios = np.arange(n)
+
+        caracteristica.append(np.where(es_hoja, 0, tree.feature).astype(np.int32))
+        umbral.append(np.asarray(tree.threshold, dtype=np.float64))
+        hijos.append((np.stack([
+            np.where(es_hoja, propios, tree.children_left),
+            np.where(es_hoja, propios, tree.children_right),
+        ], axis=1).ravel() + desplazamiento).astype(np.int32))
+
+        indice_hoja = np.full(n, -1, dtype=np.int32)
+        indice_hoja[es_hoja] = np.arange(es_hoja.sum()) + hojas_previas
+        fila_hoja.append(indice_hoja)
+        valores.append(_valores_hojas(tree, clases)[es_hoja].astype(np.float32))
+
+        raices.append(desplazamiento)
+        columnas.append(columnas_arbol)
+        profundidad = max(profundidad, int(tree.max_depth))
+        desplazamiento += n
+        hojas_previas += int(es_hoja.sum())
+
+    if not raices:
+        raise ValueError("El modelo no tiene árboles")
+
+    ancho = max(len(c) for c in columnas)
+    if any(len(c) < ancho for c in columnas):
+        columnas = [list(c) + [-1] * (ancho - len(c)) for c in columnas]
+        valores = [np.pad(v, ((0, 0), (0, ancho - v.shape[1]))) for v in valores]
+
+    return {
+        'caracteristica': np.concatenate(caracteristica),
+        'umbral': np.concatenate(umbral),
+        'hijos': np.concatenate(hijos),
+        'fila_hoja': np.concatenate(fila_hoja),
+        'valores': np.concatenate(valores),
+        'raices': np.asarray(raices, dtype=np.int32),
+        'columnas': np.asarray(columnas, dtype=np.int32),
+        'profundidad': np.asarray([profundidad], dtype=np.int32),
+    }
+
+
+def exportar_artefacto(ruta, modelo, encoders, mlb, tabla=None):
+    """
+    Guarda el artefacto de inferencia en `ruta` (.npz sin comprimir, para
+    poder mapearlo en memoria).
+    """
+    arrays = aplanar_bosque(modelo)
+    arrays['formato'] = np.asarray([FORMATO_ARTEFACTO], dtype=np.int32)
+    for col in COLUMNAS_CODIFICADAS:
+        arrays[f'clases_{col}'] = np.asarray([str(c) for c in encoders[col].classes_], dtype=str)
+    arrays['clases_principios'] = np.asarray([str(c) for c in mlb.classes_], dtype=str)
+    if tabla is not None:
+        arrays['tabla'] = np.ascontiguousarray(tabla, dtype=np.float32)
+
+    # Pasando un fichero abierto, np.savez no añade la extensión .npz a la ruta
+    with open(ruta, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def abrir_npz(ruta):
+    """
+    Abre un .npz sin comprimir mapeando cada array en memoria (np.load no
+    admite mmap_mode con .npz). Los miembros comprimidos se leen completos.
+    """
+    arrays = {}
+    with zipfile.ZipFile(ruta) as zf, open(ruta, 'rb') as f:
+        for info in zf.infolist():
+            nombre = info.filename[:-len('.npy')] if info.filename.endswith('.npy') else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as miembro:
+                    arrays[nombre] = np.lib.format.read_array(miembro)
+                continue
+
+            # Cabecera local del zip: 30 bytes + nombre + campo extra
+            f.seek(info.header_offset)
+            cabecera = f.read(30)
+            largo_nombre, largo_extra = struct.unpack('<HH', cabecera[26:30])
+            f.seek(info.header_offset + 30 + largo_nombre + largo_extra)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                forma, orden_fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                forma, orden_fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError(f"El array '{nombre}' contiene objetos Python")
+
+            if not forma:
+                arrays[nombre] = np.frombuffer(f.read(dtype.itemsize), dtype=dtype).reshape(())
+            elif 0 in forma:
+                arrays[nombre] = np.empty(forma, dtype)
+            else:
+                arrays[nombre] = np.memmap(
+                    ruta, dtype=dtype, mode='r', offset=f.tell(), shape=forma,
+                    order='F' if orden_fortran else 'C'
+                )
+    return arrays
+
+
+class BosqueNumpy:
+    """
+    Evaluador vectorizado de un bosque aplanado por aplanar_bosque.
+    """
+
+    def __init__(self, arrays, n_principios):
+        self.caracteristica = arrays['caracteristica']
+        self.umbral = arrays['umbral']
+        self.hijos = arrays['hijos']
+        self.fila_hoja = arrays['fila_hoja']
+        self.valores = arrays['valores']
+        self.raices = np.asarray(arrays['raices'], dtype=np.intp)
+        self.columnas = np.asarray(arrays['columnas'])
+        self.profundidad = int(arrays['profundidad'][0])
+        self.n_principios = n_principios
+
+        # Disposiciones habituales, que se acumulan sin dispersión:
+        # - bosque multi-etiqueta: cada árbol predice todos los principios en orden
+        # - un bosque por principio: los árboles de cada principio son consecutivos
+        n_arboles, n_salidas = self.columnas.shape
+        columnas = self.columnas.ravel()
+        self._salidas_completas = (
+            n_salidas == n_principios and (self.columnas == np.arange(n_principios)).all()
+        )
+        self._por_grupos = (
+            n_salidas == 1 and n_arboles % max(n_principios, 1) == 0 and
+            (columnas == np.repeat(np.arange(n_principios), n_arboles // max(n_principios, 1))).all()
+        )
+        self._columnas_planas = np.where(columnas < 0, n_principios, columnas)
+        self._arboles_por_principio = np.maximum(
+            np.bincount(self._columnas_planas, minlength=n_principios + 1)[:n_principios], 1
+        ).astype(np.float64)
+
+    @property
+    def n_arboles(self):
+        return len(self.raices)
+
+    def _hojas(self, X):
+        """Nodo hoja de cada fila en cada árbol: (n_filas, n_arboles)"""
+        # Mismo criterio que scikit-learn: X en float32, a la derecha si X > umbral.
+        # X se aplana por columnas para leer X[fila, caracteristica] con un take.
+        n = len(X)
+        X_columnas = np.ascontiguousarray(np.asarray(X, dtype=np.float32).T).ravel()
+        filas = np.arange(n, dtype=np.intp)[:, np.newaxis]
+        nodos = np.broadcast_to(self.raices, (n, self.n_arboles))
+        for _ in range(self.profundidad):
+            a_la_derecha = X_columnas.take(self.caracteristica.take(nodos) * n + filas) > self.umbral.take(nodos)
+            nodos = self.hijos.take(2 * nodos + a_la_derecha).astype(np.intp)
+        return nodos
+
+    def probabilidades(self, X):
+        """
+        Probabilidad de la clase positiva de cada principio (media de los
+        árboles, como predict_proba del bosque).
+        X: array (n_filas, n_features) en el orden de FEATURES_CODIFICADAS
+        Retorna: ndarray (n_filas, n_principios)
+        """
+        X = np.asarray(X)
+        resultado = np.zeros((len(X), self.n_principios))
+        n_salidas = self.columnas.shape[1]
+        tanda = max(1, ELEMENTOS_POR_TANDA // (self.n_arboles * n_salidas))
+
+        for inicio in range(0, len(X), tanda):
+            lote = X[inicio:inicio + tanda]
+            valores = self.valores[self.fila_hoja.take(self._hojas(lote))]  # (n, arboles, salidas)
+            if self._salidas_completas:
+                suma = valores.sum(axis=1, dtype=np.float64)
+            elif self._por_grupos:
+                suma = valores.reshape(len(lote), self.n_principios, -1).sum(axis=2, dtype=np.float64)
+            else:
+                # Columna de relleno (-1) → columna auxiliar n_principios, que se descarta
+                ancho = self.n_principios + 1
+                indices = np.arange(len(lote))[:, np.newaxis] * ancho + self._columnas_planas
+                suma = np.bincount(
+                    indices.ravel(), weights=valores.reshape(len(lote), -1).ravel(),
+                    minlength=len(lote) * ancho
+                ).reshape(len(lote), ancho)[:, :self.n_principios]
+            resultado[inicio:inicio + tanda] = suma / self._arboles_por_principio
+        return resultado
+
+
+class ArtefactoNumpy:
+    """Contenido de un .npz exportado, listo para predecir"""
+
+    def __init__(self, arrays):
+        formato = int(arrays['formato'][0])
+        if formato != FORMATO_ARTEFACTO:
+            raise ValueError(f"Formato de artefacto no soportado: {formato}")
+
+        self.encoders = {
+            col: ClasesCodificadas(arrays[f'clases_{col}']) for col in COLUMNAS_CODIFICADAS
+        }
+        self.mlb = ClasesCodificadas(arrays['clases_principios'])
+        self.bosque = BosqueNumpy(arrays, len(self.mlb.classes_))
+        self.tabla = arrays.get('tabla')
+
+
+def cargar_artefacto(ruta):
+    """Abre un artefacto exportado con exportar_artefacto (memory-mapped)"""
+    return ArtefactoNumpy(abrir_npz(ruta))
@@ -0,0 +1,294 @@
+# controllers/lsh_similitud.py
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from controllers.cache_ficheros import INDICES_DIR, CacheFicheros, huella_filas
+from controllers.inferencia_numpy import abrir_npz
+
+# Configuración
+INDICE_LSH = os.path.join(INDICES_DIR, "lsh_microciclos.npz")
+# Con contexto las firmas son otras: fichero aparte para que consultar con
+# y sin contexto no reescriba el índice en cada alternancia
+INDICE_LSH_CONTEXTO = os.path.join(INDICES_DIR, "lsh_microciclos_contexto.npz")
+N_PERMUTACIONES = 128
+# 42 bandas de 3 filas: dos microciclos con Jaccard ≈ 0.25 ya tienen
+# un 50 % de opciones de ser candidatos; con 0.5, más del 99 %
+FILAS_POR_BANDA = 3
+SEMILLA_LSH = 20240601
+# Tamaño máximo (filas × permutaciones) de cada bloque al calcular firmas
+ELEMENTOS_POR_BLOQUE = 4_000_000
+
+_MULTIPLICADOR_BANDA = np.uint64(0x100000001B3)
+
+
+def _tokens(df, con_contexto=False):
+    """
+    (nombre_microciclo, token) únicos. Los tokens son los principios y, con
+    contexto, también "dia|bloque|principio" (mismo principio en otra franja
+    cuenta como distinto).
+    """
+    datos = df.dropna(subset=['nombre_microciclo', 'principio'])
+    nombres = datos['nombre_microciclo'].astype(str)
+    principios = datos['principio'].astype(str)
+    tokens = pd.DataFrame({'nombre': nombres, 'token': principios})
+    if con_contexto and 'dia' in df.columns and 'bloque' in df.columns:
+        contexto = datos['dia'].astype(str) + '|' + datos['bloque'].astype(str) + '|' + principios
+        tokens = pd.concat([tokens, pd.DataFrame({'nombre': nombres, 'token': contexto})], ignore_index=True)
+    return tokens.drop_duplicates()
+
+
+def ruta_indice_lsh(con_contexto=False):
+    return INDICE_LSH_CONTEXTO if con_contexto else INDICE_LSH
+
+
+def _permutaciones(n_permutaciones, semilla=SEMILLA_LSH):
+    """
+    Coeficientes (a, b) del hash multiplicativo h(x) = (a·x + b) mod 2^64,
+    del que se toman los 32 bits altos; a es impar.
+    """
+    rng = np.random.default_rng(semilla)
+    a = rng.integers(0, np.iinfo(np.uint64).max, n_permutaciones, dtype=np.uint64, endpoint=True) | np.uint64(1)
+    b = rng.integers(0, np.iinfo(np.uint64).max, n_permutaciones, dtype=np.uint64, endpoint=True)
+    return a, b
+
+
+def calcular_firmas(filas, tokens, n_filas, n_permutaciones=N_PERMUTACIONES):
+    """
+    Firmas MinHash (n_filas × n_permutaciones, uint32).
+    filas: fila de cada par (fila, token); tokens: texto del token
+    Cada token distinto se hashea una sola vez; el mínimo por fila se
+    calcula con np.minimum.reduceat por bloques de filas.
+    """
+    codigos, unicos = pd.factorize(pd.Series(tokens, dtype=object))
+    x = pd.util.hash_array(np.asarray(unicos, dtype=object))
+    a, b = _permutaciones(n_permutaciones)
+    with np.errstate(over='ignore'):
+        hashes = ((x[:, None] * a[None, :] + b[None, :]) >> np.uint64(32)).astype(np.uint32)
+
+    firmas = np.full((n_filas, n_permutaciones), np.iinfo(np.uint32).max, dtype=np.uint32)
+    orden = np.argsort(filas, kind='stable')
+    filas = np.asarray(filas)[orden]
+    codigos = codigos[orden]
+    presentes, inicios = np.unique(filas, return_index=True)
+    limites = np.append(inicios, len(filas))
+
+    por_bloque = max(1, ELEMENTOS_POR_BLOQUE // n_permutaciones)
+    i = 0
+    while i < len(presentes):
+        # Bloque de filas completas con como mucho por_bloque pares
+        j = max(i + 1, int(np.searchsorted(limites, limites[i] + por_bloque, side='right')) - 1)
+        j = min(j, len(presentes))
+        tramo = hashes[codigos[limites[i]:limites[j]]]
+        firmas[presentes[i:j]] = np.minimum.reduceat(tramo, limites[i:j] - limites[i], axis=0)
+        i = j
+    return firmas
+
+
+def claves_bandas(firmas, filas_por_banda=FILAS_POR_BANDA):
+    """
+    Clave de 64 bits de cada banda de cada firma (n × n_bandas). El número
+    de banda entra en la clave, así que todas las cubetas caben en un único
+    array ordenado.
+    """
+    n_bandas = firmas.shape[1] // filas_por_banda
+    bandas = firmas[:, :n_bandas * filas_por_banda].reshape(len(firmas), n_bandas, filas_por_banda)
+    claves = np.broadcast_to(np.arange(n_bandas, dtype=np.uint64), (len(firmas), n_bandas))
+    with np.errstate(over='ignore'):
+        for j in range(filas_por_banda):
+            claves = claves * _MULTIPLICADOR_BANDA + bandas[:, :, j].astype(np.uint64)
+    return claves
+
+
+class IndiceLSH:
+    """
+    Índice aproximado MinHash + LSH por bandas sobre el conjunto de tokens
+    de cada microciclo:
+        nombres            fila → microciclo
+        firmas             (n, N_PERMUTACIONES) uint32
+        claves_ordenadas   claves de todas las bandas de todos los microciclos, ordenadas (cubetas en disco)
+        filas_ordenadas    fila de cada una de esas claves
+    Son candidatos los microciclos que coinciden con la referencia en todas
+    las filas de alguna banda; quien consulta los reordena después con la
+    similitud exacta.
+    """
+
+    def __init__(self, nombres, firmas, claves_ordenadas, filas_ordenadas,
+                 filas_por_banda=FILAS_POR_BANDA, con_contexto=False, huella=None):
+        self.nombres = list(nombres)
+        self.filas = {nombre: fila for fila, nombre in enumerate(self.nombres)}
+        self.firmas = firmas
+        self.claves_ordenadas = claves_ordenadas
+        self.filas_ordenadas = filas_ordenadas
+        self.filas_por_banda = int(filas_por_banda)
+        self.con_contexto = bool(con_contexto)
+        self.huella = huella
+        self._correspondencia = None
+
+    @staticmethod
+    def columnas_huella(con_contexto):
+        return ('nombre_microciclo', 'principio', 'dia', 'bloque') if con_contexto else ('nombre_microciclo', 'principio')
+
+    @classmethod
+    def desde_dataframe(cls, df, con_contexto=False, n_permutaciones=N_PERMUTACIONES, filas_por_banda=FILAS_POR_BANDA):
+        tokens = _tokens(df, con_contexto)
+        filas, nombres = pd.factorize(tokens['nombre'], sort=True)
+        firmas = calcular_firmas(filas, tokens['token'].to_numpy(), len(nombres), n_permutaciones)
+
+        claves = claves_bandas(firmas, filas_por_banda).ravel()
+        orden = np.argsort(claves, kind='stable')
+        n_bandas = firmas.shape[1] // filas_por_banda
+        return cls(
+            nombres, firmas,
+            claves[orden], (orden // max(n_bandas, 1)).astype(np.int32),
+            filas_por_banda, con_contexto,
+            huella_filas(df, cls.columnas_huella(con_contexto)),
+        )
+
+    @property
+    def n_microciclos(self):
+        return len(self.nombres)
+
+    def actualizado(self, df_nuevo, microciclos):
+        """
+        Índice nuevo tras cambiar los microciclos indicados: solo se vuelven a
+        firmar esos; sus claves salen de las cubetas y las nuevas se insertan
+        en su sitio (el resto del array ya está ordenado). Los microciclos que
+        se quedan sin tokens desaparecen. No modifica este índice.
+        """
+        microciclos = {str(m) for m in microciclos}
+        tokens = _tokens(df_nuevo, self.con_contexto)
+        tokens = tokens[tokens['nombre'].isin(microciclos)]
+        filas_nuevas, nombres_nuevos = pd.factorize(tokens['nombre'], sort=True)
+        firmas_nuevas = calcular_firmas(
+            filas_nuevas, tokens['token'].to_numpy(), len(nombres_nuevos), self.firmas.shape[1]
+        )
+
+        # Filas que se conservan (renumeradas) y firmas resultantes
+        conservar = np.array([n not in microciclos for n in self.nombres], dtype=bool)
+        renumeracion = np.cumsum(conservar, dtype=np.int64) - 1
+        nombres = [n for n, c in zip(self.nombres, conservar) if c] + list(nombres_nuevos)
+        firmas = np.vstack([np.asarray(self.firmas)[conservar], firmas_nuevas])
+
+        # Cubetas: fuera las claves de las filas cambiadas, dentro las nuevas
+        filas_ordenadas = np.asarray(self.filas_ordenadas)
+        quedan = conservar[filas_ordenadas]
+        claves_viejas = np.asarray(self.claves_ordenadas)[quedan]
+        filas_viejas = renumeracion[filas_ordenadas[quedan]].astype(np.int32)
+
+        claves = claves_bandas(firmas_nuevas, self.filas_por_banda).ravel()
+        orden = np.argsort(claves, kind='stable')
+        n_bandas = firmas.shape[1] // self.filas_por_banda
+        filas = (int(conservar.sum()) + orden // max(n_bandas, 1)).astype(np.int32)
+        posiciones = np.searchsorted(claves_viejas, claves[orden], side='right')
+
+        return IndiceLSH(
+            nombres, firmas,
+            np.insert(claves_viejas, posiciones, claves[orden]), np.insert(filas_viejas, posiciones, filas),
+            self.filas_por_banda, self.con_contexto,
+            huella_filas(df_nuevo, self.columnas_huella(self.con_contexto)),
+        )
+
+    def filas_candidatas(self, nombre):
+        """Filas (de este índice) que comparten cubeta con el microciclo en alguna banda, sin incluirlo"""
+        fila = self.filas.get(str(nombre))
+        if fila is None:
+            return np.zeros(0, dtype=np.int32)
+        claves = claves_bandas(self.firmas[fila:fila + 1], self.filas_por_banda)[0]
+        inicios = np.searchsorted(self.claves_ordenadas, claves, side='left')
+        fines = np.searchsorted(self.claves_ordenadas, claves, side='right')
+        compartidas = fines - inicios > 1
+        if not compartidas.any():
+            return np.zeros(0, dtype=np.int32)
+        filas = np.unique(np.concatenate([
+            self.filas_ordenadas[i:f] for i, f in zip(inicios[compartidas], fines[compartidas])
+        ]))
+        return filas[filas != fila]
+
+    def candidatos(self, nombre):
+        """Nombres de los microciclos candidatos (ver filas_candidatas)"""
+        return [self.nombres[i] for i in self.filas_candidatas(nombre)]
+
+    def filas_en(self, indice):
+        """
+        Fila de cada microciclo de este índice en un IndiceSimilitud (-1 si no
+        está). Se calcula una vez por versión (huella) del índice exacto.
+        """
+        clave = (id(indice), indice.huella, indice.n_microciclos)
+        if self._correspondencia is None or self._correspondencia[0] != clave:
+            filas = np.array([indice.filas.get(n, -1) for n in self.nombres], dtype=np.int64)
+            self._correspondencia = (clave, filas)
+        return self._correspondencia[1]
+
+    def guardar(self, ruta=None):
+        """Escritura atómica; sin comprimir para poder mapear las cubetas en memoria"""
+        ruta = ruta or ruta_indice_lsh(self.con_contexto)
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f,
+                nombres=np.asarray(self.nombres, dtype=str),
+                firmas=self.firmas,
+                claves_ordenadas=self.claves_ordenadas,
+                filas_ordenadas=self.filas_ordenadas,
+                filas_por_banda=np.asarray(self.filas_por_banda),
+                con_contexto=np.asarray(self.con_contexto),
+                huella=np.asarray(self.huella or "", dtype=str),
+            )
+        os.replace(tmp, ruta)
+
+    @classmethod
+    def cargar(cls, ruta=INDICE_LSH):
+        """Carga un índice guardado (firmas y cubetas mapeadas en memoria); None si no se puede"""
+        try:
+            arrays = abrir_npz(ruta)
+            return cls(
+                arrays['nombres'].tolist(), arrays['firmas'],
+                arrays['claves_ordenadas'], arrays['filas_ordenadas'],
+                int(arrays['filas_por_banda']), bool(arrays['con_contexto']),
+                str(arrays['huella']) or None,
+            )
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+# Caché de los índices (uno por fichero) compartida por todas las sesiones
+_cache_indices = CacheFicheros(IndiceLSH.cargar)
+
+
+def obtener_indice_lsh(df, con_contexto=False, ruta=None):
+    """
+    Índice LSH correspondiente a df: el guardado si coincide su huella (cada
+    opción de contexto tiene su fichero); si no, se reconstruye y se guarda.
+    """
+    ruta = ruta or ruta_indice_lsh(con_contexto)
+    huella = huella_filas(df, IndiceLSH.columnas_huella(con_contexto))
+    with _cache_indices.lock:
+        indice = _cache_indices.obtener(ruta)
+        if indice is None or indice.huella != huella or indice.con_contexto != bool(con_contexto):
+            indice = IndiceLSH.desde_dataframe(df, con_contexto)
+            _cache_indices.publicar(indice, ruta)
+        return indice
+
+
+def actualizar_lsh_tras_guardado(df_anterior, df_nuevo, microciclos):
+    """
+    Tras guardar planificación, vuelve a firmar solo los microciclos tocados
+    en cada índice LSH (con y sin contexto) que correspondía a los datos
+    anteriores. Los que no existen o ya no correspondían se quedan como
+    están: obtener_indice_lsh los reconstruye en la próxima consulta.
+    """
+    actualizados = 0
+    with _cache_indices.lock:
+        for con_contexto in (False, True):
+            ruta = ruta_indice_lsh(con_contexto)
+            indice = _cache_indices.obtener(ruta)
+            columnas = IndiceLSH.columnas_huella(con_contexto)
+            if indice is None or indice.huella != huella_filas(df_anterior, columnas):
+                continue
+            _cache_indices.publicar(indice.actualizado(df_nuevo, microciclos), ruta)
+            actualizados += 1
+    return actualizados
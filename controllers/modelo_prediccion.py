@@ -2,39 +2,266 @@
 
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import LabelEncoder, MultiLabelBinarizer
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.multioutput import MultiOutputClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, f1_score
-from sklearn.neighbors import NearestNeighbors
-import joblib
+import hashlib
+import json
+import multiprocessing
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import warnings
 import logging
 
+from controllers.registro_modelos import RegistroModelos, FICHERO_ARBOLES
+from controllers.inferencia_numpy import BosqueNumpy, cargar_artefacto, exportar_artefacto
+from controllers.indice_similitud import obtener_indice_similitud
+from controllers.lsh_similitud import obtener_indice_lsh
+from controllers.cubo_carga import obtener_cubo_carga
+
 warnings.filterwarnings('ignore')
 
+# scikit-learn y joblib se importan dentro de las funciones que los usan:
+# abrir la página (estadísticas, metadatos) no debe pagar su importación ni
+# la deserialización del bosque. Para predecir se usa el artefacto .npz de la
+# versión (controllers/inferencia_numpy.py), que tampoco los necesita.
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Franjas de un microciclo (mismas que el editor)
+DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+BLOQUES_SESION = ["inicial", "situacional", "global", "global_competitiva", "final"]
+
+# Motores de entrenamiento
+# - "nativo": un único RandomForest multi-etiqueta (cada árbol predice todos los principios)
+# - "multioutput": un RandomForest por principio (MultiOutputClassifier, motor original)
+MOTOR_NATIVO = "nativo"
+MOTOR_MULTIOUTPUT = "multioutput"
+MOTORES_DISPONIBLES = [MOTOR_NATIVO, MOTOR_MULTIOUTPUT]
+MOTOR_POR_DEFECTO = MOTOR_NATIVO
+
+# Meses cubiertos por la tabla de probabilidades precalculada
+MESES_TABLA = 12
+
+# Fases del entrenamiento (para informar del progreso)
+FASES_ENTRENAMIENTO = ["preparar", "entrenar", "evaluar", "guardar"]
+MENSAJE_CANCELADO = "Entrenamiento cancelado"
+
+# Entrenamiento incremental
+ARBOLES_POR_INCREMENTO = 10      # árboles del bosque que se añade en cada incremento
+MAX_INCREMENTOS = 5              # tras estos incrementos se reentrena desde cero
+FRACCION_MAX_INCREMENTAL = 0.25  # si cambian más franjas que esta fracción, entrenamiento completo
+
+# Similitud: a partir de estos microciclos se usan candidatos MinHash/LSH
+UMBRAL_SIMILITUD_APROXIMADA = 50000
+
+# Modelos por categoría
+MIN_FRANJAS_FRAGMENTO = 20       # franjas de entrenamiento para que una categoría tenga modelo propio
+ARBOLES_FRAGMENTO = 30           # árboles de cada modelo por categoría (más ligero que el global)
+MIN_FRANJAS_PARALELO = 2000      # por debajo, arrancar procesos cuesta más que ajustar en el propio
+
+class CachePredicciones:
+    """
+    Caché LRU acotada de predicciones.
+    La clave incluye el identificador del modelo, así que un modelo nuevo
+    nunca sirve resultados de uno anterior; además se vacía al entrenar,
+    cargar o resetear.
+    """
+    
+    def __init__(self, capacidad=512):
+        self.capacidad = capacidad
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+    
+    def obtener(self, clave):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return self._datos[clave]
+            self.fallos += 1
+            return None
+    
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.capacidad:
+                self._datos.popitem(last=False)
+    
+    def invalidar(self):
+        with self._lock:
+            self._datos.clear()
+            self.invalidaciones += 1
+    
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'capacidad': self.capacidad,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': self.aciertos / total if total else 0.0,
+                'invalidaciones': self.invalidaciones
+            }
+
+class ModeloIncremental:
+    """
+    Modelo ampliado por entrenamientos incrementales: el bosque del último
+    entrenamiento completo más un bosque pequeño por incremento.
+    Cada miembro es (estimador, columnas): columnas son los índices en
+    mlb.classes_ de los principios que predice (los que existían cuando se
+    ajustó). La probabilidad de un principio es la media de todos los
+    árboles que lo predicen, igual que en un único bosque.
+    """
+    
+    def __init__(self, miembros):
+        self.miembros = [(estimador, np.asarray(columnas, dtype=np.int64)) for estimador, columnas in miembros]
+    
+    @classmethod
+    def ampliar(cls, modelo, n_principios_modelo, nuevo, n_principios_nuevo):
+        """Añade al modelo (incremental o no) un bosque ajustado sobre los principios actuales"""
+        if isinstance(modelo, cls):
+            miembros = list(modelo.miembros)
+        else:
+            miembros = [(modelo, np.arange(n_principios_modelo))]
+        return cls(miembros + [(nuevo, np.arange(n_principios_nuevo))])
+    
+    @staticmethod
+    def arboles_por_principio(estimador):
+        """Árboles que votan cada principio del estimador"""
+        estimadores = getattr(estimador, 'estimators_', None) or []
+        if estimadores and hasattr(estimadores[0], 'estimators_'):  # un bosque por principio
+            return len(estimadores[0].estimators_)
+        return max(len(estimadores), 1)
+    
+    @classmethod
+    def arboles_por_columna(cls, modelo, n_principios):
+        """Árboles que votan cada uno de los n_principios primeros principios"""
+        if not isinstance(modelo, cls):
+            return np.full(n_principios, float(cls.arboles_por_principio(modelo)))
+        arboles = np.zeros(n_principios)
+        for estimador, columnas in modelo.miembros:
+            arboles[columnas[columnas < n_principios]] += cls.arboles_por_principio(estimador)
+        return arboles
+
+class ModeloPorCategoria:
+    """
+    Un modelo ligero por categoría más el modelo global. Cada fragmento es
+    (estimador, columnas), como los miembros de ModeloIncremental, ajustado
+    solo con las franjas de su categoría y solo para los principios que esta
+    ha usado. Las categorías sin fragmento (pocos datos o no vistas) se
+    predicen con el modelo global.
+        modelo_global  estimador ajustado con todo el histórico
+        fragmentos     {código de categoría: (estimador, columnas)}
+    """
+    
+    def __init__(self, modelo_global, fragmentos=None):
+        self.modelo_global = modelo_global
+        self.fragmentos = {
+            int(codigo): (estimador, np.asarray(columnas, dtype=np.int64))
+            for codigo, (estimador, columnas) in (fragmentos or {}).items()
+        }
+    
+    def con_fragmentos(self, nuevos):
+        """Modelo nuevo con los fragmentos indicados sustituidos o añadidos"""
+        return ModeloPorCategoria(self.modelo_global, {**self.fragmentos, **nuevos})
+
+def _ajustar_fragmento(codigo, motor, X_train, y_train, X_test, y_test):
+    """
+    Ajusta el modelo de una categoría (en un proceso del pool o en el propio).
+    Retorna: (codigo, estimador, columnas, métricas)
+    """
+    from sklearn.metrics import accuracy_score, f1_score
+    
+    columnas = np.flatnonzero(y_train.any(axis=0))
+    estimador = PredictorTactico._crear_modelo(motor, n_estimadores=ARBOLES_FRAGMENTO, n_jobs=1)
+    inicio = time.perf_counter()
+    estimador.fit(X_train, y_train[:, columnas])
+    metricas = {
+        'franjas_entrenamiento': len(X_train),
+        'franjas_prueba': len(X_test),
+        'principios': len(columnas),
+        'tiempo_entrenamiento_s': round(time.perf_counter() - inicio, 3),
+        'accuracy': None,
+        'f1_score': None
+    }
+    
+    if len(X_test):
+        # Se evalúan los principios que la categoría usa en entrenamiento o prueba
+        y_pred = np.zeros_like(y_test)
+        y_pred[:, columnas] = PredictorTactico._probabilidades_estimador(estimador, X_test, len(columnas)) > 0.5
+        evaluadas = np.union1d(columnas, np.flatnonzero(y_test.any(axis=0)))
+        metricas['accuracy'] = float(accuracy_score(y_test[:, evaluadas], y_pred[:, evaluadas]))
+        metricas['f1_score'] = float(f1_score(y_test[:, evaluadas], y_pred[:, evaluadas], average='macro', zero_division=0))
+    
+    return codigo, estimador, columnas, metricas
+
+def ajustar_fragmentos(tareas, motor, procesos=None, mientras=None):
+    """
+    Ajusta los modelos por categoría. Con datos suficientes se reparten en
+    un pool de procesos (spawn, como los entrenamientos en segundo plano);
+    mientras tanto el proceso actual ejecuta `mientras` (p. ej. el ajuste
+    del modelo global).
+    tareas: {codigo: (X_train, y_train, X_test, y_test)}
+    procesos: tamaño del pool (por defecto, uno por CPU hasta el nº de tareas)
+    Retorna: ({codigo: (estimador, columnas, métricas)}, resultado de mientras)
+    """
+    if procesos is None:
+        procesos = min(len(tareas), os.cpu_count() or 1)
+    franjas = sum(len(tarea[0]) for tarea in tareas.values())
+    en_paralelo = procesos > 1 and len(tareas) > 1 and franjas >= MIN_FRANJAS_PARALELO
+    
+    if not en_paralelo:
+        resultado_mientras = mientras() if mientras is not None else None
+        resultados = [_ajustar_fragmento(codigo, motor, *tarea) for codigo, tarea in tareas.items()]
+    else:
+        executor = ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            futuros = [executor.submit(_ajustar_fragmento, codigo, motor, *tarea) for codigo, tarea in tareas.items()]
+            resultado_mientras = mientras() if mientras is not None else None
+            resultados = [futuro.result() for futuro in futuros]
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    return {codigo: (estimador, columnas, metricas) for codigo, estimador, columnas, metricas in resultados}, resultado_mientras
+
 class PredictorTactico:
     """
     Sistema de ML para predecir principios tácticos basado en historial
     Versión blindada con manejo exhaustivo de errores
     """
     
-    def __init__(self, model_path="models/predictor_tactico.pkl"):
+    FEATURES_CODIFICADAS = ['categoria_encoded', 'bloque_encoded', 'dia_encoded', 'mes_temporada']
+    
+    def __init__(self, model_path="models/predictor_tactico.pkl", motor=MOTOR_POR_DEFECTO):
         self.model_path = model_path
+        self.motor = motor
         self.model = None
         self.encoders = {}
-        self.mlb = MultiLabelBinarizer()
+        self._mapas_codificacion = {}  # columna → (encoder, {valor: código})
+        self.mlb = None
         self.feature_columns = ['categoria', 'bloque', 'dia', 'mes_temporada']
         self.is_trained = False
         self.min_samples_required = 10
         self.model_version = "2.0"  # Versión para detectar modelos incompatibles
+        self.model_id = None        # Identificador del artefacto concreto (clave de la caché)
+        self.stats = {}
+        self.tabla_probabilidades = None  # (categoria, bloque, dia, mes, principio) precalculada
+        self.franjas_vistas = None        # {(categoria, bloque, dia, mes): principios} del último entrenamiento
+        self.firma_artefacto = None       # firma del puntero de versión activa al cargar/guardar
+        self.version_activa = None
+        self.registro = RegistroModelos(os.path.join(os.path.dirname(model_path) or ".", "registro"))
+        self._artefacto_cargado = False   # model/encoders/mlb/tabla se cargan al primer uso
+        self._lock_carga = threading.Lock()
+        self.cache_predicciones = CachePredicciones()
         
         # Crear directorio si no existe
         try:
@@ -42,8 +269,8 @@ class PredictorTactico:
         except Exception as e:
             logger.warning(f"No se pudo crear directorio de modelos: {e}")
         
-        # Cargar modelo si existe
-        self.cargar_modelo()
+        # Solo metadatos: el artefacto se carga con la primera predicción
+        self.cargar_modelo(diferido=True)
     
     def validar_datos_entrada(self, df):
         """
@@ -79,71 +306,472 @@ class PredictorTactico:
     
     def preparar_features(self, df):
         """
-        Prepara las características para el modelo con manejo robusto de errores
+        Prepara las características para el modelo.
+        Las columnas categóricas se codifican de forma vectorizada con un
+        diccionario por encoder; los valores no vistos se codifican como -1.
+        Si una columna no puede codificarse queda entera a -1 (no vista), nunca
+        a 0, que es una clase real.
         """
-        try:
-            df_prep = df.copy()
-            
-            # Extraer mes de la temporada si existe
-            if 'id_temporada' in df_prep.columns:
-                try:
-                    df_prep['mes_temporada'] = pd.to_datetime(
-                        df_prep['id_temporada'].astype(str), 
-                        format='%Y-%m',
-                        errors='coerce'
-                    ).dt.month.fillna(1)
-                except:
-                    df_prep['mes_temporada'] = 1
-            else:
-                df_prep['mes_temporada'] = 1
-            
-            # Codificar variables categóricas de forma segura
-            for col in ['categoria', 'bloque', 'dia']:
-                if col in df_prep.columns:
-                    # Asegurar que son strings
-                    df_prep[col] = df_prep[col].astype(str).str.strip()
-                    
-                    if col not in self.encoders:
-                        self.encoders[col] = LabelEncoder()
-                        try:
-                            df_prep[f'{col}_encoded'] = self.encoders[col].fit_transform(df_prep[col])
-                        except Exception as e:
-                            logger.error(f"Error codificando {col}: {e}")
-                            df_prep[f'{col}_encoded'] = 0
-                    else:
-                        # Manejar categorías no vistas de forma segura
-                        df_prep[f'{col}_encoded'] = df_prep[col].apply(
-                            lambda x: self._encode_safe(col, x)
-                        )
-            
-            return df_prep
+        df_prep = df.copy()
+        
+        # Extraer mes de la temporada si existe
+        df_prep['mes_temporada'] = self._mes_temporada(df_prep)
+        
+        # Codificar variables categóricas de forma segura
+        for col in ['categoria', 'bloque', 'dia']:
+            if col not in df_prep.columns:
+                continue
             
-        except Exception as e:
-            logger.error(f"Error preparando features: {e}")
-            # Retornar DataFrame con columnas encoded en 0
-            for col in ['categoria', 'bloque', 'dia']:
-                df_prep[f'{col}_encoded'] = 0
-            df_prep['mes_temporada'] = 1
-            return df_prep
+            # Asegurar que son strings
+            df_prep[col] = df_prep[col].astype(str).str.strip()
+            
+            try:
+                if col not in self.encoders:
+                    from sklearn.preprocessing import LabelEncoder
+                    self.encoders[col] = LabelEncoder().fit(df_prep[col])
+                
+                df_prep[f'{col}_encoded'] = (
+                    df_prep[col].map(self._mapa_codificacion(col)).fillna(-1).astype(np.int64)
+                )
+            except Exception as e:
+                logger.error(f"Error codificando {col}: {e}")
+                df_prep[f'{col}_encoded'] = -1
+        
+        return df_prep
+    
+    @staticmethod
+    def _mes_temporada(df):
+        """
+        Mes de la temporada por fila (1 si no hay id_temporada o no es 'AAAA-MM')
+        """
+        if 'id_temporada' in df.columns:
+            try:
+                return pd.to_datetime(
+                    df['id_temporada'].astype(str),
+                    format='%Y-%m',
+                    errors='coerce'
+                ).dt.month.fillna(1)
+            except Exception:
+                pass
+        return pd.Series(1, index=df.index)
+    
+    @classmethod
+    def huella_datos(cls, df):
+        """
+        Huella (sha256) del conjunto de entrenamiento agrupado: las mismas
+        franjas con los mismos principios dan la misma huella, sea cual sea
+        el orden de las filas o los duplicados.
+        """
+        agrupado = cls._agrupar_franjas(df)
+        contenido = json.dumps(
+            [[*clave, principios] for clave, principios in agrupado.items()],
+            ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def _agrupar_franjas(cls, df):
+        """
+        Principios (ordenados, sin repetir) de cada franja
+        (categoria, bloque, dia, mes_temporada) del histórico.
+        Retorna: Series indexada por la franja
+        """
+        columnas = ['categoria', 'bloque', 'dia', 'principio']
+        datos = df.dropna(subset=columnas)
+        claves = datos[columnas].astype(str).apply(lambda c: c.str.strip())
+        claves['mes_temporada'] = cls._mes_temporada(datos).astype(int)
+        
+        return claves.groupby(['categoria', 'bloque', 'dia', 'mes_temporada'])['principio'].agg(
+            lambda principios: sorted(set(principios))
+        )
+    
+    @classmethod
+    def franjas_historico(cls, df):
+        """{(categoria, bloque, dia, mes): (principios...)} del histórico"""
+        return {clave: tuple(principios) for clave, principios in cls._agrupar_franjas(df).items()}
+    
+    def _mapa_codificacion(self, col):
+        """
+        Diccionario valor → código del encoder de la columna. Se construye una
+        vez por encoder (se rehace si el encoder cambia al entrenar o cargar).
+        """
+        encoder = self.encoders[col]
+        en_cache = self._mapas_codificacion.get(col)
+        if en_cache is None or en_cache[0] is not encoder:
+            mapa = {str(clase): codigo for codigo, clase in enumerate(encoder.classes_)}
+            self._mapas_codificacion[col] = (encoder, mapa)
+            return mapa
+        return en_cache[1]
     
     def _encode_safe(self, encoder_name, value):
         """
         Codifica un valor de forma segura, manejando valores no vistos
         """
         try:
-            if str(value) in self.encoders[encoder_name].classes_:
-                return self.encoders[encoder_name].transform([str(value)])[0]
-            else:
-                # Valor no visto, retornar -1
-                return -1
-        except:
+            return self._mapa_codificacion(encoder_name).get(str(value), -1)
+        except Exception:
             return -1
     
-    def entrenar_modelo(self, df, test_size=0.2):
+    def entrenar_modelo(self, df, test_size=0.2, motor=None, progreso=None, cancelado=None, forzar=False,
+                        por_categoria=False, procesos=None, hiperparametros=None):
+        """
+        Entrena el modelo con los datos históricos de forma robusta.
+        motor: "nativo" o "multioutput" (por defecto, el del predictor)
+        por_categoria: además del modelo global, un modelo ligero por cada
+        categoría con al menos MIN_FRANJAS_FRAGMENTO franjas de entrenamiento,
+        ajustados en paralelo (ver ajustar_fragmentos); procesos: tamaño del pool
+        hiperparametros: parámetros del bosque global distintos de los de por
+        defecto (ver controllers/busqueda_hiperparametros.py); los incrementos
+        posteriores los heredan, salvo el número de árboles
+        progreso: callable(fase, fraccion) llamado al empezar cada fase
+        cancelado: callable() -> bool consultado entre fases; la cancelación
+        no interrumpe un ajuste en curso, pero descarta su resultado.
+        forzar: reentrenar aunque los datos coincidan con la versión activa
+        Los encoders se ajustan de nuevo en cada entrenamiento; si este falla
+        o se cancela se conservan los del modelo anterior.
+        """
+        motor = motor or self.motor
+        if motor not in MOTORES_DISPONIBLES:
+            return False, f"Motor desconocido: {motor}. Disponibles: {', '.join(MOTORES_DISPONIBLES)}"
+        
+        # Mismos datos y mismo motor que la versión activa: nada que entrenar
+        try:
+            huella = self.huella_datos(df) if df is not None and not df.empty else None
+        except Exception as e:
+            logger.warning(f"No se pudo calcular la huella de los datos: {e}")
+            huella = None
+        
+        if not forzar and huella and self.is_trained:
+            meta = self.registro.meta_activa()
+            if (meta and meta.get('huella_datos') == huella and meta.get('motor') == motor
+                    and bool(meta.get('por_categoria')) == bool(por_categoria)
+                    and (meta.get('hiperparametros_elegidos') or {}) == (hiperparametros or {})):
+                return True, f"Los datos no han cambiado desde la versión activa ({meta.get('version')}). No es necesario reentrenar"
+        
+        from sklearn.preprocessing import MultiLabelBinarizer
+        
+        estado_previo = (self.encoders, self.mlb, self.model, self._artefacto_cargado)
+        self.encoders = {}
+        self.mlb = MultiLabelBinarizer()
+        
+        exito, mensaje = self._entrenar_modelo(
+            df, test_size, motor, progreso, cancelado, huella, por_categoria, procesos, hiperparametros
+        )
+        if not exito:
+            self.encoders, self.mlb, self.model, self._artefacto_cargado = estado_previo
+        return exito, mensaje
+    
+    def entrenar_incremental(self, df, progreso=None, cancelado=None):
+        """
+        Actualiza el modelo activo solo con las franjas nuevas o modificadas
+        desde su entrenamiento (p. ej. el microciclo recién guardado), sin
+        reajustar el histórico completo.
+        
+        Las franjas vistas por el modelo se guardan en su artefacto; las que
+        han cambiado se ajustan en un bosque pequeño (ARBOLES_POR_INCREMENTO
+        árboles) que se añade al modelo existente. Los principios, categorías,
+        bloques y días nuevos amplían los encoders al final, sin cambiar los
+        códigos existentes.
+        
+        Se hace un entrenamiento completo si no hay modelo activo o no registra
+        las franjas vistas, si se han eliminado franjas, si cambia más de
+        FRACCION_MAX_INCREMENTAL del histórico o tras MAX_INCREMENTOS
+        incrementos seguidos.
+        """
+        if df is None or df.empty:
+            return False, "No hay datos para procesar"
+        
+        motor = self.stats.get('motor') or self.motor
+        por_categoria = bool(self.stats.get('por_categoria'))
+        
+        def completo(motivo):
+            logger.info(f"Entrenamiento completo en lugar de incremental: {motivo}")
+            exito, mensaje = self.entrenar_modelo(
+                df, motor=motor, progreso=progreso, cancelado=cancelado, por_categoria=por_categoria,
+                hiperparametros=self.stats.get('hiperparametros_elegidos') or None
+            )
+            return exito, f"{mensaje} (entrenamiento completo: {motivo})" if exito else mensaje
+        
+        if not self.is_trained or self.version_activa is None:
+            return completo("no hay un modelo activo")
+        
+        incrementos = int(self.stats.get('incrementos', 0) or 0)
+        if incrementos >= MAX_INCREMENTOS:
+            return completo(f"{incrementos} incrementos desde el último entrenamiento completo")
+        
+        self._notificar_progreso(progreso, "preparar")
+        
+        # El .npz no guarda los estimadores: el incremento parte del .pkl
+        try:
+            import joblib
+            modelo_data = joblib.load(self.registro.ruta_modelo(self.version_activa))
+        except Exception as e:
+            return completo(f"no se pudo leer la versión activa ({e})")
+        
+        vistas = modelo_data.get('franjas_vistas')
+        if not vistas or modelo_data.get('model') is None:
+            return completo("la versión activa no registra las franjas vistas")
+        
+        es_valido, mensaje = self.validar_datos_entrada(df)
+        if not es_valido:
+            return False, mensaje
+        
+        try:
+            actuales = self.franjas_historico(df)
+        except Exception as e:
+            return False, f"Error agrupando datos: {str(e)}"
+        
+        if isinstance(modelo_data['model'], ModeloPorCategoria):
+            return self._reentrenar_fragmentos(df, modelo_data, vistas, actuales, motor, progreso, cancelado, completo)
+        
+        if set(vistas) - set(actuales):
+            return completo("se han eliminado franjas del histórico")
+        
+        cambiadas = [clave for clave, principios in actuales.items() if vistas.get(clave) != principios]
+        if not cambiadas:
+            return True, "No hay franjas nuevas ni modificadas desde la versión activa. No es necesario reentrenar"
+        if len(cambiadas) > FRACCION_MAX_INCREMENTAL * len(actuales):
+            return completo(f"han cambiado {len(cambiadas)} de {len(actuales)} franjas")
+        
+        from sklearn.preprocessing import LabelEncoder, MultiLabelBinarizer
+        
+        estado_previo = (self.encoders, self.mlb, self.model, self._artefacto_cargado)
+        try:
+            # Encoders ampliados: las clases nuevas van al final, los códigos
+            # que ya conocen los árboles no cambian
+            self.encoders = {}
+            for eje, col in enumerate(['categoria', 'bloque', 'dia']):
+                encoder = LabelEncoder()
+                encoder.classes_ = self._ampliar_clases(
+                    modelo_data['encoders'][col].classes_, (clave[eje] for clave in cambiadas)
+                )
+                self.encoders[col] = encoder
+            
+            principios_previos = modelo_data['mlb'].classes_
+            self.mlb = MultiLabelBinarizer(classes=list(self._ampliar_clases(
+                principios_previos, (p for clave in cambiadas for p in actuales[clave])
+            )))
+            self.mlb.fit([])
+            
+            # Franjas cambiadas más una muestra igual de franjas sin cambios,
+            # para que el bosque nuevo también aprenda dónde NO van sus principios
+            conjunto_cambiadas = set(cambiadas)
+            sin_cambios = [clave for clave in actuales if clave not in conjunto_cambiadas]
+            rng = np.random.default_rng(42)
+            n_contexto = min(len(sin_cambios), len(cambiadas))
+            contexto = [sin_cambios[i] for i in rng.choice(len(sin_cambios), n_contexto, replace=False)] if n_contexto else []
+            claves = cambiadas + contexto
+            
+            # Mismas features que el entrenamiento completo
+            X = self.preparar_features(pd.DataFrame(claves, columns=['categoria', 'bloque', 'dia', 'mes_temporada']))
+            X_encoded = X[self.FEATURES_CODIFICADAS]
+            if (X_encoded[['categoria_encoded', 'bloque_encoded', 'dia_encoded']] == -1).any().any():
+                raise ValueError("no se pudieron codificar las franjas nuevas")
+            y = self.mlb.transform([actuales[clave] for clave in claves])
+            
+            if cancelado is not None and cancelado():
+                raise InterruptedError(MENSAJE_CANCELADO)
+            
+            self._notificar_progreso(progreso, "entrenar")
+            heredados = {k: v for k, v in (self.stats.get('hiperparametros_elegidos') or {}).items() if k != 'n_estimators'}
+            nuevo = self._crear_modelo(motor, n_estimadores=ARBOLES_POR_INCREMENTO, hiperparametros=heredados)
+            inicio_ajuste = time.perf_counter()
+            nuevo.fit(X_encoded, y)
+            tiempo_ajuste = time.perf_counter() - inicio_ajuste
+            
+            if cancelado is not None and cancelado():
+                raise InterruptedError(MENSAJE_CANCELADO)
+            
+            self._notificar_progreso(progreso, "evaluar")
+            self.model = ModeloIncremental.ampliar(
+                modelo_data['model'], len(principios_previos), nuevo, len(self.mlb.classes_)
+            )
+        except InterruptedError:
+            self.encoders, self.mlb, self.model, self._artefacto_cargado = estado_previo
+            return False, MENSAJE_CANCELADO
+        except Exception as e:
+            self.encoders, self.mlb, self.model, self._artefacto_cargado = estado_previo
+            logger.error(f"Error en entrenamiento incremental: {e}")
+            return False, f"Error en entrenamiento incremental: {str(e)}"
+        
+        self.is_trained = True
+        self._artefacto_cargado = True
+        self.model_id = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        self.franjas_vistas = actuales
+        tabla_previa = modelo_data.get('tabla_probabilidades')
+        try:
+            if tabla_previa is None:
+                raise ValueError("la versión activa no tiene tabla")
+            self.tabla_probabilidades = self._ampliar_tabla_probabilidades(tabla_previa, modelo_data['model'], nuevo)
+        except Exception as e:
+            logger.info(f"Tabla de probabilidades recalculada entera: {e}")
+            self._actualizar_tabla_probabilidades()
+        self.cache_predicciones.invalidar()
+        
+        # Accuracy/F1 se conservan del último entrenamiento completo
+        df_limpio = df.dropna(subset=['categoria', 'bloque', 'dia', 'principio'])
+        self.stats = dict(
+            self.stats,
+            fecha_entrenamiento=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            total_registros=len(df_limpio),
+            combinaciones_unicas=len(actuales),
+            categorias=list(df_limpio['categoria'].unique()),
+            bloques=list(df_limpio['bloque'].unique()),
+            dias=list(df_limpio['dia'].unique()),
+            total_principios=len(self.mlb.classes_),
+            tiempo_entrenamiento_s=round(tiempo_ajuste, 3),
+            huella_datos=self.huella_datos(df),
+            modo='incremental',
+            incrementos=incrementos + 1,
+            franjas_incremento=len(cambiadas)
+        )
+        
+        self._notificar_progreso(progreso, "guardar")
+        if not self.guardar_modelo():
+            return True, f"Modelo actualizado con {len(cambiadas)} franjas pero no se pudo guardar"
+        return True, f"Modelo actualizado de forma incremental con {len(cambiadas)} franjas nuevas o modificadas"
+    
+    def _reentrenar_fragmentos(self, df, modelo_data, vistas, actuales, motor, progreso, cancelado, completo):
+        """
+        Incremental de un modelo por categorías: solo se reajustan los modelos
+        de las categorías con franjas nuevas, modificadas o eliminadas, y solo
+        se recalcula su parte de la tabla de probabilidades. El modelo global
+        no se toca.
+        Si aparecen categorías, bloques, días o principios nuevos, o cambia una
+        categoría que predice el modelo global, entrenamiento completo.
+        """
+        from sklearn.model_selection import train_test_split
+        
+        cambiadas = [clave for clave in set(vistas) | set(actuales) if vistas.get(clave) != actuales.get(clave)]
+        if not cambiadas:
+            return True, "No hay franjas nuevas ni modificadas desde la versión activa. No es necesario reentrenar"
+        
+        encoders, mlb, modelo = modelo_data['encoders'], modelo_data['mlb'], modelo_data['model']
+        presentes = [clave for clave in cambiadas if clave in actuales]
+        for eje, col in enumerate(['categoria', 'bloque', 'dia']):
+            nuevos = {clave[eje] for clave in presentes} - {str(c) for c in encoders[col].classes_}
+            if nuevos:
+                return completo(f"valores nuevos de {col}: {', '.join(sorted(nuevos))}")
+        principios_nuevos = {p for clave in presentes for p in actuales[clave]} - {str(p) for p in mlb.classes_}
+        if principios_nuevos:
+            return completo(f"{len(principios_nuevos)} principios nuevos")
+        
+        codigos = {str(c): codigo for codigo, c in enumerate(encoders['categoria'].classes_)}
+        categorias = sorted({clave[0] for clave in cambiadas})
+        sin_fragmento = [c for c in categorias if codigos[c] not in modelo.fragmentos]
+        if sin_fragmento:
+            return completo(f"cambios en categorías que predice el modelo global: {', '.join(sin_fragmento)}")
+        
+        self._notificar_progreso(progreso, "entrenar")
+        estado_previo = (self.encoders, self.mlb, self.model, self._artefacto_cargado)
+        try:
+            self.encoders, self.mlb = encoders, mlb
+            tareas = {}
+            for categoria in categorias:
+                claves = [clave for clave in actuales if clave[0] == categoria]
+                X = self.preparar_features(pd.DataFrame(claves, columns=['categoria', 'bloque', 'dia', 'mes_temporada']))
+                X_encoded = X[self.FEATURES_CODIFICADAS]
+                y = mlb.transform([actuales[clave] for clave in claves])
+                if len(claves) < 4:
+                    raise ValueError(f"la categoría {categoria} se ha quedado sin franjas suficientes")
+                X_train, X_test, y_train, y_test = train_test_split(X_encoded, y, test_size=0.2, random_state=42)
+                if len(X_train) < MIN_FRANJAS_FRAGMENTO:
+                    raise ValueError(f"la categoría {categoria} se ha quedado sin franjas suficientes")
+                tareas[codigos[categoria]] = (X_train, y_train, X_test, y_test)
+            
+            if cancelado is not None and cancelado():
+                raise InterruptedError(MENSAJE_CANCELADO)
+            
+            inicio_ajuste = time.perf_counter()
+            fragmentos, _ = ajustar_fragmentos(tareas, motor)
+            tiempo_ajuste = time.perf_counter() - inicio_ajuste
+            
+            if cancelado is not None and cancelado():
+                raise InterruptedError(MENSAJE_CANCELADO)
+            
+            self._notificar_progreso(progreso, "evaluar")
+            self.model = modelo.con_fragmentos({
+                codigo: (estimador, columnas) for codigo, (estimador, columnas, _) in fragmentos.items()
+            })
+        except InterruptedError:
+            self.encoders, self.mlb, self.model, self._artefacto_cargado = estado_previo
+            return False, MENSAJE_CANCELADO
+        except ValueError as e:
+            self.encoders, self.mlb, self.model, self._artefacto_cargado = estado_previo
+            return completo(str(e))
+        except Exception as e:
+            self.encoders, self.mlb, self.model, self._artefacto_cargado = estado_previo
+            logger.error(f"Error reentrenando modelos por categoría: {e}")
+            return False, f"Error reentrenando modelos por categoría: {str(e)}"
+        
+        self.is_trained = True
+        self._artefacto_cargado = True
+        self.model_id = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        self.franjas_vistas = actuales
+        tabla_previa = modelo_data.get('tabla_probabilidades')
+        if tabla_previa is not None:
+            self.tabla_probabilidades = self._tabla_con_categorias(tabla_previa, list(fragmentos))
+        else:
+            self._actualizar_tabla_probabilidades()
+        self.cache_predicciones.invalidar()
+        
+        # Accuracy/F1 globales se conservan del último entrenamiento completo
+        df_limpio = df.dropna(subset=['categoria', 'bloque', 'dia', 'principio'])
+        metricas = dict(self.stats.get('fragmentos') or {})
+        metricas.update({categoria: fragmentos[codigos[categoria]][2] for categoria in categorias})
+        self.stats = dict(
+            self.stats,
+            fecha_entrenamiento=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            total_registros=len(df_limpio),
+            combinaciones_unicas=len(actuales),
+            tiempo_entrenamiento_s=round(tiempo_ajuste, 3),
+            huella_datos=self.huella_datos(df),
+            modo='incremental',
+            fragmentos=metricas,
+            categorias_reentrenadas=categorias,
+            franjas_incremento=len(cambiadas)
+        )
+        
+        self._notificar_progreso(progreso, "guardar")
+        if not self.guardar_modelo():
+            return True, f"Modelos de {', '.join(categorias)} reentrenados pero no se pudo guardar"
+        return True, f"Reentrenados solo los modelos de {', '.join(categorias)} ({len(cambiadas)} franjas nuevas, modificadas o eliminadas)"
+    
+    def _tabla_con_categorias(self, tabla_previa, codigos):
         """
-        Entrena el modelo con los datos históricos de forma robusta
+        Copia de la tabla de probabilidades con las celdas de las categorías
+        indicadas recalculadas con el modelo actual
         """
+        tabla = np.array(tabla_previa, dtype=np.float32)
+        dims, X = self._rejilla_tabla()
+        for codigo in codigos:
+            # La rejilla recorre categoria × bloque × dia × mes en orden C:
+            # las celdas de una categoría son contiguas
+            filas = X['categoria_encoded'].to_numpy() == codigo
+            tabla[codigo] = self._matriz_probabilidades(X[filas]).reshape(tabla.shape[1:])
+        return tabla
+    
+    @staticmethod
+    def _ampliar_clases(clases, valores):
+        """Clases existentes, en su orden, seguidas de los valores nuevos ordenados"""
+        existentes = [str(c) for c in clases]
+        nuevos = sorted({str(v) for v in valores} - set(existentes))
+        return np.array(existentes + nuevos, dtype=object)
+
+    def _entrenar_modelo(self, df, test_size, motor, progreso=None, cancelado=None, huella=None,
+                         por_categoria=False, procesos=None, hiperparametros=None):
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import accuracy_score, f1_score
+        
+        def avisar(fase):
+            self._notificar_progreso(progreso, fase)
+        
+        def cancelar():
+            return cancelado is not None and cancelado()
+        
         try:
+            avisar("preparar")
+            
             # Validar datos de entrada
             es_valido, mensaje = self.validar_datos_entrada(df)
             if not es_valido:
@@ -176,6 +804,8 @@ class PredictorTactico:
             for col in feature_cols:
                 if col not in X.columns:
                     return False, f"Error en preparación de datos: falta columna {col}"
+                if (X[col] == -1).any():
+                    return False, f"Error en preparación de datos: no se pudo codificar {col}"
             
             X_encoded = X[feature_cols]
             
@@ -197,25 +827,45 @@ class PredictorTactico:
             except Exception as e:
                 return False, f"Error dividiendo datos: {str(e)}"
             
-            # Entrenar modelo
-            base_model = RandomForestClassifier(
-                n_estimators=50,  # Reducido para datasets pequeños
-                max_depth=5,      # Limitado para evitar overfitting
-                min_samples_split=2,
-                random_state=42,
-                n_jobs=-1
-            )
+            if cancelar():
+                return False, MENSAJE_CANCELADO
             
-            self.model = MultiOutputClassifier(base_model)
+            # Entrenar modelo
+            avisar("entrenar")
+            self.model = self._crear_modelo(motor, hiperparametros=hiperparametros)
+            metricas_fragmentos = {}
             
             try:
-                self.model.fit(X_train, y_train)
+                inicio_ajuste = time.perf_counter()
+                if por_categoria:
+                    # Los modelos por categoría se ajustan en el pool mientras
+                    # este proceso ajusta el global
+                    tareas = self._tareas_fragmentos(X_train, y_train, X_test, y_test)
+                    fragmentos, _ = ajustar_fragmentos(tareas, motor, procesos, mientras=lambda: self.model.fit(X_train, y_train))
+                    self.model = ModeloPorCategoria(self.model, {
+                        codigo: (estimador, columnas) for codigo, (estimador, columnas, _) in fragmentos.items()
+                    })
+                    metricas_fragmentos = {
+                        str(self.encoders['categoria'].classes_[codigo]): metricas
+                        for codigo, (_, _, metricas) in fragmentos.items()
+                    }
+                else:
+                    self.model.fit(X_train, y_train)
+                tiempo_ajuste = time.perf_counter() - inicio_ajuste
             except Exception as e:
                 return False, f"Error entrenando modelo: {str(e)}"
             
+            if cancelar():
+                return False, MENSAJE_CANCELADO
+            
             # Evaluar
+            avisar("evaluar")
             try:
-                y_pred = self.model.predict(X_test)
+                if isinstance(self.model, ModeloPorCategoria):
+                    # Cada franja de prueba con el modelo de su categoría
+                    y_pred = (self._matriz_probabilidades(X_test) > 0.5).astype(y_test.dtype)
+                else:
+                    y_pred = self.model.predict(X_test)
                 accuracy = accuracy_score(y_test, y_pred)
                 f1 = f1_score(y_test, y_pred, average='macro', zero_division=0)
             except:
@@ -223,6 +873,11 @@ class PredictorTactico:
                 f1 = 0.0
             
             self.is_trained = True
+            self._artefacto_cargado = True
+            self.model_id = datetime.now().strftime('%Y%m%d%H%M%S%f')
+            self.franjas_vistas = self.franjas_historico(df_limpio)
+            self._actualizar_tabla_probabilidades()
+            self.cache_predicciones.invalidar()
             
             # Guardar estadísticas
             self.stats = {
@@ -235,10 +890,26 @@ class PredictorTactico:
                 'bloques': list(df_limpio['bloque'].unique()),
                 'dias': list(df_limpio['dia'].unique()),
                 'total_principios': len(self.mlb.classes_),
+                'motor': motor,
+                'hiperparametros': self._hiperparametros(),
+                'hiperparametros_elegidos': dict(hiperparametros or {}),
+                'tiempo_entrenamiento_s': round(tiempo_ajuste, 3),
+                'huella_datos': huella,
+                'modo': 'completo',
+                'incrementos': 0,
                 'version': self.model_version
             }
+            if por_categoria:
+                self.stats.update(
+                    por_categoria=True,
+                    fragmentos=metricas_fragmentos,
+                    categorias_modelo_global=sorted(
+                        str(c) for c in df_limpio['categoria'].unique() if str(c) not in metricas_fragmentos
+                    )
+                )
             
             # Guardar modelo
+            avisar("guardar")
             exito_guardado = self.guardar_modelo()
             
             if not exito_guardado:
@@ -250,122 +921,466 @@ class PredictorTactico:
             logger.error(f"Error general en entrenamiento: {e}")
             return False, f"Error inesperado al entrenar: {str(e)}"
     
+    @staticmethod
+    def _notificar_progreso(progreso, fase):
+        if progreso is not None:
+            try:
+                progreso(fase, FASES_ENTRENAMIENTO.index(fase) / len(FASES_ENTRENAMIENTO))
+            except Exception as e:
+                logger.warning(f"Error notificando progreso: {e}")
+    
+    def _tareas_fragmentos(self, X_train, y_train, X_test, y_test):
+        """
+        Datos de cada categoría con franjas suficientes para tener modelo propio.
+        Retorna: {codigo: (X_train, y_train, X_test, y_test)}
+        """
+        codigos_train = X_train['categoria_encoded'].to_numpy()
+        codigos_test = X_test['categoria_encoded'].to_numpy()
+        tareas = {}
+        for codigo in np.unique(codigos_train):
+            en_train = codigos_train == codigo
+            if en_train.sum() < MIN_FRANJAS_FRAGMENTO:
+                continue
+            en_test = codigos_test == codigo
+            tareas[int(codigo)] = (X_train[en_train], y_train[en_train], X_test[en_test], y_test[en_test])
+        return tareas
+    
+    def _hiperparametros(self):
+        """
+        Hiperparámetros simples del estimador (para el registro de versiones).
+        Con modelos por categoría, los del modelo global.
+        """
+        modelo = self.model.modelo_global if isinstance(self.model, ModeloPorCategoria) else self.model
+        try:
+            return {
+                clave: valor for clave, valor in modelo.get_params().items()
+                if isinstance(valor, (int, float, str, bool, type(None)))
+            }
+        except Exception:
+            return {}
+    
+    @staticmethod
+    def _crear_modelo(motor, n_estimadores=50, n_jobs=-1, hiperparametros=None):
+        """
+        Instancia el estimador del motor indicado.
+        n_jobs=1 en los procesos del pool de modelos por categoría
+        hiperparametros: parámetros del RandomForest que sustituyen a los de
+        por defecto (p. ej. el candidato elegido en una búsqueda)
+        """
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.multioutput import MultiOutputClassifier
+        
+        if motor == MOTOR_MULTIOUTPUT:
+            parametros = dict(
+                n_estimators=n_estimadores,  # Reducido para datasets pequeños
+                max_depth=5,      # Limitado para evitar overfitting
+                min_samples_split=2,
+                random_state=42,
+                n_jobs=n_jobs
+            )
+            parametros.update(hiperparametros or {})
+            return MultiOutputClassifier(RandomForestClassifier(**parametros))
+        
+        # RandomForestClassifier admite objetivos multi-etiqueta de forma nativa.
+        # Cada árbol reparte sus hojas entre todos los principios, por eso
+        # necesita más profundidad que los bosques por principio.
+        parametros = dict(
+            n_estimators=n_estimadores,
+            max_depth=10,
+            min_samples_split=2,
+            random_state=42,
+            n_jobs=n_jobs
+        )
+        parametros.update(hiperparametros or {})
+        return RandomForestClassifier(**parametros)
+    
     def predecir_principios(self, categoria, bloque, dia, temporada=None, n_sugerencias=5):
         """
-        Predice los principios más probables con manejo robusto de errores
+        Predice los principios más probables con manejo robusto de errores.
+        Las predicciones repetidas se sirven desde la caché LRU.
         """
         if not self.is_trained:
             return [], "El modelo no está entrenado. Por favor, entrena el modelo primero."
         
+        mes = 1 if temporada is None else self._extraer_mes(temporada)
+        clave = (
+            self.model_id,
+            str(categoria).strip(),
+            str(bloque).strip(),
+            str(dia).strip(),
+            mes,
+            int(n_sugerencias)
+        )
+        
+        en_cache = self.cache_predicciones.obtener(clave)
+        if en_cache is not None:
+            sugerencias, mensaje = en_cache
+            return [dict(s) for s in sugerencias], mensaje
+        
+        sugerencias, mensaje, cacheable = self._predecir_principios_sin_cache(
+            categoria, bloque, dia, temporada, n_sugerencias
+        )
+        if cacheable:
+            self.cache_predicciones.guardar(clave, ([dict(s) for s in sugerencias], mensaje))
+        return sugerencias, mensaje
+    
+    def _predecir_principios_sin_cache(self, categoria, bloque, dia, temporada=None, n_sugerencias=5):
+        """
+        Predicción sin caché.
+        Retorna: (sugerencias, mensaje, cacheable) - los errores no se cachean
+        """
+        if not self.is_trained or not self._asegurar_artefacto():
+            return [], "El modelo no está entrenado. Por favor, entrena el modelo primero.", False
+        
         try:
             # Validar inputs
             if not all([categoria, bloque, dia]):
-                return [], "Debe proporcionar categoría, bloque y día"
-            
-            # Preparar entrada
-            input_data = pd.DataFrame([{
-                'categoria': str(categoria).strip(),
-                'bloque': str(bloque).strip(),
-                'dia': str(dia).strip(),
-                'mes_temporada': 1 if temporada is None else self._extraer_mes(temporada)
-            }])
+                return [], "Debe proporcionar categoría, bloque y día", True
             
             # Verificar si la combinación es conocida
-            categoria_conocida = str(categoria).strip() in self.stats.get('categorias', [])
-            bloque_conocido = str(bloque).strip() in self.stats.get('bloques', [])
-            dia_conocido = str(dia).strip() in self.stats.get('dias', [])
-            
-            advertencias = []
-            if not categoria_conocida:
-                advertencias.append(f"Categoría '{categoria}' no vista en entrenamiento")
-            if not bloque_conocido:
-                advertencias.append(f"Bloque '{bloque}' no visto en entrenamiento")
-            if not dia_conocido:
-                advertencias.append(f"Día '{dia}' no visto en entrenamiento")
+            advertencias = self._advertencias_combinacion(categoria, bloque, dia)
             
             # Preparar features
-            input_prep = self.preparar_features(input_data)
-            
-            feature_cols = ['categoria_encoded', 'bloque_encoded', 'dia_encoded', 'mes_temporada']
-            X = input_prep[feature_cols]
+            mes = 1 if temporada is None else self._extraer_mes(temporada)
+            X = self._codificar_franjas([(categoria, bloque, dia)], mes)
             
             # Verificar valores no vistos (-1)
-            valores_no_vistos = (X.values[0] == -1).sum()
+            valores_no_vistos = (X[0, :3] == -1).sum()
             
             if valores_no_vistos >= 2:  # Si hay 2 o más valores no vistos
-                return [], "Combinación muy diferente a los datos de entrenamiento. No es posible hacer una predicción confiable."
+                return [], "Combinación muy diferente a los datos de entrenamiento. No es posible hacer una predicción confiable.", True
             
             # Predecir
             try:
-                if hasattr(self.model, 'predict_proba'):
-                    # Obtener probabilidades para cada estimador
-                    probas = []
-                    for estimator in self.model.estimators_:
-                        if hasattr(estimator, 'predict_proba'):
-                            proba = estimator.predict_proba(X)[0]
-                            # Manejar el caso donde solo hay una clase
-                            if len(proba) == 1:
-                                probas.append([1-proba[0], proba[0]])
-                            else:
-                                probas.append(proba)
-                        else:
-                            # Si no tiene predict_proba, usar predict
-                            pred = estimator.predict(X)[0]
-                            probas.append([1-pred, pred])
-                else:
-                    # Fallback a predicción binaria
-                    preds = self.model.predict(X)
-                    probas = [[1-p, p] for p in preds[0]]
-                
+                probabilidades = self._probabilidades(X)[0]
             except Exception as e:
                 logger.error(f"Error en predicción: {e}")
-                return [], f"Error al realizar la predicción: {str(e)}"
-            
-            # Calcular scores para cada principio
-            principios_scores = []
-            for i, clase in enumerate(self.mlb.classes_):
-                try:
-                    if i < len(probas):
-                        # Tomar la probabilidad de la clase positiva
-                        prob = probas[i][1] if len(probas[i]) > 1 else 0.5
-                    else:
-                        prob = 0.0
-                    principios_scores.append((clase, float(prob)))
-                except:
-                    principios_scores.append((clase, 0.0))
-            
-            # Ordenar por probabilidad
-            principios_scores.sort(key=lambda x: x[1], reverse=True)
-            
-            # Si hay advertencias, ajustar confianza
-            factor_confianza = 1.0
-            if advertencias:
-                factor_confianza = 0.7 ** len(advertencias)  # Reducir confianza por cada valor no visto
+                return [], f"Error al realizar la predicción: {str(e)}", False
             
             # Retornar top N
-            sugerencias = []
-            for p in principios_scores[:n_sugerencias]:
-                if p[1] > 0.05:  # Umbral mínimo
-                    confianza_ajustada = p[1] * factor_confianza
-                    sugerencias.append({
-                        'principio': p[0],
-                        'confianza': confianza_ajustada,
-                        'porcentaje': f"{confianza_ajustada*100:.1f}%",
-                        'advertencias': advertencias if advertencias else None
-                    })
+            indices_top = self._top_k(probabilidades[np.newaxis, :], n_sugerencias)[0]
+            sugerencias = self._construir_sugerencias(probabilidades, indices_top, advertencias)
             
             if not sugerencias:
-                return [], "No se encontraron principios con suficiente confianza para esta combinación"
+                return [], "No se encontraron principios con suficiente confianza para esta combinación", True
             
-            return sugerencias, "Predicción exitosa" + (f" (con advertencias)" if advertencias else "")
+            return sugerencias, "Predicción exitosa" + (f" (con advertencias)" if advertencias else ""), True
             
         except Exception as e:
             logger.error(f"Error general en predicción: {e}")
-            return [], f"Error inesperado: {str(e)}"
+            return [], f"Error inesperado: {str(e)}", False
+    
+    def predecir_microciclo(self, categoria, temporada=None, dias=None, bloques=None, n_sugerencias=5):
+        """
+        Sugerencias para todas las franjas día × bloque de un microciclo en una
+        sola pasada: una matriz de features para las 35 franjas, una llamada a
+        predict_proba por estimador y selección top-k con argpartition.
+        Retorna: ({(dia, bloque): [sugerencias]}, mensaje)
+        """
+        if not self.is_trained or not self._asegurar_artefacto():
+            return {}, "El modelo no está entrenado. Por favor, entrena el modelo primero."
+        
+        if not categoria:
+            return {}, "Debe proporcionar una categoría"
+        
+        dias = list(dias) if dias else list(DIAS_SEMANA)
+        bloques = list(bloques) if bloques else list(BLOQUES_SESION)
+        
+        try:
+            franjas = [(str(d).strip(), str(b).strip()) for d in dias for b in bloques]
+            mes = 1 if temporada is None else self._extraer_mes(temporada)
+            X = self._codificar_franjas([(categoria, b, d) for d, b in franjas], mes)
+            
+            # Franjas con 2 o más valores no vistos no son predecibles
+            predecibles = (X[:, :3] == -1).sum(axis=1) < 2
+            
+            resultado = {franja: [] for franja in franjas}
+            if not predecibles.any():
+                return resultado, "Combinación muy diferente a los datos de entrenamiento. No es posible hacer una predicción confiable."
+            
+            try:
+                probabilidades = self._probabilidades(X[predecibles])
+            except Exception as e:
+                logger.error(f"Error en predicción por lotes: {e}")
+                return {}, f"Error al realizar la predicción: {str(e)}"
+            
+            indices_top = self._top_k(probabilidades, n_sugerencias)
+            
+            filas_predecibles = np.flatnonzero(predecibles)
+            for fila_lote, fila_franja in enumerate(filas_predecibles):
+                dia, bloque = franjas[fila_franja]
+                advertencias = self._advertencias_combinacion(categoria, bloque, dia)
+                resultado[(dia, bloque)] = self._construir_sugerencias(
+                    probabilidades[fila_lote], indices_top[fila_lote], advertencias
+                )
+            
+            return resultado, "Predicción exitosa"
+            
+        except Exception as e:
+            logger.error(f"Error general en predicción por lotes: {e}")
+            return {}, f"Error inesperado: {str(e)}"
+    
+    def _codificar_franjas(self, combinaciones, mes):
+        """
+        Codifica (categoria, bloque, dia) con los diccionarios de los encoders,
+        sin pasar por pandas. Los valores no vistos se codifican como -1.
+        Retorna: ndarray int64 (n, 4) en el orden de FEATURES_CODIFICADAS
+        """
+        mapas = [
+            self._mapa_codificacion(col) if col in self.encoders else {}
+            for col in ['categoria', 'bloque', 'dia']
+        ]
+        X = np.empty((len(combinaciones), 4), dtype=np.int64)
+        for fila, valores in enumerate(combinaciones):
+            for eje, valor in enumerate(valores):
+                X[fila, eje] = mapas[eje].get(str(valor).strip(), -1)
+        X[:, 3] = mes
+        return X
+    
+    def _advertencias_combinacion(self, categoria, bloque, dia):
+        """
+        Advertencias para valores no vistos durante el entrenamiento
+        """
+        advertencias = []
+        if str(categoria).strip() not in self.stats.get('categorias', []):
+            advertencias.append(f"Categoría '{categoria}' no vista en entrenamiento")
+        if str(bloque).strip() not in self.stats.get('bloques', []):
+            advertencias.append(f"Bloque '{bloque}' no visto en entrenamiento")
+        if str(dia).strip() not in self.stats.get('dias', []):
+            advertencias.append(f"Día '{dia}' no visto en entrenamiento")
+        return advertencias
+    
+    def _probabilidades(self, X):
+        """
+        Probabilidades por principio para un lote de features codificadas.
+        Con la tabla precalculada es un simple indexado; si no existe (o el
+        lote se sale de ella) se consulta el modelo.
+        """
+        tabla = self.tabla_probabilidades
+        if tabla is not None:
+            if isinstance(X, pd.DataFrame):
+                codigos = X[self.FEATURES_CODIFICADAS].to_numpy(dtype=np.int64)
+            else:
+                codigos = np.asarray(X, dtype=np.int64)
+            dentro = all(
+                (codigos[:, eje] < tabla.shape[eje]).all() and (codigos[:, eje] >= -1).all()
+                for eje in range(3)
+            )
+            if dentro:
+                # -1 (valor no visto) indexa la última posición de cada eje
+                meses = np.clip(codigos[:, 3], 1, MESES_TABLA) - 1
+                return tabla[codigos[:, 0], codigos[:, 1], codigos[:, 2], meses].astype(float)
+        
+        return self._matriz_probabilidades(X)
+    
+    def _construir_tabla_probabilidades(self):
+        """
+        Precalcula las probabilidades de todos los principios para cada
+        combinación del espacio de features discreto. La última posición de
+        los ejes categoria/bloque/dia corresponde a un valor no visto (-1).
+        Retorna: ndarray float32 (n_cat+1, n_bloque+1, n_dia+1, 12, n_principios)
+        """
+        dims, X = self._rejilla_tabla()
+        probabilidades = self._matriz_probabilidades(X).astype(np.float32)
+        return probabilidades.reshape(dims + [MESES_TABLA, -1])
+    
+    def _rejilla_tabla(self):
+        """
+        Features de todas las celdas de la tabla, en el orden de la tabla.
+        Retorna: (dims, DataFrame con FEATURES_CODIFICADAS)
+        """
+        dims = [len(self.encoders[col].classes_) + 1 for col in ['categoria', 'bloque', 'dia']]
+        rejilla = np.indices(dims + [MESES_TABLA]).reshape(4, -1)
+        
+        X = pd.DataFrame({
+            'categoria_encoded': np.where(rejilla[0] == dims[0] - 1, -1, rejilla[0]),
+            'bloque_encoded': np.where(rejilla[1] == dims[1] - 1, -1, rejilla[1]),
+            'dia_encoded': np.where(rejilla[2] == dims[2] - 1, -1, rejilla[2]),
+            'mes_temporada': rejilla[3] + 1
+        })
+        return dims, X
+    
+    def _ampliar_tabla_probabilidades(self, tabla_previa, modelo_previo, nuevo):
+        """
+        Tabla del modelo incremental (modelo_previo + bosque nuevo) sin volver a
+        evaluar el modelo previo en toda la rejilla: sus probabilidades salen
+        de su tabla, salvo en las celdas con códigos nuevos (categoría, bloque
+        o día que no existían). Se combinan con las del bosque nuevo
+        ponderando por número de árboles, como en _matriz_probabilidades.
+        """
+        dims, X = self._rejilla_tabla()
+        n_principios = len(self.mlb.classes_)
+        n_previos = tabla_previa.shape[-1]
+        
+        # El código -1 (no visto) indexa la última posición también en la tabla previa
+        codigos = X[['categoria_encoded', 'bloque_encoded', 'dia_encoded']].to_numpy()
+        conocidas = (codigos < np.array(tabla_previa.shape[:3]) - 1).all(axis=1)
+        meses = X['mes_temporada'].to_numpy() - 1
+        
+        previas = np.empty((len(X), n_previos))
+        previas[conocidas] = tabla_previa[
+            codigos[conocidas, 0], codigos[conocidas, 1], codigos[conocidas, 2], meses[conocidas]
+        ]
+        if not conocidas.all():
+            previas[~conocidas] = self._probabilidades_modelo(modelo_previo, X[~conocidas], n_previos)
+        
+        nuevas = self._probabilidades_estimador(nuevo, X, n_principios)
+        arboles_previos = ModeloIncremental.arboles_por_columna(modelo_previo, n_previos)
+        arboles_nuevos = ModeloIncremental.arboles_por_principio(nuevo)
+        nuevas[:, :n_previos] = (
+            previas * arboles_previos + nuevas[:, :n_previos] * arboles_nuevos
+        ) / (arboles_previos + arboles_nuevos)
+        
+        return nuevas.astype(np.float32).reshape(dims + [MESES_TABLA, -1])
     
-    def analizar_similitud_microciclos(self, df, microciclo_referencia, n_similares=3):
+    def _actualizar_tabla_probabilidades(self):
         """
-        Encuentra microciclos similares con manejo robusto de errores
+        Recalcula la tabla; si falla, las predicciones consultan el modelo
+        """
+        try:
+            self.tabla_probabilidades = self._construir_tabla_probabilidades()
+        except Exception as e:
+            logger.warning(f"No se pudo precalcular la tabla de probabilidades: {e}")
+            self.tabla_probabilidades = None
+    
+    def _matriz_probabilidades(self, X):
+        """
+        Probabilidad de la clase positiva de cada principio para un lote.
+        Retorna: ndarray (n_filas, n_principios)
+        """
+        return self._probabilidades_modelo(self.model, X, len(self.mlb.classes_))
+    
+    @classmethod
+    def _probabilidades_modelo(cls, modelo, X, n_principios):
+        """
+        Como _matriz_probabilidades, para un modelo cualquiera (BosqueNumpy,
+        ModeloIncremental, ModeloPorCategoria o estimador de scikit-learn)
+        """
+        if isinstance(modelo, BosqueNumpy):
+            if isinstance(X, pd.DataFrame):
+                X = X[cls.FEATURES_CODIFICADAS].to_numpy()
+            return modelo.probabilidades(X)
+        
+        if not isinstance(X, pd.DataFrame):
+            # Los estimadores se ajustaron con nombres de columna
+            X = pd.DataFrame(X, columns=cls.FEATURES_CODIFICADAS)
+        
+        if isinstance(modelo, ModeloPorCategoria):
+            # Cada fila con el modelo de su categoría; sin fragmento, el global
+            probabilidades = cls._probabilidades_modelo(modelo.modelo_global, X, n_principios)
+            codigos = X['categoria_encoded'].to_numpy()
+            for codigo, (estimador, columnas) in modelo.fragmentos.items():
+                filas = np.flatnonzero(codigos == codigo)
+                if len(filas):
+                    probabilidades[filas] = 0.0
+                    probabilidades[np.ix_(filas, columnas)] = cls._probabilidades_estimador(
+                        estimador, X.iloc[filas], len(columnas)
+                    )
+            return probabilidades
+        
+        if not isinstance(modelo, ModeloIncremental):
+            return cls._probabilidades_estimador(modelo, X, n_principios)
+        
+        # Media de los árboles de todos los miembros que predicen cada principio
+        suma = np.zeros((len(X), n_principios))
+        arboles = np.zeros(n_principios)
+        for estimador, columnas in modelo.miembros:
+            n_arboles = ModeloIncremental.arboles_por_principio(estimador)
+            suma[:, columnas] += cls._probabilidades_estimador(estimador, X, len(columnas)) * n_arboles
+            arboles[columnas] += n_arboles
+        return suma / np.maximum(arboles, 1)
+    
+    @classmethod
+    def _probabilidades_estimador(cls, modelo, X, n_principios):
+        """
+        Probabilidad de la clase positiva de cada principio según un estimador
+        de scikit-learn.
+        Retorna: ndarray (n_filas, n_principios)
+        """
+        from sklearn.multioutput import MultiOutputClassifier
+        
+        probabilidades = np.zeros((len(X), n_principios))
+        
+        if isinstance(modelo, MultiOutputClassifier):
+            # Un bosque por principio
+            for i, estimator in enumerate(modelo.estimators_[:n_principios]):
+                if hasattr(estimator, 'predict_proba'):
+                    probabilidades[:, i] = cls._probabilidad_positiva(estimator.classes_, estimator.predict_proba(X))
+                else:
+                    probabilidades[:, i] = estimator.predict(X)
+        elif hasattr(modelo, 'predict_proba'):
+            # Bosque multi-etiqueta: una sola llamada devuelve una matriz por principio
+            probas = modelo.predict_proba(X)
+            clases = modelo.classes_
+            if not isinstance(probas, list):  # Un único principio
+                probas, clases = [probas], [clases]
+            for i, (proba, clases_i) in enumerate(zip(probas[:n_principios], clases)):
+                probabilidades[:, i] = cls._probabilidad_positiva(clases_i, proba)
+        else:
+            # Fallback a predicción binaria
+            preds = np.asarray(modelo.predict(X), dtype=float).reshape(len(X), -1)
+            probabilidades[:, :preds.shape[1]] = preds
+        
+        return probabilidades
+    
+    @staticmethod
+    def _probabilidad_positiva(clases, proba):
+        """
+        Columna de la clase 1 en un predict_proba. Si el estimador solo vio una
+        clase, la probabilidad es 1 si esa clase es la positiva y 0 si no.
+        """
+        clases = list(clases)
+        if 1 in clases:
+            return proba[:, clases.index(1)]
+        return np.zeros(len(proba))
+    
+    @staticmethod
+    def _top_k(probabilidades, k):
+        """
+        Índices de los k principios más probables por fila, ordenados de
+        mayor a menor, sin ordenar la fila completa.
+        """
+        n_principios = probabilidades.shape[1]
+        k = max(1, min(int(k), n_principios))
+        if k < n_principios:
+            candidatos = np.argpartition(-probabilidades, k - 1, axis=1)[:, :k]
+        else:
+            candidatos = np.tile(np.arange(n_principios), (len(probabilidades), 1))
+        valores = np.take_along_axis(probabilidades, candidatos, axis=1)
+        orden = np.argsort(-valores, axis=1, kind='stable')
+        return np.take_along_axis(candidatos, orden, axis=1)
+    
+    def _construir_sugerencias(self, probabilidades, indices_top, advertencias):
+        """
+        Convierte los índices top-k en la lista de sugerencias de la API
+        """
+        # Si hay advertencias, ajustar confianza
+        factor_confianza = 1.0
+        if advertencias:
+            factor_confianza = 0.7 ** len(advertencias)  # Reducir confianza por cada valor no visto
+        
+        sugerencias = []
+        for i in indices_top:
+            prob = float(probabilidades[i])
+            if prob > 0.05:  # Umbral mínimo
+                confianza_ajustada = prob * factor_confianza
+                sugerencias.append({
+                    'principio': self.mlb.classes_[i],
+                    'confianza': confianza_ajustada,
+                    'porcentaje': f"{confianza_ajustada*100:.1f}%",
+                    'advertencias': advertencias if advertencias else None
+                })
+        return sugerencias
+    
+    def analizar_similitud_microciclos(self, df, microciclo_referencia, n_similares=3, aproximado=None, con_contexto=False):
+        """
+        Encuentra microciclos similares con manejo robusto de errores.
+        Usa el índice disperso persistente (controllers/indice_similitud.py):
+        la consulta es un producto matriz dispersa × vector y una selección top-k.
+        aproximado: buscar solo entre los candidatos del índice MinHash/LSH
+        (controllers/lsh_similitud.py) y reordenarlos con la similitud exacta.
+        Por defecto se activa a partir de UMBRAL_SIMILITUD_APROXIMADA microciclos.
+        con_contexto: en modo aproximado, las firmas incluyen también dia|bloque
         """
         try:
             # Validar datos
@@ -375,77 +1390,43 @@ class PredictorTactico:
             if 'nombre_microciclo' not in df.columns or 'principio' not in df.columns:
                 return [], "Faltan columnas requeridas (nombre_microciclo, principio)"
             
-            # Limpiar datos
-            df_limpio = df.dropna(subset=['nombre_microciclo', 'principio'])
-            
-            # Agrupar por microciclo
+            # Índice guardado si corresponde a df; si no, se reconstruye
             try:
-                microciclo_principios = df_limpio.groupby('nombre_microciclo')['principio'].apply(list).to_dict()
+                indice = obtener_indice_similitud(df)
             except Exception as e:
                 return [], f"Error agrupando datos: {str(e)}"
             
-            if not microciclo_principios:
+            if indice.n_microciclos == 0:
                 return [], "No se encontraron microciclos válidos"
             
-            if microciclo_referencia not in microciclo_principios:
-                microciclos_disponibles = list(microciclo_principios.keys())[:5]
+            if not indice.contiene(microciclo_referencia):
+                microciclos_disponibles = indice.nombres[:5]
                 return [], f"Microciclo '{microciclo_referencia}' no encontrado. Disponibles: {', '.join(microciclos_disponibles)}..."
             
             # Solo analizar si hay más de un microciclo
-            if len(microciclo_principios) <= 1:
+            if indice.n_microciclos <= 1:
                 return [], "Se necesitan al menos 2 microciclos para comparar"
             
-            # Vectorizar principios
-            all_principios = set()
-            for principios in microciclo_principios.values():
-                if isinstance(principios, list):
-                    all_principios.update(principios)
-            
-            if not all_principios:
-                return [], "No se encontraron principios válidos"
-            
-            principios_list = sorted(list(all_principios))
-            
-            # Crear matriz de características
-            vectores = []
-            nombres = []
-            
-            for micro, principios in microciclo_principios.items():
-                if isinstance(principios, list):
-                    vector = [1 if p in principios else 0 for p in principios_list]
-                    vectores.append(vector)
-                    nombres.append(micro)
-            
-            if len(vectores) < 2:
-                return [], "No hay suficientes datos para comparar"
-            
-            # Encontrar vecinos más cercanos
-            X = np.array(vectores)
-            n_neighbors = min(n_similares + 1, len(nombres))
-            
-            nbrs = NearestNeighbors(n_neighbors=n_neighbors, metric='cosine')
-            nbrs.fit(X)
-            
-            # Buscar índice del microciclo de referencia
-            try:
-                idx_ref = nombres.index(microciclo_referencia)
-            except ValueError:
-                return [], "Error al procesar microciclo de referencia"
-            
-            # Encontrar similares
-            distances, indices = nbrs.kneighbors([X[idx_ref]])
+            candidatos = None
+            if aproximado is None:
+                aproximado = indice.n_microciclos >= UMBRAL_SIMILITUD_APROXIMADA
+            if aproximado:
+                lsh = obtener_indice_lsh(df, con_contexto)
+                candidatos = lsh.filas_en(indice)[lsh.filas_candidatas(microciclo_referencia)]
+                if len(candidatos) < n_similares:
+                    # Pocos candidatos: mejor la búsqueda exacta que una lista corta
+                    candidatos = None
             
             similares = []
-            for i, (dist, idx) in enumerate(zip(distances[0][1:], indices[0][1:])):
-                if idx < len(nombres):
-                    similitud = max(0, 1 - dist)  # Asegurar que no sea negativo
-                    similares.append({
-                        'microciclo': nombres[idx],
-                        'similitud': float(similitud),
-                        'porcentaje': f"{similitud*100:.1f}%"
-                    })
+            for nombre, similitud in indice.similares(microciclo_referencia, n_similares, candidatos):
+                similitud = max(0.0, similitud)  # Asegurar que no sea negativo
+                similares.append({
+                    'microciclo': nombre,
+                    'similitud': float(similitud),
+                    'porcentaje': f"{similitud*100:.1f}%"
+                })
             
-            return similares[:n_similares], "Análisis completado"
+            return similares, "Análisis completado"
             
         except Exception as e:
             logger.error(f"Error en análisis de similitud: {e}")
@@ -453,7 +1434,9 @@ class PredictorTactico:
     
     def predecir_carga_semanal(self, df, categoria):
         """
-        Predice la carga semanal con manejo robusto
+        Predice la carga semanal con manejo robusto.
+        Las cuentas salen del cubo categoria × microciclo × dia
+        (controllers/cubo_carga.py), no de filtrar y agrupar df en cada llamada.
         """
         try:
             # Validar datos
@@ -463,50 +1446,100 @@ class PredictorTactico:
             if 'categoria' not in df.columns:
                 return None, "Falta la columna 'categoria'"
             
-            # Filtrar por categoría
-            df_cat = df[df['categoria'] == str(categoria).strip()]
-            
-            if df_cat.empty:
-                categorias_disponibles = df['categoria'].unique()[:5]
-                return None, f"No hay datos para categoría '{categoria}'. Disponibles: {', '.join(map(str, categorias_disponibles))}..."
-            
             # Verificar columnas necesarias
-            if 'nombre_microciclo' not in df_cat.columns or 'dia' not in df_cat.columns:
+            if 'nombre_microciclo' not in df.columns or 'dia' not in df.columns:
                 return None, "Faltan columnas necesarias para el análisis"
             
-            # Calcular estadísticas
+            categoria = str(categoria).strip()
             try:
-                # Contar principios por día en cada microciclo
-                stats_por_dia = df_cat.groupby(['nombre_microciclo', 'dia']).size().reset_index(name='count')
-                
-                # Estadísticas por microciclo
-                stats_por_micro = stats_por_dia.groupby('nombre_microciclo')['count'].agg(['sum', 'mean', 'std'])
-                
-                if stats_por_micro.empty:
-                    return None, "No hay suficientes datos para calcular estadísticas"
-                
-                # Calcular predicción
-                carga_predicha = {
-                    'total_principios_semana': float(stats_por_micro['sum'].mean()),
-                    'promedio_por_dia': float(stats_por_micro['mean'].mean()),
-                    'desviacion': float(stats_por_micro['std'].mean()) if len(stats_por_micro) > 1 else 0,
-                    'dias_activos': df_cat['dia'].nunique(),
-                    'microciclos_analizados': len(stats_por_micro),
-                    'rango_sugerido': {
-                        'min': int(stats_por_micro['sum'].min()) if len(stats_por_micro) > 0 else 0,
-                        'max': int(stats_por_micro['sum'].max()) if len(stats_por_micro) > 0 else 0
-                    }
-                }
-                
-                return carga_predicha, "Cálculo exitoso"
-                
+                cubo = obtener_cubo_carga(df)
             except Exception as e:
                 return None, f"Error en cálculos estadísticos: {str(e)}"
             
+            if categoria not in cubo.categorias:
+                categorias_disponibles = df['categoria'].unique()[:5]
+                return None, f"No hay datos para categoría '{categoria}'. Disponibles: {', '.join(map(str, categorias_disponibles))}..."
+            
+            carga_predicha = cubo.carga(categoria)
+            if carga_predicha is None:
+                return None, "No hay suficientes datos para calcular estadísticas"
+            
+            return carga_predicha, "Cálculo exitoso"
+            
         except Exception as e:
             logger.error(f"Error en predicción de carga: {e}")
             return None, f"Error al calcular carga semanal: {str(e)}"
     
+    def predecir_carga_club(self, df):
+        """
+        Carga semanal de todas las categorías en una sola tabla (una fila por
+        categoría), directamente del cubo de carga.
+        Retorna: (DataFrame o None, mensaje)
+        """
+        try:
+            if df is None or df.empty:
+                return None, "No hay datos para analizar"
+            
+            if any(c not in df.columns for c in ('categoria', 'nombre_microciclo', 'dia')):
+                return None, "Faltan columnas necesarias para el análisis"
+            
+            resumen = obtener_cubo_carga(df).resumen()
+            if resumen.empty:
+                return None, "No hay suficientes datos para calcular estadísticas"
+            
+            return resumen.reset_index(), "Cálculo exitoso"
+            
+        except Exception as e:
+            logger.error(f"Error en carga del club: {e}")
+            return None, f"Error al calcular la carga del club: {str(e)}"
+    
+    def sugerir_siguiente_microciclo(self, df, id_temporada, categoria, nombre_microciclo, n_sugerencias=5):
+        """
+        Sugerencias para la semana siguiente a partir de lo planificado en esta,
+        con el índice de transiciones entre semanas consecutivas de la misma
+        categoría (controllers/transiciones_microciclos.py): un producto
+        vector disperso × matriz, sin pasar por el bosque, así que no hace
+        falta que el modelo esté entrenado.
+        Retorna: ({(dia, bloque): [sugerencias]}, mensaje)
+        """
+        # Importación diferida: transiciones_microciclos importa este módulo
+        from controllers.transiciones_microciclos import (
+            COLUMNAS_TRANSICIONES, obtener_indice_transiciones, principios_de_semana
+        )
+        
+        try:
+            if df is None or df.empty:
+                return {}, "No hay datos para analizar"
+            
+            if any(c not in df.columns for c in COLUMNAS_TRANSICIONES):
+                return {}, "Faltan columnas necesarias para el análisis"
+            
+            actuales = principios_de_semana(df, id_temporada, categoria, nombre_microciclo)
+            if not actuales:
+                return {}, f"La semana '{nombre_microciclo}' no tiene principios planificados"
+            
+            indice = obtener_indice_transiciones(df)
+            if indice.n_transiciones == 0:
+                return {}, "No hay semanas consecutivas planificadas (con fecha en el calendario) de las que aprender"
+            
+            resultado = {}
+            for franja, sugerencias in indice.sugerir(actuales, n_sugerencias).items():
+                resultado[franja] = [{
+                    'principio': principio,
+                    'confianza': probabilidad,
+                    'porcentaje': f"{probabilidad*100:.1f}%",
+                    'advertencias': None
+                } for principio, probabilidad in sugerencias]
+            
+            if not any(resultado.values()):
+                return resultado, "Ninguna semana siguiente registrada parte de estos principios"
+            
+            return resultado, "Sugerencia calculada"
+            
+        except Exception as e:
+            logger.error(f"Error en sugerencia de la semana siguiente: {e}")
+            return {}, f"Error al sugerir la semana siguiente: {str(e)}"
+    
     def obtener_estadisticas_modelo(self):
         """
         Retorna estadísticas del modelo si está entrenado
@@ -519,6 +1552,12 @@ class PredictorTactico:
         
         return self.stats
     
+    def obtener_estadisticas_cache(self):
+        """
+        Retorna aciertos/fallos de la caché de predicciones
+        """
+        return self.cache_predicciones.estadisticas()
+    
     def guardar_modelo(self):
         """
         Guarda el modelo con manejo de errores
@@ -530,40 +1569,217 @@ class PredictorTactico:
                 'mlb': self.mlb,
                 'stats': self.stats,
                 'is_trained': self.is_trained,
-                'version': self.model_version
+                'version': self.model_version,
+                'model_id': self.model_id,
+                'tabla_probabilidades': self.tabla_probabilidades,
+                'franjas_vistas': self.franjas_vistas
             }
             
-            # Crear directorio si no existe
-            os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
-            
-            # Guardar con backup (blindado para Windows)
-            if os.path.exists(self.model_path):
-                backup_path = self.model_path + '.backup'
-                if os.path.exists(backup_path):
-                    os.remove(backup_path)  # evita WinError 183 si ya existe
-                os.rename(self.model_path, backup_path)
-            
-            joblib.dump(modelo_data, self.model_path)
+            # Nueva versión en el registro, activada de forma atómica: otros
+            # procesos (entrenamiento en segundo plano, otras sesiones) nunca
+            # ven un modelo a medio escribir
+            self.registro.registrar(
+                modelo_data, self._metadatos(), self.model_id, activar=True,
+                adicionales={FICHERO_ARBOLES: self._exportar_numpy}
+            )
+            self.version_activa = self.model_id
+            self.firma_artefacto = self.registro.firma_puntero()
             return True
             
         except Exception as e:
             logger.error(f"Error guardando modelo: {e}")
-            # Intentar restaurar backup
-            backup_path = self.model_path + '.backup'
-            if os.path.exists(backup_path):
-                os.rename(backup_path, self.model_path)
             return False
     
-    def cargar_modelo(self):
+    def _exportar_numpy(self, ruta):
         """
-        Carga modelo con manejo robusto de errores
+        Escribe el artefacto de inferencia .npz. Si falla, la versión se
+        registra igualmente y las predicciones usan el .pkl.
         """
-        if not os.path.exists(self.model_path):
+        try:
+            exportar_artefacto(ruta, self._bosque_exportable(), self.encoders, self.mlb, self.tabla_probabilidades)
+            return True
+        except Exception as e:
+            logger.warning(f"No se pudo exportar el artefacto de inferencia: {e}")
+            return False
+    
+    def _bosque_exportable(self):
+        """
+        El artefacto .npz guarda un solo bosque: con modelos por categoría, el
+        global. El reparto por categoría viaja en la tabla de probabilidades.
+        """
+        return self.model.modelo_global if isinstance(self.model, ModeloPorCategoria) else self.model
+    
+    def _metadatos(self):
+        """
+        Metadatos de la versión (meta.json del registro): permiten mostrar
+        estadísticas sin deserializar el modelo
+        """
+        return dict(self.stats, model_id=self.model_id, is_trained=self.is_trained)
+    
+    def cargar_modelo(self, diferido=False):
+        """
+        Carga la versión activa del registro con manejo robusto de errores.
+        diferido=True: solo lee los metadatos (meta.json); el modelo se
+        deserializa con la primera predicción.
+        Un .pkl anterior al registro (model_path) se importa como primera versión.
+        """
+        self.firma_artefacto = self.registro.firma_puntero()
+        version = self.registro.version_activa()
+        
+        if version is None and not self.registro.versiones() and os.path.exists(self.model_path):
+            version = self._importar_modelo_previo()
+        
+        self.version_activa = version
+        self.model = None
+        self.encoders = {}
+        self.mlb = None
+        self.tabla_probabilidades = None
+        self._artefacto_cargado = False
+        self.cache_predicciones.invalidar()
+        
+        if version is None:
             logger.info("No se encontró modelo previo")
+            self.is_trained = False
+            self.stats = {}
+            self.model_id = None
             return False
         
+        meta = self.registro.meta(version)
+        self.model_id = meta.get('model_id') or f"legacy-{version}"
+        self.stats = {k: v for k, v in meta.items() if k not in ('model_id', 'is_trained', 'version', 'fecha_registro', 'origen')}
+        self.is_trained = bool(meta.get('is_trained', True))
+        
+        if diferido and 'total_principios' in meta:
+            return self.is_trained
+        
+        with self._lock_carga:
+            return self._cargar_artefacto(version)
+    
+    def _importar_modelo_previo(self):
+        """
+        Importa model_path al registro con sus metadatos y su artefacto .npz,
+        para que ningún proceso tenga que deserializar el .pkl para predecir.
+        Con varios procesos arrancando a la vez (workers de Streamlit) la
+        versión es la misma para todos (sale del mtime del fichero): el
+        primero la escribe y los demás la adoptan.
+        Retorna: la versión importada o None
+        """
+        version = None
         try:
+            st_modelo = os.stat(self.model_path)
+            version = datetime.fromtimestamp(st_modelo.st_mtime).strftime('%Y%m%d%H%M%S%f')
+            if self.registro.existe(version):
+                return self._adoptar_version_importada(version)
+            
+            import joblib
             modelo_data = joblib.load(self.model_path)
+            stats = dict(modelo_data.get('stats') or {})
+            if 'motor' not in stats:
+                from sklearn.multioutput import MultiOutputClassifier
+                stats['motor'] = MOTOR_MULTIOUTPUT if isinstance(modelo_data.get('model'), MultiOutputClassifier) else MOTOR_NATIVO
+            
+            meta = dict(
+                stats,
+                model_id=modelo_data.get('model_id') or f"legacy-{version}",
+                is_trained=bool(modelo_data.get('is_trained', False))
+            )
+            self.registro.importar(
+                self.model_path, version, meta,
+                adicionales={FICHERO_ARBOLES: lambda ruta: self._exportar_importado(ruta, modelo_data)}
+            )
+            self.firma_artefacto = self.registro.firma_puntero()
+            logger.info(f"Modelo {self.model_path} importado al registro como versión {version}")
+            return version
+        except Exception as e:
+            if version is not None and self.registro.existe(version):
+                # Otro proceso la ha registrado mientras tanto
+                return self._adoptar_version_importada(version)
+            logger.error(f"Error importando modelo al registro: {e}")
+            return None
+    
+    def _adoptar_version_importada(self, version):
+        if self.registro.version_activa() is None:
+            self.registro.activar(version)
+        self.firma_artefacto = self.registro.firma_puntero()
+        return version
+    
+    def _exportar_importado(self, ruta, modelo_data):
+        """
+        Artefacto .npz de un modelo importado (con su tabla; si el .pkl no la
+        tiene, se calcula aquí una vez en lugar de en cada proceso).
+        cargar_modelo limpia después el estado que se deja en la instancia.
+        """
+        self.model = modelo_data.get('model')
+        self.encoders = modelo_data.get('encoders') or {}
+        self.mlb = modelo_data.get('mlb')
+        self.tabla_probabilidades = modelo_data.get('tabla_probabilidades')
+        if self.model is None or not self.encoders or self.mlb is None or not modelo_data.get('is_trained', False):
+            # Sin modelo completo no hay artefacto; la versión se registra igual
+            return
+        if self.tabla_probabilidades is None:
+            self._actualizar_tabla_probabilidades()
+        if not self._exportar_numpy(ruta):
+            # Un .npz a medio escribir se confundiría con uno válido
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+    
+    def _asegurar_artefacto(self):
+        """
+        Carga el modelo de la versión activa si aún no está en memoria
+        """
+        if self._artefacto_cargado:
+            return True
+        with self._lock_carga:
+            if self._artefacto_cargado:
+                return True
+            if self.version_activa is None:
+                return False
+            return self._cargar_artefacto(self.version_activa)
+    
+    def _cargar_artefacto(self, version):
+        """
+        Carga la versión indicada: primero su artefacto .npz (memory-mapped,
+        sin scikit-learn ni unpickle) y, si no lo tiene, el .pkl; en ese caso
+        se exporta el .npz para las siguientes cargas.
+        """
+        ruta_npz = self.registro.ruta_fichero(version, FICHERO_ARBOLES)
+        if self.is_trained and os.path.exists(ruta_npz):
+            try:
+                artefacto = cargar_artefacto(ruta_npz)
+                self.model = artefacto.bosque
+                self.encoders = artefacto.encoders
+                self.mlb = artefacto.mlb
+                self.tabla_probabilidades = artefacto.tabla
+                if self.tabla_probabilidades is None:
+                    if self.stats.get('por_categoria'):
+                        # El bosque del .npz es solo el global
+                        raise ValueError("artefacto sin tabla de un modelo por categorías")
+                    self._actualizar_tabla_probabilidades()
+                self._artefacto_cargado = True
+                logger.info("Modelo cargado exitosamente (artefacto NumPy)")
+                return True
+            except Exception as e:
+                logger.warning(f"No se pudo abrir el artefacto NumPy de la versión {version}, se usa el .pkl: {e}")
+        
+        if not self._cargar_pickle(version):
+            return False
+        
+        if not os.path.exists(ruta_npz):
+            try:
+                self.registro.anadir_fichero(
+                    version, FICHERO_ARBOLES,
+                    lambda ruta: exportar_artefacto(ruta, self._bosque_exportable(), self.encoders, self.mlb, self.tabla_probabilidades)
+                )
+            except Exception as e:
+                logger.warning(f"No se pudo exportar el artefacto NumPy de la versión {version}: {e}")
+        return True
+    
+    def _cargar_pickle(self, version):
+        try:
+            import joblib
+            modelo_data = joblib.load(self.registro.ruta_modelo(version))
             
             # Verificar versión
             version_guardada = modelo_data.get('version', '1.0')
@@ -573,27 +1789,34 @@ class PredictorTactico:
             # Cargar componentes
             self.model = modelo_data.get('model')
             self.encoders = modelo_data.get('encoders', {})
-            self.mlb = modelo_data.get('mlb', MultiLabelBinarizer())
-            self.stats = modelo_data.get('stats', {})
+            self.mlb = modelo_data.get('mlb')
+            if not self.stats:
+                self.stats = dict(modelo_data.get('stats') or {})
+            if 'motor' not in self.stats:
+                from sklearn.multioutput import MultiOutputClassifier
+                self.stats['motor'] = MOTOR_MULTIOUTPUT if isinstance(self.model, MultiOutputClassifier) else MOTOR_NATIVO
             self.is_trained = modelo_data.get('is_trained', False)
             
             # Validar que el modelo está completo
-            if self.model is None or not self.encoders:
+            if self.model is None or not self.encoders or self.mlb is None:
                 logger.warning("Modelo incompleto, marcando como no entrenado")
                 self.is_trained = False
                 return False
             
+            # Modelos guardados sin tabla: se precalcula una vez en memoria
+            self.tabla_probabilidades = modelo_data.get('tabla_probabilidades')
+            if self.tabla_probabilidades is None and self.is_trained:
+                self._actualizar_tabla_probabilidades()
+            
+            self._artefacto_cargado = True
             logger.info("Modelo cargado exitosamente")
             return True
             
         except Exception as e:
-            logger.error(f"Error cargando modelo: {e}")
+            # La versión queda en el registro para poder inspeccionarla o
+            # activar otra
+            logger.error(f"Error cargando la versión {version} del modelo: {e}")
             self.is_trained = False
-            # Intentar eliminar modelo corrupto
-            try:
-                os.rename(self.model_path, self.model_path + '.corrupto')
-            except:
-                pass
             return False
     
     def resetear_modelo(self):
@@ -601,41 +1824,85 @@ class PredictorTactico:
         Resetea el modelo completamente
         """
         try:
-            # Backup antes de resetear
-            if os.path.exists(self.model_path):
-                backup_path = self.model_path + f'.backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
-                os.rename(self.model_path, backup_path)
+            # Las versiones se conservan en el registro: solo se desactiva
+            self.registro.desactivar()
             
             # Resetear estado
             self.model = None
             self.encoders = {}
-            self.mlb = MultiLabelBinarizer()
+            self.mlb = None
+            self._artefacto_cargado = False
             self.is_trained = False
             self.stats = {}
+            self.model_id = None
+            self.tabla_probabilidades = None
+            self.version_activa = None
+            self.firma_artefacto = self.registro.firma_puntero()
+            self.cache_predicciones.invalidar()
             
             return True, "Modelo reseteado correctamente"
             
         except Exception as e:
             return False, f"Error al resetear modelo: {str(e)}"
     
+    def artefacto_modificado(self):
+        """
+        True si la versión activa del registro no es la que tiene cargada esta
+        instancia (entrenamiento en segundo plano, rollback, reset...)
+        """
+        return self.registro.firma_puntero() != self.firma_artefacto
+    
+    def listar_versiones(self):
+        """Versiones del registro (más reciente primero) con sus metadatos"""
+        return self.registro.listar_versiones()
+    
+    def activar_version(self, version):
+        """
+        Activa otra versión del registro (rollback) y la carga
+        """
+        try:
+            self.registro.activar(version)
+        except Exception as e:
+            return False, f"No se pudo activar la versión: {str(e)}"
+        
+        if not self.cargar_modelo():
+            return False, f"La versión {version} no se pudo cargar"
+        return True, f"Versión {version} activada"
+    
+    def ruta_artefacto(self):
+        """Ruta del .pkl de la versión cargada"""
+        return self.registro.ruta_modelo(self.version_activa) if self.version_activa else None
+    
     def _extraer_mes(self, temporada):
         """
-        Extrae el mes de una temporada de forma segura
+        Extrae el mes de una temporada de forma segura: 1 si no es 'AAAA-MM'
+        (p. ej. el id_temporada numérico), como _mes_temporada al entrenar
         """
         try:
-            return pd.to_datetime(str(temporada), format='%Y-%m', errors='coerce').month or 1
+            fecha = pd.to_datetime(str(temporada), format='%Y-%m', errors='coerce')
+            return 1 if pd.isna(fecha) else int(fecha.month)
         except:
             return 1
 
 # Funciones de conveniencia
 predictor_global = None
+_lock_predictor = threading.Lock()
 
 def obtener_predictor():
-    """Obtiene la instancia global del predictor"""
+    """
+    Obtiene la instancia global del predictor.
+    Si el modelo en disco ha cambiado (entrenamiento en segundo plano), se
+    carga en una instancia nueva y se sustituye la global; las sesiones que
+    aún usan la anterior terminan con ella sin verse afectadas.
+    """
     global predictor_global
-    if predictor_global is None:
-        predictor_global = PredictorTactico()
-    return predictor_global
+    with _lock_predictor:
+        if predictor_global is None:
+            predictor_global = PredictorTactico()
+        elif predictor_global.artefacto_modificado():
+            logger.info("Modelo actualizado en disco, recargando predictor")
+            predictor_global = PredictorTactico(predictor_global.model_path, predictor_global.motor)
+        return predictor_global
 
 def entrenar_modelo_global(df):
     """Entrena el modelo con datos actuales"""
@@ -647,7 +1914,20 @@ def predecir_principios_global(categoria, bloque, dia, temporada=None, n_sugeren
     predictor = obtener_predictor()
     return predictor.predecir_principios(categoria, bloque, dia, temporada, n_sugerencias)
 
+def listar_versiones_modelo():
+    """Versiones registradas del modelo global"""
+    return obtener_predictor().listar_versiones()
+
+def activar_version_modelo(version):
+    """Rollback del modelo global a otra versión del registro"""
+    return obtener_predictor().activar_version(version)
+
 def resetear_modelo_global():
     """Resetea el modelo global"""
     predictor = obtener_predictor()
     return predictor.resetear_modelo()
+
+def predecir_microciclo_global(categoria, temporada=None, dias=None, bloques=None, n_sugerencias=5):
+    """Predice las sugerencias de todas las franjas del microciclo usando el modelo global"""
+    predictor = obtener_predictor()
+    return predictor.predecir_microciclo(categoria, temporada, dias, bloques, n_sugerencias)
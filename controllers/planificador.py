@@ -45,6 +45,24 @@ def crear_backup(archivo_path):
         return backup_path
     return None
 
+def _leer_planificacion():
+    """CSV de planificación con las columnas limpias (vacío si no existe)"""
+    if os.path.exists(RUTA_CSV):
+        df = pd.read_csv(RUTA_CSV)
+        # Limpiar columnas
+        df.columns = df.columns.str.strip().str.lower()
+        return df
+    return pd.DataFrame(columns=['id_temporada', 'categoria', 'nombre_microciclo', 
+                               'dia', 'bloque', 'principio', 'principios'])
+
+def _mascara_microciclo(df, id_temporada, categoria, nombre_microciclo):
+    """Filas del microciclo, con el mismo matching normalizado que al guardar"""
+    mascara = pd.Series(True, index=df.index)
+    for columna, valor in (('id_temporada', id_temporada), ('categoria', categoria),
+                           ('nombre_microciclo', nombre_microciclo)):
+        mascara &= df[columna].apply(normalize_for_matching) == normalize_for_matching(valor)
+    return mascara
+
 def guardar_planificacion(id_temporada, categoria, nombre_microciclo, dia, bloque, principios):
     """
     Guarda una entrada de planificación en el CSV.
@@ -52,26 +70,23 @@ def guardar_planificacion(id_temporada, categoria, nombre_microciclo, dia, bloqu
     """
     return guardar_planificacion_inteligente(id_temporada, categoria, nombre_microciclo, dia, bloque, principios)
 
-def guardar_planificacion_inteligente(id_temporada, categoria, nombre_microciclo, dia, bloque, principios):
+def guardar_planificacion_inteligente(id_temporada, categoria, nombre_microciclo, dia, bloque, principios,
+                                      actualizar_indices=True):
     """
     Guarda la planificación de forma inteligente:
     - Elimina duplicados automáticamente
     - Maneja principios individualmente
     - Crea backups antes de modificar
     - Mantiene consistencia de datos
+    actualizar_indices: False si quien llama guarda varias franjas seguidas y
+    actualiza los índices al final (ver guardar_microciclo)
     """
     try:
         # Crear backup antes de modificar
         backup_path = crear_backup(RUTA_CSV)
         
         # Cargar datos existentes o crear DataFrame vacío
-        if os.path.exists(RUTA_CSV):
-            df = pd.read_csv(RUTA_CSV)
-            # Limpiar columnas
-            df.columns = df.columns.str.strip().str.lower()
-        else:
-            df = pd.DataFrame(columns=['id_temporada', 'categoria', 'nombre_microciclo', 
-                                     'dia', 'bloque', 'principio', 'principios'])
+        df = _leer_planificacion()
         
         # Normalizar valores para matching
         id_temp_norm = normalize_for_matching(id_temporada)
@@ -125,6 +140,10 @@ def guardar_planificacion_inteligente(id_temporada, categoria, nombre_microciclo
         # Guardar
         df_final.to_csv(RUTA_CSV, index=False)
         
+        # Mantener al día los índices derivados (solo el microciclo tocado)
+        if actualizar_indices:
+            actualizar_indices_tras_guardado(df, df_final, id_temporada, categoria, nombre_microciclo)
+        
         return True, f"Guardado: {len(nuevos_registros)} principios para {dia}/{bloque}"
         
     except Exception as e:
@@ -133,6 +152,70 @@ def guardar_planificacion_inteligente(id_temporada, categoria, nombre_microciclo
             shutil.copy2(backup_path, RUTA_CSV)
         return False, f"Error al guardar: {str(e)}"
 
+def actualizar_indices_tras_guardado(df_anterior, df_nuevo, id_temporada, categoria, nombre_microciclo):
+    """
+    Lleva a los índices derivados (data/indices) el cambio de un microciclo
+    entre df_anterior y df_nuevo: se quitan todas sus filas anteriores y se
+    ponen las nuevas. Un fallo en un índice no impide el guardado: se
+    reconstruye en la próxima consulta.
+    """
+    anteriores = df_anterior[_mascara_microciclo(df_anterior, id_temporada, categoria, nombre_microciclo)]
+    nuevas = df_nuevo[_mascara_microciclo(df_nuevo, id_temporada, categoria, nombre_microciclo)]
+    microciclos = set(anteriores['nombre_microciclo'].dropna()) | {nombre_microciclo}
+    unidades = set(anteriores[['id_temporada', 'categoria', 'nombre_microciclo']].dropna().itertuples(index=False, name=None))
+    
+    try:
+        from controllers.indice_similitud import actualizar_indice_tras_guardado
+        actualizar_indice_tras_guardado(df_anterior, df_nuevo, microciclos)
+    except Exception as e:
+        print(f"Aviso: no se pudo actualizar el índice de similitud: {e}")
+    try:
+        from controllers.lsh_similitud import actualizar_lsh_tras_guardado
+        actualizar_lsh_tras_guardado(df_anterior, df_nuevo, microciclos)
+    except Exception as e:
+        print(f"Aviso: no se pudo actualizar el índice LSH: {e}")
+    try:
+        from controllers.vecinos_microciclos import actualizar_tabla_tras_guardado
+        actualizar_tabla_tras_guardado(df_anterior, df_nuevo, unidades | {(id_temporada, categoria, nombre_microciclo)})
+    except Exception as e:
+        print(f"Aviso: no se pudo actualizar la tabla de vecinos: {e}")
+    try:
+        from controllers.cubo_carga import actualizar_cubo_tras_guardado
+        actualizar_cubo_tras_guardado(df_anterior, anteriores, nuevas, df_nuevo)
+    except Exception as e:
+        print(f"Aviso: no se pudo actualizar el cubo de carga: {e}")
+    try:
+        from controllers.transiciones_microciclos import actualizar_transiciones_tras_guardado
+        actualizar_transiciones_tras_guardado(df_anterior, df_nuevo, {(id_temporada, categoria, nombre_microciclo)})
+    except Exception as e:
+        print(f"Aviso: no se pudo actualizar el índice de transiciones: {e}")
+
+def guardar_microciclo(id_temporada, categoria, nombre_microciclo, franjas, progreso=None):
+    """
+    Guarda todas las franjas de un microciclo (editor de microciclos).
+    franjas: {(dia, bloque): principios}
+    progreso: función opcional progreso(dia, bloque, fraccion), antes de cada franja
+    Cada franja se guarda con guardar_planificacion_inteligente, pero los
+    índices derivados se actualizan una sola vez, al terminar.
+    Retorna: {(dia, bloque): (exito, mensaje)}
+    """
+    df_anterior = _leer_planificacion()
+    resultados = {}
+    
+    for i, ((dia, bloque), principios) in enumerate(franjas.items()):
+        if progreso is not None:
+            progreso(dia, bloque, (i + 1) / len(franjas))
+        try:
+            resultados[(dia, bloque)] = guardar_planificacion_inteligente(
+                id_temporada, categoria, nombre_microciclo, dia, bloque, principios, actualizar_indices=False
+            )
+        except Exception as e:
+            resultados[(dia, bloque)] = (False, f"Error - {str(e)}")
+    
+    if any(exito for exito, _ in resultados.values()):
+        actualizar_indices_tras_guardado(df_anterior, _leer_planificacion(), id_temporada, categoria, nombre_microciclo)
+    return resultados
+
 def cargar_datos_csv(ruta):
     """
     Carga datos desde un archivo CSV.
@@ -1,6 +1,7 @@
 # controllers/proteccion.py
 
 import streamlit as st
+from controllers.asignaciones import obtener_indice_asignaciones
 
 def verificar_acceso(roles_permitidos=None):
     """
@@ -99,6 +100,52 @@ def es_visor():
     """
     return st.session_state.get('rol', '') == 'visor'
 
+def categorias_asignadas():
+    """
+    Categorías en las que el usuario actual figura como entrenador.
+    
+    Returns:
+        set: Categorías asignadas (vacío si no está autenticado)
+    """
+    info_usuario = obtener_info_usuario()
+    if not info_usuario:
+        return set()
+    
+    return obtener_indice_asignaciones().categorias_de(
+        info_usuario['usuario'], info_usuario['nombre_completo']
+    )
+
+def puede_editar_staff(categoria):
+    """
+    Verifica si el usuario actual puede editar el cuerpo técnico de una categoría.
+    
+    Returns:
+        bool: True si es admin o entrenador asignado a la categoría
+    """
+    return es_admin() or categoria in categorias_asignadas()
+
+def puede_exportar_categoria(categoria):
+    """
+    Decide si el usuario actual puede exportar datos de una categoría.
+    
+    Returns:
+        tuple: (puede_exportar, mensaje)
+    """
+    if es_admin():
+        return True, "✅ Como administrador, puedes exportar todos los datos."
+    
+    if es_entrenador():
+        if obtener_indice_asignaciones().fila(categoria) is None:
+            return True, "✅ Puedes exportar este microciclo."  # Si la categoría no tiene fila de staff, permitir
+        if categoria in categorias_asignadas():
+            return True, "✅ Puedes exportar este microciclo porque estás asignado a esta categoría."
+        return False, "⚠️ Solo puedes exportar microciclos de categorías donde estés asignado como entrenador."
+    
+    if es_visor():
+        return False, "❌ Los usuarios con rol de visor no pueden exportar datos."
+    
+    return False, "❌ No tienes permisos para exportar."
+
 def requiere_admin():
     """
     Decorator para funciones que requieren rol de administrador.
@@ -0,0 +1,224 @@
+# controllers/registro_modelos.py
+
+import json
+import os
+import pickle
+import shutil
+from datetime import datetime
+
+# Configuración
+REGISTRO_DIR = "models/registro"
+PUNTERO_ACTIVO = "activo.json"
+FICHERO_MODELO = "modelo.pkl"
+FICHERO_META = "meta.json"
+FICHERO_ARBOLES = "arboles.npz"
+BUSQUEDAS_DIR = "busquedas"
+MAX_VERSIONES = 10
+MAX_BUSQUEDAS = 20
+
+
+def _escribir_json_atomico(ruta, datos):
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp, ruta)
+
+
+def _leer_json(ruta):
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class RegistroModelos:
+    """
+    Registro de versiones del predictor táctico:
+        models/registro/<version>/modelo.pkl   artefacto
+        models/registro/<version>/meta.json    huella de datos, hiperparámetros, métricas...
+        models/registro/<version>/arboles.npz  artefacto de inferencia sin scikit-learn (opcional)
+        models/registro/activo.json            puntero a la versión activa
+        models/registro/busquedas/<id>.json    búsquedas de hiperparámetros (coste y precisión de cada candidato)
+    Las versiones no se modifican una vez escritas; activar otra versión
+    (rollback) solo reescribe el puntero, de forma atómica.
+    """
+
+    def __init__(self, directorio=REGISTRO_DIR, max_versiones=MAX_VERSIONES):
+        self.directorio = directorio
+        self.max_versiones = max_versiones
+
+    @property
+    def ruta_puntero(self):
+        return os.path.join(self.directorio, PUNTERO_ACTIVO)
+
+    def ruta_version(self, version):
+        return os.path.join(self.directorio, str(version))
+
+    def ruta_modelo(self, version):
+        return os.path.join(self.ruta_version(version), FICHERO_MODELO)
+
+    def ruta_fichero(self, version, nombre):
+        return os.path.join(self.ruta_version(version), nombre)
+
+    def existe(self, version):
+        return os.path.isfile(self.ruta_modelo(version))
+
+    def registrar(self, modelo_data, meta, version, activar=True, adicionales=None):
+        """
+        Escribe una versión nueva y opcionalmente la activa.
+        adicionales: {nombre_fichero: callable(ruta)} para escribir otros
+        ficheros de la versión (p. ej. el artefacto de inferencia .npz)
+        El .pkl se escribe con pickle (protocolo 5), que es bastante más rápido
+        que joblib.dump con bosques grandes; joblib.load lo lee igualmente.
+        """
+        def escribir(ruta):
+            with open(ruta, 'wb') as f:
+                pickle.dump(modelo_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        return self._escribir_version(version, meta, escribir, activar, adicionales)
+
+    def importar(self, ruta_pkl, version, meta=None, adicionales=None):
+        """Registra y activa un .pkl existente (modelos anteriores al registro)"""
+        meta = dict(meta or {}, origen=ruta_pkl)
+        return self._escribir_version(
+            version, meta, lambda ruta: shutil.copy2(ruta_pkl, ruta), activar=True, adicionales=adicionales
+        )
+
+    def _escribir_version(self, version, meta, escribir_modelo, activar, adicionales=None):
+        """
+        La versión se escribe en un directorio temporal que luego se renombra,
+        para que nunca quede a medias en el registro. El temporal es de cada
+        proceso: varios procesos pueden intentar escribir la misma versión a
+        la vez (p. ej. al importar el modelo anterior) y solo uno la renombra.
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        destino = self.ruta_version(version)
+        if os.path.exists(destino):
+            raise ValueError(f"La versión {version} ya existe en el registro")
+
+        tmp = f"{destino}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        try:
+            escribir_modelo(os.path.join(tmp, FICHERO_MODELO))
+            for nombre, escribir in (adicionales or {}).items():
+                escribir(os.path.join(tmp, nombre))
+            meta = dict(meta, version=version, fecha_registro=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            _escribir_json_atomico(os.path.join(tmp, FICHERO_META), meta)
+            os.replace(tmp, destino)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        if activar:
+            self.activar(version)
+        self.purgar()
+        return version
+
+    def anadir_fichero(self, version, nombre, escribir):
+        """
+        Añade un fichero derivado a una versión ya registrada (p. ej. el .npz
+        de un modelo importado). Se escribe aparte y se renombra: quien lo
+        lee nunca lo ve a medias.
+        """
+        if not self.existe(version):
+            raise ValueError(f"La versión {version} no existe en el registro")
+        ruta = self.ruta_fichero(version, nombre)
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        try:
+            escribir(tmp)
+            os.replace(tmp, ruta)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return ruta
+
+    def activar(self, version):
+        """Cambia la versión activa (rollback instantáneo)"""
+        if not self.existe(version):
+            raise ValueError(f"La versión {version} no existe en el registro")
+        _escribir_json_atomico(self.ruta_puntero, {
+            "version": version,
+            "activado": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    def desactivar(self):
+        """Deja el registro sin versión activa (las versiones se conservan)"""
+        try:
+            os.remove(self.ruta_puntero)
+        except OSError:
+            pass
+
+    def version_activa(self):
+        puntero = _leer_json(self.ruta_puntero)
+        version = puntero.get("version") if puntero else None
+        return version if version and self.existe(version) else None
+
+    def firma_puntero(self):
+        """(mtime_ns, size) del puntero: cambia cada vez que se activa una versión"""
+        try:
+            st_puntero = os.stat(self.ruta_puntero)
+            return (st_puntero.st_mtime_ns, st_puntero.st_size)
+        except OSError:
+            return None
+
+    def meta(self, version):
+        return _leer_json(os.path.join(self.ruta_version(version), FICHERO_META)) or {}
+
+    def meta_activa(self):
+        version = self.version_activa()
+        return self.meta(version) if version else None
+
+    def versiones(self):
+        """Versiones registradas, de la más reciente a la más antigua"""
+        try:
+            nombres = os.listdir(self.directorio)
+        except OSError:
+            return []
+        return sorted((n for n in nombres if not n.endswith(".tmp") and self.existe(n)), reverse=True)
+
+    def listar_versiones(self):
+        activa = self.version_activa()
+        return [dict(self.meta(v), version=v, activa=(v == activa)) for v in self.versiones()]
+
+    def purgar(self):
+        """Elimina las versiones más antiguas por encima de max_versiones (nunca la activa)"""
+        activa = self.version_activa()
+        for version in self.versiones()[self.max_versiones:]:
+            if version != activa:
+                shutil.rmtree(self.ruta_version(version), ignore_errors=True)
+
+    # Búsquedas de hiperparámetros
+
+    @property
+    def directorio_busquedas(self):
+        return os.path.join(self.directorio, BUSQUEDAS_DIR)
+
+    def registrar_busqueda(self, busqueda):
+        """Guarda el resultado de una búsqueda (dict con 'id') y purga las más antiguas"""
+        os.makedirs(self.directorio_busquedas, exist_ok=True)
+        _escribir_json_atomico(os.path.join(self.directorio_busquedas, f"{busqueda['id']}.json"), busqueda)
+        for nombre in self._ficheros_busquedas()[MAX_BUSQUEDAS:]:
+            try:
+                os.remove(os.path.join(self.directorio_busquedas, nombre))
+            except OSError:
+                pass
+        return busqueda['id']
+
+    def _ficheros_busquedas(self):
+        try:
+            return sorted((n for n in os.listdir(self.directorio_busquedas) if n.endswith(".json")), reverse=True)
+        except OSError:
+            return []
+
+    def listar_busquedas(self, limite=10):
+        """Búsquedas registradas, de la más reciente a la más antigua"""
+        nombres = self._ficheros_busquedas()
+        if limite is not None:
+            nombres = nombres[:limite]
+        busquedas = [_leer_json(os.path.join(self.directorio_busquedas, n)) for n in nombres]
+        return [b for b in busquedas if b]
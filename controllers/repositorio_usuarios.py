@@ -0,0 +1,296 @@
+# controllers/repositorio_usuarios.py
+
+import os
+import sqlite3
+import queue
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# Configuración
+USUARIOS_DB = "data/usuarios.db"
+# Conexiones SQLite abiertas a la vez como mucho (WAL: lectores en paralelo, un escritor)
+MAX_CONEXIONES = 8
+COLUMNAS_USUARIO = ["usuario", "password", "rol", "nombre_completo", "email", "fecha_creacion", "activo"]
+
+ESQUEMA_USUARIOS = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    usuario         TEXT NOT NULL,
+    usuario_norm    TEXT NOT NULL,
+    password        TEXT NOT NULL,
+    rol             TEXT NOT NULL,
+    nombre_completo TEXT,
+    email           TEXT,
+    fecha_creacion  TEXT,
+    activo          INTEGER NOT NULL DEFAULT 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_usuarios_norm ON usuarios(usuario_norm);
+"""
+
+
+def normalizar_usuario(usuario):
+    """Clave de búsqueda de un usuario (comparación case insensitive)"""
+    return str(usuario).strip().lower()
+
+
+def _a_bool(valor):
+    """Interpreta los distintos formatos de 'activo' que aparecen en el CSV"""
+    if isinstance(valor, str):
+        return valor.strip().lower() not in ("false", "0", "no", "")
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return True
+    return bool(valor)
+
+
+class RepositorioUsuarios(ABC):
+    """
+    Interfaz del almacén de usuarios.
+    Todas las operaciones trabajan con diccionarios con las claves de COLUMNAS_USUARIO.
+    """
+
+    @abstractmethod
+    def inicializar(self):
+        """Crea el almacén si no existe"""
+
+    @abstractmethod
+    def obtener(self, usuario):
+        """Retorna el registro del usuario (case insensitive) o None"""
+
+    @abstractmethod
+    def listar(self):
+        """Retorna un DataFrame con todos los usuarios (incluido el hash)"""
+
+    @abstractmethod
+    def crear(self, registro):
+        """Inserta un usuario. Retorna: (exitoso, mensaje)"""
+
+    @abstractmethod
+    def eliminar(self, usuario):
+        """Elimina un usuario. Retorna: (exitoso, mensaje)"""
+
+    @abstractmethod
+    def actualizar_password(self, usuario, password_hash):
+        """Sustituye el hash de la contraseña. Retorna: (exitoso, mensaje)"""
+
+    @abstractmethod
+    def contar(self):
+        """Número de usuarios"""
+
+
+class PoolConexionesSQLite:
+    """
+    Pool acotado de conexiones SQLite (como mucho max_conexiones abiertas).
+    Streamlit ejecuta cada rerun en un hilo nuevo, así que no sirve una
+    conexión por hilo: cada operación toma una conexión libre con
+    conexion() y la devuelve al terminar. Las conexiones se abren bajo
+    demanda; si están todas ocupadas se espera a que quede una libre.
+    """
+
+    def __init__(self, ruta_db, timeout=10.0, max_conexiones=MAX_CONEXIONES):
+        self.ruta_db = ruta_db
+        self.timeout = timeout
+        self.max_conexiones = max_conexiones
+        self._libres = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._abiertas = 0
+
+    def _abrir(self):
+        os.makedirs(os.path.dirname(self.ruta_db) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.ruta_db, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+        return conn
+
+    def _tomar(self):
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            abrir = self._abiertas < self.max_conexiones
+            if abrir:
+                self._abiertas += 1
+        if not abrir:
+            return self._libres.get()
+        try:
+            return self._abrir()
+        except Exception:
+            with self._lock:
+                self._abiertas -= 1
+            raise
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._abiertas -= 1
+
+    @contextmanager
+    def conexion(self):
+        """Conexión del pool durante el bloque with; vuelve al pool al salir"""
+        conn = self._tomar()
+        try:
+            yield conn
+        finally:
+            # Una conexión con una transacción a medias no vuelve al pool
+            if conn.in_transaction:
+                self._descartar(conn)
+            else:
+                self._libres.put(conn)
+
+    def cerrar_todas(self):
+        """Cierra las conexiones libres; las que estén en uso vuelven al pool al terminar"""
+        while True:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(conn)
+
+
+class RepositorioUsuariosSQLite(RepositorioUsuarios):
+    """Almacén de usuarios en SQLite con índice único sobre el usuario en minúsculas"""
+
+    def __init__(self, ruta_db=USUARIOS_DB):
+        self.ruta_db = ruta_db
+        self.pool = PoolConexionesSQLite(ruta_db)
+
+    def inicializar(self):
+        with self.pool.conexion() as conn, conn:
+            conn.executescript(ESQUEMA_USUARIOS)
+
+    def _fila_a_dict(self, fila):
+        if fila is None:
+            return None
+        registro = {col: fila[col] for col in COLUMNAS_USUARIO}
+        registro["activo"] = bool(registro["activo"])
+        return registro
+
+    def obtener(self, usuario):
+        with self.pool.conexion() as conn:
+            fila = conn.execute(
+                "SELECT * FROM usuarios WHERE usuario_norm = ?",
+                (normalizar_usuario(usuario),)
+            ).fetchone()
+        return self._fila_a_dict(fila)
+
+    def listar(self):
+        with self.pool.conexion() as conn:
+            filas = conn.execute(
+                f"SELECT {', '.join(COLUMNAS_USUARIO)} FROM usuarios ORDER BY rowid"
+            ).fetchall()
+        df = pd.DataFrame([dict(f) for f in filas], columns=COLUMNAS_USUARIO)
+        df["activo"] = df["activo"].astype(bool)
+        return df
+
+    def crear(self, registro):
+        try:
+            with self.pool.conexion() as conn, conn:
+                conn.execute(
+                    "INSERT INTO usuarios (usuario, usuario_norm, password, rol, nombre_completo, "
+                    "email, fecha_creacion, activo) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        registro["usuario"],
+                        normalizar_usuario(registro["usuario"]),
+                        registro["password"],
+                        registro["rol"],
+                        registro.get("nombre_completo", ""),
+                        registro.get("email", ""),
+                        registro.get("fecha_creacion") or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        1 if _a_bool(registro.get("activo", True)) else 0,
+                    )
+                )
+            return True, "Usuario creado correctamente"
+        except sqlite3.IntegrityError:
+            return False, "El usuario ya existe"
+
+    def eliminar(self, usuario):
+        with self.pool.conexion() as conn, conn:
+            cursor = conn.execute(
+                "DELETE FROM usuarios WHERE usuario_norm = ?",
+                (normalizar_usuario(usuario),)
+            )
+        if cursor.rowcount == 0:
+            return False, "Usuario no encontrado"
+        return True, "Usuario eliminado correctamente"
+
+    def actualizar_password(self, usuario, password_hash):
+        with self.pool.conexion() as conn, conn:
+            cursor = conn.execute(
+                "UPDATE usuarios SET password = ? WHERE usuario_norm = ?",
+                (password_hash, normalizar_usuario(usuario))
+            )
+        if cursor.rowcount == 0:
+            return False, "Usuario no encontrado"
+        return True, "Contraseña actualizada correctamente"
+
+    def contar(self):
+        with self.pool.conexion() as conn:
+            return conn.execute("SELECT COUNT(*) FROM usuarios").fetchone()[0]
+
+    # ---------- Migración desde / exportación a CSV ----------
+
+    def importar_csv(self, ruta_csv):
+        """
+        Importa usuarios desde el formato CSV histórico.
+        Los usuarios ya existentes (case insensitive) se conservan.
+        Retorna: (exitoso, mensaje)
+        """
+        if not os.path.exists(ruta_csv):
+            return False, f"No existe {ruta_csv}"
+
+        try:
+            df = pd.read_csv(ruta_csv, dtype=str, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            return False, "El archivo está vacío o corrupto"
+
+        faltantes = [col for col in ["usuario", "password", "rol"] if col not in df.columns]
+        if faltantes:
+            return False, f"Faltan columnas requeridas: {', '.join(faltantes)}"
+
+        for col in COLUMNAS_USUARIO:
+            if col not in df.columns:
+                df[col] = ""
+
+        filas = [
+            (
+                r["usuario"], normalizar_usuario(r["usuario"]), r["password"], r["rol"],
+                r["nombre_completo"] or r["usuario"], r["email"],
+                r["fecha_creacion"] or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                1 if _a_bool(r["activo"] if r["activo"] != "" else True) else 0,
+            )
+            for r in df.to_dict("records") if str(r["usuario"]).strip()
+        ]
+
+        with self.pool.conexion() as conn, conn:
+            antes = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO usuarios (usuario, usuario_norm, password, rol, nombre_completo, "
+                "email, fecha_creacion, activo) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                filas
+            )
+            importados = conn.total_changes - antes
+
+        return True, f"Migración completada: {importados} de {len(filas)} usuarios importados"
+
+    def exportar_csv(self, ruta_csv):
+        """
+        Exporta todos los usuarios al formato CSV histórico.
+        Retorna: (exitoso, mensaje)
+        """
+        try:
+            os.makedirs(os.path.dirname(ruta_csv) or ".", exist_ok=True)
+            df = self.listar()
+            temporal = ruta_csv + ".tmp"
+            df.to_csv(temporal, index=False)
+            os.replace(temporal, ruta_csv)
+            return True, f"{len(df)} usuarios exportados a {ruta_csv}"
+        except Exception as e:
+            return False, f"Error al exportar usuarios: {str(e)}"
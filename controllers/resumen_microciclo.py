@@ -4,7 +4,8 @@ import os
 import plotly.express as px
 from fpdf import FPDF
 import io
-from controllers.proteccion import es_admin, es_entrenador, es_visor, obtener_info_usuario
+from controllers.proteccion import es_admin, es_entrenador, es_visor, obtener_info_usuario, puede_exportar_categoria
+from controllers.asignaciones import obtener_indice_asignaciones
 
 PLANIFICACION_CSV = "data/planificacion_microciclos.csv"
 
@@ -57,38 +58,8 @@ def mostrar_resumen_microciclo(id_temporada, categoria, nombre_microciclo):
     # CONTROL DE EXPORTACIÓN POR ROL
     # =====================
     
-    # Verificar permisos de exportación
-    puede_exportar = False
-    mensaje_exportacion = ""
-    
-    if es_admin():
-        puede_exportar = True
-        mensaje_exportacion = "✅ Como administrador, puedes exportar todos los datos."
-    elif es_entrenador():
-        # Verificar si el entrenador está asignado a esta categoría
-        info_usuario = obtener_info_usuario()
-        df_staff = pd.read_csv("data/staff_por_categoria.csv")
-        fila_staff = df_staff[df_staff["categoria"] == categoria]
-        
-        if not fila_staff.empty:
-            entrenador_asignado = fila_staff["entrenador"].values[0]
-            # Comparar con el nombre completo o usuario
-            if (info_usuario['usuario'] == entrenador_asignado or 
-                info_usuario['nombre_completo'] == entrenador_asignado):
-                puede_exportar = True
-                mensaje_exportacion = "✅ Puedes exportar este microciclo porque estás asignado a esta categoría."
-            else:
-                puede_exportar = False
-                mensaje_exportacion = "⚠️ Solo puedes exportar microciclos de categorías donde estés asignado como entrenador."
-        else:
-            puede_exportar = True  # Si no hay entrenador asignado, permitir
-            mensaje_exportacion = "✅ Puedes exportar este microciclo."
-    elif es_visor():
-        puede_exportar = False
-        mensaje_exportacion = "❌ Los usuarios con rol de visor no pueden exportar datos."
-    else:
-        puede_exportar = False
-        mensaje_exportacion = "❌ No tienes permisos para exportar."
+    # Verificar permisos de exportación (índice de asignaciones, sin leer el CSV de staff)
+    puede_exportar, mensaje_exportacion = puede_exportar_categoria(categoria)
 
     # Mostrar sección de exportación solo si tiene permisos
     if puede_exportar:
@@ -96,12 +67,12 @@ def mostrar_resumen_microciclo(id_temporada, categoria, nombre_microciclo):
         st.info(mensaje_exportacion)
         
         # Preparar datos para exportación
-        df_staff = pd.read_csv("data/staff_por_categoria.csv")
-        fila_staff = df_staff[df_staff["categoria"] == categoria]
+        fila_staff = obtener_indice_asignaciones().fila(categoria) or {}
 
-        entrenador = fila_staff["entrenador"].values[0] if not fila_staff.empty else "N/D"
-        staff = fila_staff["staff"].values[0] if not fila_staff.empty else "N/D"
-        fecha = fila_staff["fecha"].values[0] if not fila_staff.empty else "N/D"
+        # Las celdas vacías del CSV llegan como NaN
+        entrenador = "N/D" if pd.isna(fila_staff.get("entrenador")) else fila_staff["entrenador"]
+        staff = "N/D" if pd.isna(fila_staff.get("staff")) else fila_staff["staff"]
+        fecha = "N/D" if pd.isna(fila_staff.get("fecha")) else fila_staff["fecha"]
 
         df_export = df_filtrado[["dia", "bloque", "principios"]].copy()
         df_export.columns = ["Día", "Bloque", "Principios tácticos"]
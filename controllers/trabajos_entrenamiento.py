@@ -0,0 +1,489 @@
+# controllers/trabajos_entrenamiento.py
+
+import atexit
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from controllers.modelo_prediccion import (
+    PredictorTactico,
+    MENSAJE_CANCELADO,
+    MOTOR_POR_DEFECTO,
+    obtener_predictor,
+)
+from controllers.registro_modelos import RegistroModelos
+
+# Configuración
+TRABAJOS_DIR = "models/trabajos"
+MODELO_PATH = "models/predictor_tactico.pkl"
+PLANIFICACION_CSV = "data/planificacion_microciclos.csv"
+MAX_TRABAJOS_CONSERVADOS = 20
+# Sin escribir el estado durante más tiempo que esto, un trabajo activo se
+# da por perdido aunque su pid exista (los pid se reutilizan). Holgado: una
+# fase de ajuste larga no escribe progreso hasta terminar
+LATIDO_MAX_S = 2 * 3600
+
+# Tipos de trabajo
+TIPO_ENTRENAMIENTO = "entrenamiento"
+TIPO_BUSQUEDA = "busqueda"
+
+# Estados de un trabajo
+ESTADO_PENDIENTE = "pendiente"
+ESTADO_EN_CURSO = "en_curso"
+ESTADO_COMPLETADO = "completado"
+ESTADO_FALLIDO = "fallido"
+ESTADO_CANCELADO = "cancelado"
+ESTADOS_ACTIVOS = (ESTADO_PENDIENTE, ESTADO_EN_CURSO)
+
+MENSAJE_ACTUALIZACION_PENDIENTE = "Hay un entrenamiento en curso: el modelo se actualizará al terminar"
+
+
+def _ruta_estado(directorio, id_trabajo):
+    return os.path.join(directorio, f"{id_trabajo}.json")
+
+
+def _ruta_cancelacion(directorio, id_trabajo):
+    return os.path.join(directorio, f"{id_trabajo}.cancelar")
+
+
+def _ruta_pendiente(directorio):
+    """Marca de guardados llegados con un trabajo en curso (contiene el usuario)"""
+    return os.path.join(directorio, "actualizacion.pendiente")
+
+
+def _leer_estado(directorio, id_trabajo):
+    try:
+        with open(_ruta_estado(directorio, id_trabajo), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _proceso_vivo(pid):
+    """True si existe un proceso con ese pid (señal 0: no se envía nada)"""
+    try:
+        pid = int(pid)
+        if pid <= 0:
+            # 0 y negativos señalan grupos de procesos, no un proceso
+            return False
+        os.kill(pid, 0)
+    except PermissionError:
+        # Existe, pero es de otro usuario
+        return True
+    except (OSError, TypeError, ValueError):
+        return False
+    return True
+
+
+def _latido_caducado(estado):
+    """True si el estado lleva más de LATIDO_MAX_S sin escribirse"""
+    try:
+        actualizado = datetime.strptime(estado.get("actualizado"), "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return True
+    return (datetime.now() - actualizado).total_seconds() > LATIDO_MAX_S
+
+
+def _escribir_estado(directorio, estado):
+    """Escritura atómica: quien lee el JSON nunca lo ve a medias"""
+    estado["actualizado"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    ruta = _ruta_estado(directorio, estado["id"])
+    tmp = ruta + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(estado, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, ruta)
+
+
+def _ejecutar_trabajo(id_trabajo, df, motor, model_path, directorio, forzar=False, incremental=False, por_categoria=False,
+                      hiperparametros=None):
+    """
+    Cuerpo del trabajo; se ejecuta en el proceso de entrenamiento.
+    Va dejando la fase y el progreso en el JSON del trabajo y consulta el
+    fichero de cancelación entre fases.
+    incremental: actualizar el modelo activo solo con las franjas que han
+    cambiado (PredictorTactico.entrenar_incremental)
+    por_categoria: un modelo por categoría además del global
+    hiperparametros: los de un candidato de una búsqueda (ver lanzar_busqueda)
+    """
+    estado = _leer_estado(directorio, id_trabajo) or {"id": id_trabajo}
+    estado.update({"estado": ESTADO_EN_CURSO, "pid": os.getpid(), "inicio": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+    _escribir_estado(directorio, estado)
+
+    def progreso(fase, fraccion):
+        estado.update({"fase": fase, "progreso": fraccion})
+        _escribir_estado(directorio, estado)
+
+    def cancelado():
+        return os.path.exists(_ruta_cancelacion(directorio, id_trabajo))
+
+    try:
+        predictor = PredictorTactico(model_path=model_path, motor=motor)
+        if incremental:
+            exito, mensaje = predictor.entrenar_incremental(df, progreso=progreso, cancelado=cancelado)
+        else:
+            exito, mensaje = predictor.entrenar_modelo(
+                df, motor=motor, progreso=progreso, cancelado=cancelado, forzar=forzar,
+                por_categoria=por_categoria, hiperparametros=hiperparametros
+            )
+    except Exception as e:
+        exito, mensaje = False, f"Error inesperado al entrenar: {str(e)}"
+
+    if exito:
+        estado.update({
+            "estado": ESTADO_COMPLETADO, "progreso": 1.0,
+            "version": predictor.version_activa, "stats": predictor.stats
+        })
+    elif mensaje == MENSAJE_CANCELADO:
+        estado["estado"] = ESTADO_CANCELADO
+    else:
+        estado["estado"] = ESTADO_FALLIDO
+    estado.update({"mensaje": mensaje, "fin": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+    _escribir_estado(directorio, estado)
+
+    try:
+        os.remove(_ruta_cancelacion(directorio, id_trabajo))
+    except OSError:
+        pass
+
+    return exito, mensaje
+
+
+def _ejecutar_busqueda(id_trabajo, df, model_path, directorio, presupuesto_s, n_candidatos):
+    """
+    Búsqueda de hiperparámetros (controllers/busqueda_hiperparametros.py);
+    se ejecuta en el proceso de entrenamiento, que reparte las evaluaciones
+    en su propio pool. El resultado se guarda en el registro de modelos.
+    """
+    from controllers.busqueda_hiperparametros import ejecutar_y_registrar
+
+    estado = _leer_estado(directorio, id_trabajo) or {"id": id_trabajo}
+    estado.update({"estado": ESTADO_EN_CURSO, "pid": os.getpid(), "inicio": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+    _escribir_estado(directorio, estado)
+
+    def progreso(fraccion, mensaje):
+        estado.update({"fase": mensaje, "progreso": fraccion})
+        _escribir_estado(directorio, estado)
+
+    def cancelado():
+        return os.path.exists(_ruta_cancelacion(directorio, id_trabajo))
+
+    try:
+        registro = RegistroModelos(os.path.join(os.path.dirname(model_path) or ".", "registro"))
+        resultado = ejecutar_y_registrar(
+            df, registro, presupuesto_s=presupuesto_s, n_candidatos=n_candidatos,
+            progreso=progreso, cancelado=cancelado
+        )
+        evaluados = sum(1 for c in resultado["candidatos"] if "f1" in c)
+        mejor = resultado["mejor"]
+        exito = mejor is not None
+        mensaje = (
+            f"Búsqueda terminada: {evaluados} candidatos evaluados en {resultado['duracion_s']:.0f}s"
+            + (" (presupuesto agotado)" if resultado["agotado"] else "")
+            + (f". Mejor: {mejor['motor']}, {mejor['n_estimators']} árboles, F1 {mejor['f1']:.2f}" if mejor else "")
+        )
+        if resultado["cancelada"]:
+            estado["estado"] = ESTADO_CANCELADO
+        else:
+            estado["estado"] = ESTADO_COMPLETADO if exito else ESTADO_FALLIDO
+        estado.update({"progreso": 1.0, "busqueda": resultado["id"]})
+    except Exception as e:
+        exito, mensaje = False, f"Error en la búsqueda de hiperparámetros: {str(e)}"
+        estado["estado"] = ESTADO_FALLIDO
+    estado.update({"mensaje": mensaje, "fin": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+    _escribir_estado(directorio, estado)
+
+    try:
+        os.remove(_ruta_cancelacion(directorio, id_trabajo))
+    except OSError:
+        pass
+
+    return exito, mensaje
+
+
+class GestorEntrenamiento:
+    """
+    Lanza los entrenamientos del predictor en un proceso aparte para no
+    bloquear la sesión de Streamlit ni competir con el resto por la CPU del
+    servidor. Un único entrenamiento a la vez; el estado de cada trabajo
+    (fase, progreso, resultado) se persiste en TRABAJOS_DIR/<id>.json, así que
+    cualquier sesión puede consultarlo.
+    """
+
+    def __init__(self, directorio=TRABAJOS_DIR, model_path=MODELO_PATH):
+        self.directorio = directorio
+        self.model_path = model_path
+        self._executor = None
+        self._futuros = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(self.directorio, exist_ok=True)
+        self._marcar_huerfanos()
+
+    def _obtener_executor(self):
+        if self._executor is None:
+            # spawn: el servidor de Streamlit tiene hilos, no es seguro hacer fork
+            self._executor = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _marcar_huerfanos(self):
+        """
+        Trabajos activos cuyo gestor ya no existe (reinicio del servidor) o que
+        han dejado de dar señales. Los de otro proceso vivo (otro worker de
+        Streamlit con el mismo directorio) se dejan en paz.
+        """
+        for estado in self.listar_trabajos(limite=None):
+            if estado.get("estado") not in ESTADOS_ACTIVOS:
+                continue
+            if not _proceso_vivo(estado.get("pid_gestor")):
+                mensaje = "Interrumpido (reinicio del servidor)"
+            elif _latido_caducado(estado):
+                mensaje = f"Interrumpido (sin actividad en {LATIDO_MAX_S // 60} min)"
+            else:
+                continue
+            estado.update({"estado": ESTADO_FALLIDO, "mensaje": mensaje})
+            _escribir_estado(self.directorio, estado)
+
+    def lanzar(self, df, motor=MOTOR_POR_DEFECTO, usuario=None, forzar=False, incremental=False, por_categoria=False,
+               hiperparametros=None):
+        """
+        Encola un entrenamiento. Si los datos coinciden con los de la versión
+        activa (y no se fuerza), el trabajo termina sin reentrenar.
+        incremental: ajustar solo las franjas nuevas o modificadas
+        por_categoria: entrenar también un modelo por categoría (en paralelo)
+        hiperparametros: los del candidato elegido en una búsqueda
+        Retorna: (exito, mensaje, id_trabajo)
+        """
+        with self._lock:
+            activo = self.trabajo_activo()
+            if activo is not None:
+                return False, "Ya hay un entrenamiento en curso", activo["id"]
+
+            id_trabajo = datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
+            estado = {
+                "id": id_trabajo,
+                "tipo": TIPO_ENTRENAMIENTO,
+                "estado": ESTADO_PENDIENTE,
+                "fase": None,
+                "progreso": 0.0,
+                "motor": motor,
+                "forzar": forzar,
+                "incremental": incremental,
+                "por_categoria": por_categoria,
+                "hiperparametros": hiperparametros,
+                "usuario": usuario,
+                "registros": len(df),
+                "creado": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "pid_gestor": os.getpid(),
+                "mensaje": "En cola",
+            }
+            return self._encolar(estado, (
+                _ejecutar_trabajo, id_trabajo, df, motor, self.model_path, self.directorio, forzar, incremental,
+                por_categoria, hiperparametros
+            ), "Entrenamiento lanzado en segundo plano")
+
+    def lanzar_busqueda(self, df, presupuesto_s, n_candidatos, usuario=None):
+        """
+        Encola una búsqueda de hiperparámetros con presupuesto de tiempo. Ocupa
+        el mismo hueco que un entrenamiento: no se ejecutan a la vez.
+        Retorna: (exito, mensaje, id_trabajo)
+        """
+        with self._lock:
+            activo = self.trabajo_activo()
+            if activo is not None:
+                return False, "Ya hay un entrenamiento en curso", activo["id"]
+
+            id_trabajo = datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
+            estado = {
+                "id": id_trabajo,
+                "tipo": TIPO_BUSQUEDA,
+                "estado": ESTADO_PENDIENTE,
+                "fase": None,
+                "progreso": 0.0,
+                "motor": "búsqueda de hiperparámetros",
+                "presupuesto_s": presupuesto_s,
+                "n_candidatos": n_candidatos,
+                "usuario": usuario,
+                "registros": len(df),
+                "creado": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "pid_gestor": os.getpid(),
+                "mensaje": "En cola",
+            }
+            return self._encolar(estado, (
+                _ejecutar_busqueda, id_trabajo, df, self.model_path, self.directorio, presupuesto_s, n_candidatos
+            ), "Búsqueda de hiperparámetros lanzada en segundo plano")
+
+    def _encolar(self, estado, tarea, mensaje):
+        id_trabajo = estado["id"]
+        _escribir_estado(self.directorio, estado)
+
+        try:
+            futuro = self._obtener_executor().submit(*tarea)
+        except Exception as e:
+            estado.update({"estado": ESTADO_FALLIDO, "mensaje": f"No se pudo lanzar el trabajo: {e}"})
+            _escribir_estado(self.directorio, estado)
+            return False, estado["mensaje"], id_trabajo
+
+        self._futuros[id_trabajo] = futuro
+        futuro.add_done_callback(lambda f, id_trabajo=id_trabajo: self._al_terminar(id_trabajo, f))
+        self._limpiar_antiguos()
+        return True, mensaje, id_trabajo
+
+    def _al_terminar(self, id_trabajo, futuro):
+        self._futuros.pop(id_trabajo, None)
+        if futuro.cancelled():
+            return
+
+        error = futuro.exception()
+        if error is not None:
+            # El proceso murió o no pudo ejecutar el trabajo
+            estado = _leer_estado(self.directorio, id_trabajo) or {"id": id_trabajo}
+            if estado.get("estado") in ESTADOS_ACTIVOS:
+                estado.update({"estado": ESTADO_FALLIDO, "mensaje": f"Error en el proceso de entrenamiento: {error}"})
+                _escribir_estado(self.directorio, estado)
+        else:
+            # Sustituir el predictor global por el recién entrenado
+            exito, _ = futuro.result()
+            if exito:
+                obtener_predictor()
+
+        # Guardados llegados mientras se entrenaba: el trabajo leyó el CSV antes
+        self.lanzar_actualizacion_pendiente()
+
+    def marcar_actualizacion_pendiente(self, usuario=None):
+        """Pide una actualización incremental para cuando termine el trabajo en curso"""
+        tmp = f"{_ruta_pendiente(self.directorio)}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(usuario or "")
+        os.replace(tmp, _ruta_pendiente(self.directorio))
+
+    def lanzar_actualizacion_pendiente(self):
+        """
+        Si hay una actualización pendiente y ningún trabajo activo, la lanza
+        con el CSV actual. La marca la consume un solo proceso (os.remove).
+        Retorna: (lanzado, mensaje)
+        """
+        ruta = _ruta_pendiente(self.directorio)
+        if not os.path.exists(ruta) or self.trabajo_activo() is not None:
+            return False, "Sin actualización pendiente"
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                usuario = f.read().strip() or None
+            os.remove(ruta)
+        except OSError:
+            # Otro proceso la ha recogido
+            return False, "Sin actualización pendiente"
+        return actualizar_modelo_tras_guardado(usuario=usuario)
+
+    def estado(self, id_trabajo):
+        return _leer_estado(self.directorio, id_trabajo)
+
+    def cancelar(self, id_trabajo):
+        """
+        Solicita la cancelación. El trabajo la atiende en el siguiente cambio
+        de fase; si está ajustando el modelo, el resultado se descarta.
+        """
+        estado = self.estado(id_trabajo)
+        if estado is None:
+            return False, "Trabajo no encontrado"
+        if estado.get("estado") not in ESTADOS_ACTIVOS:
+            return False, f"El trabajo ya está {estado.get('estado')}"
+
+        futuro = self._futuros.get(id_trabajo)
+        if futuro is not None and futuro.cancel():
+            # Aún no había empezado
+            estado.update({"estado": ESTADO_CANCELADO, "mensaje": MENSAJE_CANCELADO})
+            _escribir_estado(self.directorio, estado)
+            return True, "Entrenamiento cancelado"
+
+        with open(_ruta_cancelacion(self.directorio, id_trabajo), "w", encoding="utf-8") as f:
+            f.write(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        return True, "Cancelación solicitada"
+
+    def trabajo_activo(self):
+        for estado in self.listar_trabajos(limite=None):
+            if estado.get("estado") in ESTADOS_ACTIVOS:
+                return estado
+        return None
+
+    def listar_trabajos(self, limite=10):
+        """Trabajos más recientes primero"""
+        try:
+            nombres = sorted(
+                (n for n in os.listdir(self.directorio) if n.endswith(".json")), reverse=True
+            )
+        except OSError:
+            return []
+        if limite is not None:
+            nombres = nombres[:limite]
+        estados = [_leer_estado(self.directorio, n[:-len(".json")]) for n in nombres]
+        return [e for e in estados if e]
+
+    def _limpiar_antiguos(self):
+        for estado in self.listar_trabajos(limite=None)[MAX_TRABAJOS_CONSERVADOS:]:
+            if estado.get("estado") not in ESTADOS_ACTIVOS:
+                try:
+                    os.remove(_ruta_estado(self.directorio, estado["id"]))
+                except OSError:
+                    pass
+
+    def cerrar(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Instancia compartida por todas las sesiones
+gestor_global = None
+_lock_gestor = threading.Lock()
+
+
+def obtener_gestor_entrenamiento():
+    """Devuelve el gestor de entrenamientos del proceso"""
+    global gestor_global
+    with _lock_gestor:
+        if gestor_global is None:
+            gestor_global = GestorEntrenamiento()
+            atexit.register(gestor_global.cerrar)
+        return gestor_global
+
+
+def actualizar_modelo_tras_guardado(usuario=None, ruta_csv=PLANIFICACION_CSV):
+    """
+    Tras guardar planificación, lanza un entrenamiento incremental en segundo
+    plano para que las sugerencias incorporen el microciclo guardado.
+    No hace nada si no hay modelo entrenado; si ya hay un entrenamiento en
+    curso, deja la actualización pendiente y se lanza cuando éste termina.
+    Retorna: (lanzado, mensaje)
+    """
+    try:
+        predictor = obtener_predictor()
+        if not predictor.is_trained:
+            return False, "No hay un modelo entrenado que actualizar"
+
+        gestor = obtener_gestor_entrenamiento()
+        if gestor.trabajo_activo() is not None:
+            # El trabajo en curso no ve este guardado: se repite al terminar
+            gestor.marcar_actualizacion_pendiente(usuario)
+            if gestor.trabajo_activo() is None:
+                # Terminó entre medias, sin llegar a ver la marca
+                return gestor.lanzar_actualizacion_pendiente()
+            return False, MENSAJE_ACTUALIZACION_PENDIENTE
+
+        if not os.path.exists(ruta_csv):
+            return False, "No existe el archivo de planificación"
+        df = pd.read_csv(ruta_csv)
+
+        exito, mensaje, _ = gestor.lanzar(
+            df, motor=predictor.stats.get('motor', MOTOR_POR_DEFECTO), usuario=usuario, incremental=True
+        )
+        return exito, mensaje
+    except Exception as e:
+        return False, f"No se pudo actualizar el modelo: {e}"
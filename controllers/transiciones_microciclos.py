@@ -0,0 +1,360 @@
+# controllers/transiciones_microciclos.py
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from controllers.cache_ficheros import INDICES_DIR, CacheFicheros, huella_filas
+from controllers.modelo_prediccion import DIAS_SEMANA, BLOQUES_SESION
+from controllers.planificador import normalize_for_matching
+
+# Configuración
+MICROCICLOS_CSV = "data/microciclos.csv"
+INDICE_TRANSICIONES = os.path.join(INDICES_DIR, "transiciones_microciclos.npz")
+# Semanas más separadas que esto (p. ej. entre temporadas) no son consecutivas
+MAX_DIAS_ENTRE_MICROCICLOS = 14
+# Probabilidad mínima para sugerir un principio (la misma que el predictor)
+UMBRAL_SUGERENCIA = 0.05
+
+COLUMNAS_SEMANA = ['id_temporada', 'categoria', 'nombre_microciclo']
+COLUMNAS_TRANSICIONES = COLUMNAS_SEMANA + ['dia', 'bloque', 'principio']
+FRANJAS = [(dia, bloque) for dia in DIAS_SEMANA for bloque in BLOQUES_SESION]
+
+# scipy.sparse se importa dentro de las funciones que lo usan (ver
+# indice_similitud.py)
+
+
+def _normalizar(serie):
+    """normalize_for_matching por valor distinto (no por fila)"""
+    unicos = serie.dropna().unique()
+    return serie.map(dict(zip(unicos, map(normalize_for_matching, unicos))))
+
+
+def clave_semana(id_temporada, categoria, nombre_microciclo):
+    """Clave de una semana, la misma con la que se cruzan planificación y calendario"""
+    return "|".join(normalize_for_matching(v) for v in (id_temporada, categoria, nombre_microciclo))
+
+
+def _claves_semana(df):
+    claves = [_normalizar(df[c]) for c in COLUMNAS_SEMANA]
+    return claves[0] + "|" + claves[1] + "|" + claves[2], claves[1]
+
+
+def _leer_calendario(ruta):
+    """(DataFrame semana → fecha_inicio, huella) del calendario; vacío si no se puede leer"""
+    calendario = pd.DataFrame(columns=COLUMNAS_SEMANA + ['fecha_inicio'])
+    try:
+        calendario = pd.read_csv(ruta)
+        calendario.columns = calendario.columns.astype(str).str.strip().str.lower()
+    except (OSError, ValueError):
+        pass
+    if any(c not in calendario.columns for c in COLUMNAS_SEMANA + ['fecha_inicio']):
+        calendario = pd.DataFrame(columns=COLUMNAS_SEMANA + ['fecha_inicio'])
+
+    huella = huella_filas(calendario, COLUMNAS_SEMANA + ['fecha_inicio']) or ""
+    semana, _ = _claves_semana(calendario)
+    fechas = pd.DataFrame({
+        'semana': semana,
+        'fecha_inicio': pd.to_datetime(calendario['fecha_inicio'], errors='coerce'),
+    }).dropna().drop_duplicates('semana')
+    return fechas.reset_index(drop=True), huella
+
+
+# Calendario (data/microciclos.csv) compartido por todas las sesiones
+_cache_calendario = CacheFicheros(_leer_calendario)
+
+
+def cargar_calendario(ruta=MICROCICLOS_CSV):
+    """
+    Fecha de inicio de cada semana del calendario, recargada solo si el
+    fichero cambia. Retorna: (DataFrame semana → fecha_inicio, huella)
+    """
+    with _cache_calendario.lock:
+        return _cache_calendario.obtener(ruta)
+
+
+def huella_transiciones(df, huella_calendario):
+    """Huella de la planificación (columnas de COLUMNAS_TRANSICIONES) y del calendario"""
+    huella = huella_filas(df, COLUMNAS_TRANSICIONES)
+    return None if huella is None else f"{huella}|{huella_calendario}"
+
+
+def _filas(df):
+    """(semana, categoria, franja, principio) únicos de la planificación"""
+    if df is None or df.empty or any(c not in df.columns for c in COLUMNAS_TRANSICIONES):
+        return pd.DataFrame({
+            'semana': pd.Series(dtype=object), 'categoria': pd.Series(dtype=object),
+            'franja': pd.Series(dtype=np.int64), 'principio': pd.Series(dtype=object),
+        })
+    datos = df[COLUMNAS_TRANSICIONES].dropna()
+    semana, categoria = _claves_semana(datos)
+    # FRANJAS recorre días × bloques: índice = dia * n_bloques + bloque
+    dia = datos['dia'].astype(str).str.strip().map({d: i for i, d in enumerate(DIAS_SEMANA)})
+    bloque = datos['bloque'].astype(str).str.strip().map({b: i for i, b in enumerate(BLOQUES_SESION)})
+    filas = pd.DataFrame({
+        'semana': semana,
+        'categoria': categoria,
+        'franja': dia * len(BLOQUES_SESION) + bloque,
+        'principio': datos['principio'].astype(str).str.strip(),
+    }).dropna()
+    filas = filas[filas['principio'] != '']
+    return filas.astype({'franja': np.int64}).drop_duplicates()
+
+
+def principios_de_semana(df, id_temporada, categoria, nombre_microciclo):
+    """Principios planificados en una semana: {(dia, bloque): [principios]}"""
+    filas = _filas(df)
+    filas = filas[filas['semana'] == clave_semana(id_temporada, categoria, nombre_microciclo)]
+    return {FRANJAS[f]: grupo['principio'].tolist() for f, grupo in filas.groupby('franja')}
+
+
+def pares_consecutivos(filas, fechas):
+    """
+    Pares (anterior, siguiente) de semanas planificadas consecutivas de una
+    misma categoría, en el orden de fecha_inicio del calendario. Las semanas
+    que no están en el calendario no entran en ninguna secuencia.
+    """
+    semanas = filas[['semana', 'categoria']].drop_duplicates('semana').merge(fechas, on='semana')
+    semanas = semanas.sort_values(['categoria', 'fecha_inicio'], kind='stable')
+
+    siguiente = semanas.shift(-1)
+    consecutivas = (
+        (siguiente['categoria'] == semanas['categoria'])
+        & ((siguiente['fecha_inicio'] - semanas['fecha_inicio']).dt.days.between(1, MAX_DIAS_ENTRE_MICROCICLOS))
+    )
+    return pd.DataFrame({
+        'anterior': semanas.loc[consecutivas, 'semana'].to_numpy(dtype=object),
+        'siguiente': siguiente.loc[consecutivas, 'semana'].to_numpy(dtype=object),
+    })
+
+
+def contar(filas, pares):
+    """
+    Transiciones de los pares indicados:
+        transiciones   DataFrame franja, origen, destino, n: pares en los que
+                       origen estaba en la franja de la semana anterior y
+                       destino en la misma franja de la siguiente
+        origenes       DataFrame franja, origen, n: pares en los que origen
+                       estaba en la franja de la semana anterior
+    """
+    antes = pares.merge(
+        filas[['semana', 'franja', 'principio']].rename(columns={'semana': 'anterior', 'principio': 'origen'}),
+        on='anterior',
+    )
+    despues = antes.merge(
+        filas[['semana', 'franja', 'principio']].rename(columns={'semana': 'siguiente', 'principio': 'destino'}),
+        on=['siguiente', 'franja'],
+    )
+    transiciones = despues.value_counts(['franja', 'origen', 'destino'], sort=False).rename('n').reset_index()
+    origenes = antes.value_counts(['franja', 'origen'], sort=False).rename('n').reset_index()
+    return transiciones, origenes
+
+
+class IndiceTransiciones:
+    """
+    Índice de transiciones entre semanas consecutivas de una misma categoría
+    (cadena de Markov de primer orden por franja dia/bloque):
+        transiciones   DataFrame franja, origen, destino, n (solo n > 0)
+        origenes       DataFrame franja, origen, n
+        huella         huella_transiciones() de los datos con los que corresponde
+    P(destino la semana siguiente | origen esta semana, franja) = n / n_origen.
+    Con esas probabilidades se monta una matriz dispersa diagonal por bloques
+    (un bloque principios × principios por franja), así que sugerir la semana
+    siguiente es un único producto vector disperso × matriz.
+    """
+
+    def __init__(self, transiciones, origenes, huella=None):
+        self.transiciones = transiciones[transiciones['n'] > 0].reset_index(drop=True)
+        self.origenes = origenes[origenes['n'] > 0].reset_index(drop=True)
+        self.huella = huella
+        self._matriz = None
+
+    @classmethod
+    def desde_dataframe(cls, df, fechas, huella=None):
+        filas = _filas(df)
+        return cls(*contar(filas, pares_consecutivos(filas, fechas)), huella)
+
+    def aplicar(self, eliminadas, nuevas, huella=None):
+        """Índice nuevo tras restar unas cuentas (transiciones, origenes) y sumar otras"""
+        def combinar(actual, menos, mas, columnas):
+            menos = menos.assign(n=-menos['n'])
+            return (
+                pd.concat([actual, menos, mas], ignore_index=True)
+                .groupby(columnas, sort=False)['n'].sum().reset_index()
+            )
+
+        return IndiceTransiciones(
+            combinar(self.transiciones, eliminadas[0], nuevas[0], ['franja', 'origen', 'destino']),
+            combinar(self.origenes, eliminadas[1], nuevas[1], ['franja', 'origen']),
+            huella,
+        )
+
+    @property
+    def n_transiciones(self):
+        return int(self.transiciones['n'].sum())
+
+    def _matriz_probabilidades(self):
+        """
+        (principios, CSR (n_franjas·n_principios)²): fila franja·n + origen,
+        columna franja·n + destino, valor P(destino | origen, franja)
+        """
+        from scipy import sparse
+
+        if self._matriz is not None:
+            return self._matriz
+
+        principios = sorted(set(self.transiciones['origen']) | set(self.origenes['origen']) | set(self.transiciones['destino']))
+        ids = {p: i for i, p in enumerate(principios)}
+        n = len(principios)
+
+        totales = self.origenes.set_index(['franja', 'origen'])['n']
+        claves = pd.MultiIndex.from_frame(self.transiciones[['franja', 'origen']])
+        probabilidades = self.transiciones['n'].to_numpy(dtype=np.float64) / totales.reindex(claves).to_numpy(dtype=np.float64)
+
+        franja = self.transiciones['franja'].to_numpy(dtype=np.int64)
+        filas = franja * n + self.transiciones['origen'].map(ids).to_numpy(dtype=np.int64)
+        columnas = franja * n + self.transiciones['destino'].map(ids).to_numpy(dtype=np.int64)
+        forma = (len(FRANJAS) * n, len(FRANJAS) * n)
+        self._matriz = (principios, sparse.csr_matrix((probabilidades, (filas, columnas)), shape=forma))
+        return self._matriz
+
+    def sugerir(self, principios_por_franja, n_sugerencias=5):
+        """
+        Principios probables la semana siguiente en cada franja, dados los de
+        esta semana: {(dia, bloque): [principios]}. La puntuación de cada
+        destino es la media de P(destino | origen) sobre los orígenes de la franja.
+        Retorna: {(dia, bloque): [(principio, probabilidad)]} de mayor a menor,
+        con todas las franjas (vacías si no hay sugerencia)
+        """
+        from scipy import sparse
+
+        principios, matriz = self._matriz_probabilidades()
+        ids = {p: i for i, p in enumerate(principios)}
+        n = len(principios)
+        resultado = {franja: [] for franja in FRANJAS}
+        if n == 0:
+            return resultado
+
+        columnas, valores = [], []
+        for (dia, bloque), actuales in principios_por_franja.items():
+            if (dia, bloque) not in resultado:
+                continue
+            conocidos = sorted({ids[p] for p in map(str, actuales) if p in ids})
+            franja = FRANJAS.index((dia, bloque))
+            columnas += [franja * n + i for i in conocidos]
+            valores += [1.0 / len(conocidos)] * len(conocidos)
+        if not columnas:
+            return resultado
+
+        consulta = sparse.csr_matrix(
+            (valores, (np.zeros(len(columnas), dtype=np.int64), columnas)), shape=(1, matriz.shape[0])
+        )
+        puntuaciones = (consulta @ matriz).toarray().reshape(len(FRANJAS), n)
+
+        k = min(int(n_sugerencias), n)
+        if k <= 0:
+            return resultado
+        mejores = np.argpartition(-puntuaciones, k - 1, axis=1)[:, :k]
+        for f in np.flatnonzero(puntuaciones.max(axis=1) >= UMBRAL_SUGERENCIA):
+            orden = mejores[f][np.argsort(-puntuaciones[f, mejores[f]], kind='stable')]
+            resultado[FRANJAS[f]] = [
+                (principios[i], float(puntuaciones[f, i])) for i in orden if puntuaciones[f, i] >= UMBRAL_SUGERENCIA
+            ]
+        return resultado
+
+    def guardar(self, ruta=INDICE_TRANSICIONES):
+        """Escritura atómica (fichero temporal + os.replace)"""
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f,
+                franja=self.transiciones['franja'].to_numpy(dtype=np.int64),
+                origen=self.transiciones['origen'].to_numpy(dtype=str),
+                destino=self.transiciones['destino'].to_numpy(dtype=str),
+                n=self.transiciones['n'].to_numpy(dtype=np.int64),
+                franja_origen=self.origenes['franja'].to_numpy(dtype=np.int64),
+                origen_total=self.origenes['origen'].to_numpy(dtype=str),
+                n_origen=self.origenes['n'].to_numpy(dtype=np.int64),
+                huella=np.asarray(self.huella or "", dtype=str),
+            )
+        os.replace(tmp, ruta)
+
+    @classmethod
+    def cargar(cls, ruta=INDICE_TRANSICIONES):
+        """Carga un índice guardado; None si no existe o no se puede leer"""
+        try:
+            with np.load(ruta) as datos:
+                transiciones = pd.DataFrame({
+                    'franja': datos['franja'], 'origen': datos['origen'].astype(object),
+                    'destino': datos['destino'].astype(object), 'n': datos['n'],
+                })
+                origenes = pd.DataFrame({
+                    'franja': datos['franja_origen'], 'origen': datos['origen_total'].astype(object),
+                    'n': datos['n_origen'],
+                })
+                return cls(transiciones, origenes, str(datos['huella']) or None)
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+# Caché del índice compartida por todas las sesiones
+_cache_indice = CacheFicheros(IndiceTransiciones.cargar)
+
+
+def obtener_indice_transiciones(df, ruta=INDICE_TRANSICIONES, ruta_calendario=MICROCICLOS_CSV):
+    """
+    Índice correspondiente a df y al calendario: el guardado si su huella
+    coincide; si no, se reconstruye y se guarda.
+    """
+    fechas, huella_calendario = cargar_calendario(ruta_calendario)
+    huella = huella_transiciones(df, huella_calendario)
+    with _cache_indice.lock:
+        indice = _cache_indice.obtener(ruta)
+        if indice is None or indice.huella != huella:
+            indice = IndiceTransiciones.desde_dataframe(df, fechas, huella)
+            _cache_indice.publicar(indice, ruta)
+        return indice
+
+
+def actualizar_transiciones_tras_guardado(df_anterior, df_nuevo, semanas, ruta=INDICE_TRANSICIONES,
+                                          ruta_calendario=MICROCICLOS_CSV):
+    """
+    Actualiza el índice tras guardar planificación de las semanas indicadas
+    (id_temporada, categoria, nombre_microciclo). Si correspondía a los datos
+    anteriores, solo se recuentan los pares de las categorías tocadas que
+    han cambiado: los que incluyen una semana editada y los que aparecen o
+    desaparecen en la secuencia (al planificar una semana nueva entre otras
+    dos, o al vaciar una). Si no, se reconstruye con los datos nuevos.
+    """
+    fechas, huella_calendario = cargar_calendario(ruta_calendario)
+    with _cache_indice.lock:
+        indice = _cache_indice.obtener(ruta)
+        huella_nueva = huella_transiciones(df_nuevo, huella_calendario)
+        if indice is None or indice.huella != huella_transiciones(df_anterior, huella_calendario):
+            indice = IndiceTransiciones.desde_dataframe(df_nuevo, fechas, huella_nueva)
+            _cache_indice.publicar(indice, ruta)
+            return indice
+
+        editadas = {clave_semana(*s) for s in semanas}
+        categorias = {s.split("|")[1] for s in editadas}
+        filas_anteriores = _filas(df_anterior)
+        filas_anteriores = filas_anteriores[filas_anteriores['categoria'].isin(categorias)]
+        filas_nuevas = _filas(df_nuevo)
+        filas_nuevas = filas_nuevas[filas_nuevas['categoria'].isin(categorias)]
+
+        def cambiados(pares, otros):
+            claves = pd.MultiIndex.from_frame(pares)
+            tocados = pares['anterior'].isin(editadas) | pares['siguiente'].isin(editadas)
+            return pares[tocados | ~claves.isin(pd.MultiIndex.from_frame(otros))]
+
+        pares_anteriores = pares_consecutivos(filas_anteriores, fechas)
+        pares_nuevos = pares_consecutivos(filas_nuevas, fechas)
+        indice = indice.aplicar(
+            contar(filas_anteriores, cambiados(pares_anteriores, pares_nuevos)),
+            contar(filas_nuevas, cambiados(pares_nuevos, pares_anteriores)),
+            huella_nueva,
+        )
+        _cache_indice.publicar(indice, ruta)
+        return indice
@@ -0,0 +1,393 @@
+# controllers/vecinos_microciclos.py
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from controllers.cache_ficheros import INDICES_DIR, CacheFicheros, huella_filas
+from controllers.indice_similitud import matriz_normalizada
+
+# Configuración
+PLANIFICACION_CSV = "data/planificacion_microciclos.csv"
+TABLA_VECINOS = os.path.join(INDICES_DIR, "vecinos_microciclos.npz")
+K_VECINOS = 10
+# Tamaño máximo (filas × microciclos) de cada bloque denso de similitudes
+ELEMENTOS_POR_BLOQUE = 4_000_000
+# Con más cambios que esta fracción de la tabla se recalcula entera
+FRACCION_MAX_INCREMENTAL = 0.25
+
+COLUMNAS_UNIDAD = ['id_temporada', 'categoria', 'nombre_microciclo']
+COLUMNAS_TABLA = COLUMNAS_UNIDAD + ['principio']
+
+# Ámbitos de búsqueda
+AMBITO_GLOBAL = "global"
+AMBITO_CATEGORIA = "categoria"
+AMBITOS = (AMBITO_GLOBAL, AMBITO_CATEGORIA)
+
+
+def _datos_unidades(df):
+    """Filas (id_temporada, categoria, nombre_microciclo, principio) únicas, como texto"""
+    if df is None or df.empty or any(c not in df.columns for c in COLUMNAS_TABLA):
+        return pd.DataFrame(columns=COLUMNAS_TABLA)
+    return df[COLUMNAS_TABLA].dropna().astype(str).drop_duplicates()
+
+
+def _top_k(similitudes, k, indices=None):
+    """
+    Los k mayores de cada fila, ordenados de mayor a menor.
+    indices: índice de unidad de cada columna (por defecto, la propia columna)
+    Las posiciones sin candidato (similitud -inf) quedan como -1.
+    """
+    n_filas, n_columnas = similitudes.shape
+    vecinos = np.full((n_filas, k), -1, dtype=np.int32)
+    valores = np.zeros((n_filas, k), dtype=np.float32)
+    kk = min(k, n_columnas)
+    if kk == 0 or n_filas == 0:
+        return vecinos, valores
+
+    posiciones = np.argpartition(-similitudes, kk - 1, axis=1)[:, :kk]
+    mejores = np.take_along_axis(similitudes, posiciones, axis=1)
+    orden = np.argsort(-mejores, axis=1, kind='stable')
+    posiciones = np.take_along_axis(posiciones, orden, axis=1)
+    mejores = np.take_along_axis(mejores, orden, axis=1)
+
+    seleccion = posiciones if indices is None else np.take_along_axis(indices, posiciones, axis=1)
+    validos = np.isfinite(mejores)
+    vecinos[:, :kk] = np.where(validos, seleccion, -1)
+    valores[:, :kk] = np.where(validos, mejores, 0)
+    return vecinos, valores
+
+
+class TablaVecinos:
+    """
+    Tabla precalculada con los k microciclos más parecidos a cada microciclo
+    de cada categoría. La unidad es (temporada, categoría, microciclo):
+    "Semana 1" de Juvenil A y de Alevín B, o de Juvenil A en dos temporadas,
+    son unidades distintas.
+        temporadas, categorias, microciclos   unidad de cada fila
+        matriz                    CSR (unidades × principios), filas con norma L2 = 1
+        vecinos[ambito]           (n, k) int32 índices de unidad, de más a menos parecida; -1 = hueco
+        similitud[ambito]         (n, k) float32 similitud coseno
+    ambito: AMBITO_GLOBAL (todas las categorías) o AMBITO_CATEGORIA (solo la
+    misma categoría, de cualquier temporada)
+    Consultar es un acceso por diccionario y un corte de k elementos: O(1).
+    """
+
+    def __init__(self, temporadas, categorias, microciclos, principios, matriz, vecinos, similitud, k=K_VECINOS, huella=None):
+        self.temporadas = list(temporadas)
+        self.categorias = list(categorias)
+        self.microciclos = list(microciclos)
+        self.principios = list(principios)
+        self.matriz = matriz.tocsr()
+        self.vecinos = vecinos
+        self.similitud = similitud
+        self.k = int(k)
+        self.huella = huella
+        self._indexar()
+
+    def _indexar(self):
+        self.filas = {u: i for i, u in enumerate(zip(self.temporadas, self.categorias, self.microciclos))}
+        self.columnas = {p: i for i, p in enumerate(self.principios)}
+        codigos, _ = pd.factorize(pd.Series(self.categorias, dtype=object))
+        self.codigos_categoria = codigos.astype(np.int32)
+
+    def copia(self):
+        """Copia independiente (para actualizar sin afectar a quien está leyendo)"""
+        return TablaVecinos(
+            self.temporadas, self.categorias, self.microciclos, self.principios, self.matriz.copy(),
+            {a: v.copy() for a, v in self.vecinos.items()}, {a: v.copy() for a, v in self.similitud.items()},
+            self.k, self.huella,
+        )
+
+    @property
+    def n_unidades(self):
+        return len(self.categorias)
+
+    @classmethod
+    def calcular(cls, df, k=K_VECINOS):
+        """Tabla completa a partir de un histórico"""
+        datos = _datos_unidades(df)
+        grupos = datos.groupby(COLUMNAS_UNIDAD, sort=True)
+        filas = grupos.ngroup().to_numpy()
+        unidades = list(grupos.size().index)
+        columnas, principios = pd.factorize(datos['principio'], sort=True)
+
+        matriz = matriz_normalizada(filas, columnas, (len(unidades), len(principios)))
+        vacios = {a: np.full((len(unidades), k), -1, dtype=np.int32) for a in AMBITOS}
+        tabla = cls(
+            [u[0] for u in unidades], [u[1] for u in unidades], [u[2] for u in unidades], principios, matriz,
+            vacios, {a: np.zeros((len(unidades), k), dtype=np.float32) for a in AMBITOS},
+            k, huella_filas(df, COLUMNAS_TABLA),
+        )
+        tabla._calcular_filas(np.arange(tabla.n_unidades))
+        return tabla
+
+    def _calcular_filas(self, filas):
+        """
+        Vecinos de las filas indicadas contra todas las unidades, por bloques
+        de filas para que la matriz densa de similitudes no pase de
+        ELEMENTOS_POR_BLOQUE.
+        """
+        n = self.n_unidades
+        if len(filas) == 0 or n == 0:
+            return
+        traspuesta = self.matriz.T.tocsc()
+        por_bloque = max(1, ELEMENTOS_POR_BLOQUE // n)
+
+        for inicio in range(0, len(filas), por_bloque):
+            bloque = np.asarray(filas[inicio:inicio + por_bloque])
+            similitudes = (self.matriz[bloque] @ traspuesta).toarray().astype(np.float32)
+            similitudes[np.arange(len(bloque)), bloque] = -np.inf
+
+            self.vecinos[AMBITO_GLOBAL][bloque], self.similitud[AMBITO_GLOBAL][bloque] = _top_k(similitudes, self.k)
+
+            otra_categoria = self.codigos_categoria[bloque][:, None] != self.codigos_categoria[None, :]
+            similitudes[otra_categoria] = -np.inf
+            self.vecinos[AMBITO_CATEGORIA][bloque], self.similitud[AMBITO_CATEGORIA][bloque] = _top_k(similitudes, self.k)
+
+    def _fila_unidad(self, principios):
+        """Fila CSR normalizada de una unidad; añade columnas para principios nuevos"""
+        principios = sorted(set(principios))
+        for principio in principios:
+            if principio not in self.columnas:
+                self.columnas[principio] = len(self.principios)
+                self.principios.append(principio)
+        columnas = np.array([self.columnas[p] for p in principios], dtype=np.int64)
+        return matriz_normalizada(np.zeros(len(columnas), dtype=np.int64), columnas, (1, len(self.principios)))
+
+    def actualizar(self, df_nuevo, unidades):
+        """
+        Actualización incremental tras cambiar las unidades (id_temporada,
+        categoria, microciclo) indicadas:
+        - se rehacen sus filas de la matriz y se calculan sus vecinos
+        - las demás filas solo se recalculan si tenían como vecina una unidad
+          cambiada; el resto combina sus k vecinos actuales con las unidades
+          cambiadas (sus similitudes con las demás no han variado)
+        Retorna False si conviene recalcular la tabla entera (unidades
+        borradas o demasiados cambios).
+        """
+        from scipy import sparse
+
+        unidades = {(str(t), str(c), str(m)) for t, c, m in unidades}
+        if len(unidades) > max(1, FRACCION_MAX_INCREMENTAL * self.n_unidades):
+            return False
+
+        datos = _datos_unidades(df_nuevo)
+        claves = pd.MultiIndex.from_frame(datos[COLUMNAS_UNIDAD])
+        principios_por_unidad = datos[claves.isin(list(unidades))].groupby(COLUMNAS_UNIDAD)['principio'].apply(list).to_dict()
+        if any(u in self.filas and u not in principios_por_unidad for u in unidades):
+            return False
+
+        # Matriz: filas sustituidas y unidades nuevas al final
+        vectores = {u: self._fila_unidad(p) for u, p in principios_por_unidad.items()}
+        for vector in vectores.values():
+            vector.resize((1, len(self.principios)))
+        matriz = self.matriz.tolil()
+        matriz.resize((self.n_unidades, len(self.principios)))
+        nuevas = []
+        for unidad, vector in vectores.items():
+            if unidad in self.filas:
+                matriz[self.filas[unidad]] = vector
+            else:
+                nuevas.append(unidad)
+        self.matriz = sparse.vstack([matriz.tocsr()] + [vectores[u] for u in nuevas], format='csr')
+
+        if nuevas:
+            self.temporadas += [u[0] for u in nuevas]
+            self.categorias += [u[1] for u in nuevas]
+            self.microciclos += [u[2] for u in nuevas]
+            for ambito in AMBITOS:
+                self.vecinos[ambito] = np.vstack([self.vecinos[ambito], np.full((len(nuevas), self.k), -1, dtype=np.int32)])
+                self.similitud[ambito] = np.vstack([self.similitud[ambito], np.zeros((len(nuevas), self.k), dtype=np.float32)])
+            self._indexar()
+
+        cambiadas = np.array(sorted(self.filas[u] for u in vectores), dtype=np.int32)
+        if len(cambiadas) == 0:
+            return True
+
+        # Filas cuyos vecinos incluían una unidad cambiada: se recalculan
+        sucias = np.zeros(self.n_unidades, dtype=bool)
+        sucias[cambiadas] = True
+        for ambito in AMBITOS:
+            sucias |= np.isin(self.vecinos[ambito], cambiadas).any(axis=1)
+
+        # Resto: k vecinos actuales + unidades cambiadas
+        otras = np.flatnonzero(~sucias)
+        if len(otras):
+            nuevas_sim = (self.matriz[otras] @ self.matriz[cambiadas].T).toarray().astype(np.float32)
+            indices = np.hstack([
+                np.zeros((len(otras), self.k), dtype=np.int32),
+                np.broadcast_to(cambiadas, (len(otras), len(cambiadas))),
+            ])
+            otra_categoria = self.codigos_categoria[otras][:, None] != self.codigos_categoria[cambiadas][None, :]
+            for ambito in AMBITOS:
+                actuales = self.vecinos[ambito][otras]
+                indices[:, :self.k] = actuales
+                candidatas = np.hstack([
+                    np.where(actuales >= 0, self.similitud[ambito][otras], -np.inf),
+                    np.where(otra_categoria, -np.inf, nuevas_sim) if ambito == AMBITO_CATEGORIA else nuevas_sim,
+                ])
+                self.vecinos[ambito][otras], self.similitud[ambito][otras] = _top_k(candidatas, self.k, indices)
+
+        self._calcular_filas(np.flatnonzero(sucias))
+        return True
+
+    def vecinos_de(self, id_temporada, categoria, microciclo, ambito=AMBITO_CATEGORIA, n=None):
+        """
+        Microciclos más parecidos a (id_temporada, categoria, microciclo).
+        Retorna: [{'temporada', 'categoria', 'microciclo', 'similitud', 'porcentaje'}]
+        o None si la unidad no está en la tabla
+        """
+        fila = self.filas.get((str(id_temporada), str(categoria), str(microciclo)))
+        if fila is None:
+            return None
+        vecinos = self.vecinos[ambito][fila]
+        similitud = self.similitud[ambito][fila]
+        resultado = []
+        for indice, valor in zip(vecinos[:n], similitud[:n]):
+            if indice < 0:
+                break
+            resultado.append({
+                'temporada': self.temporadas[indice],
+                'categoria': self.categorias[indice],
+                'microciclo': self.microciclos[indice],
+                'similitud': float(valor),
+                'porcentaje': f"{valor*100:.1f}%"
+            })
+        return resultado
+
+    def guardar(self, ruta=TABLA_VECINOS):
+        """Escritura atómica (fichero temporal + os.replace)"""
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        arrays = {f"vecinos_{a}": self.vecinos[a] for a in AMBITOS}
+        arrays.update({f"similitud_{a}": self.similitud[a] for a in AMBITOS})
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f,
+                temporadas=np.asarray(self.temporadas, dtype=str),
+                categorias=np.asarray(self.categorias, dtype=str),
+                microciclos=np.asarray(self.microciclos, dtype=str),
+                principios=np.asarray(self.principios, dtype=str),
+                datos=self.matriz.data, indices=self.matriz.indices, indptr=self.matriz.indptr,
+                forma=np.asarray(self.matriz.shape, dtype=np.int64),
+                k=np.asarray(self.k), huella=np.asarray(self.huella or "", dtype=str),
+                **arrays,
+            )
+        os.replace(tmp, ruta)
+
+    @classmethod
+    def cargar(cls, ruta=TABLA_VECINOS):
+        """Carga una tabla guardada; None si no existe o no se puede leer"""
+        from scipy import sparse
+
+        try:
+            with np.load(ruta) as datos:
+                matriz = sparse.csr_matrix(
+                    (datos['datos'], datos['indices'], datos['indptr']), shape=tuple(datos['forma'])
+                )
+                return cls(
+                    datos['temporadas'].tolist(), datos['categorias'].tolist(), datos['microciclos'].tolist(), datos['principios'].tolist(), matriz,
+                    {a: datos[f"vecinos_{a}"] for a in AMBITOS}, {a: datos[f"similitud_{a}"] for a in AMBITOS},
+                    int(datos['k']), str(datos['huella']) or None,
+                )
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+# Caché de la tabla compartida por todas las sesiones; su lock protege
+# también el estado del cálculo en segundo plano
+_cache_tabla = CacheFicheros(TablaVecinos.cargar)
+
+# Cálculo en segundo plano: un solo hilo; si llegan datos nuevos mientras
+# calcula, al terminar vuelve a calcular con los últimos
+_df_pendiente = None
+_calculando = False
+
+
+def _bucle_calculo(ruta):
+    global _df_pendiente, _calculando
+    while True:
+        with _cache_tabla.lock:
+            df, _df_pendiente = _df_pendiente, None
+            if df is None:
+                _calculando = False
+                return
+        try:
+            tabla = TablaVecinos.calcular(df)
+        except Exception as e:
+            print(f"Error calculando la tabla de vecinos: {e}")
+            continue
+        with _cache_tabla.lock:
+            if _df_pendiente is None:
+                _cache_tabla.publicar(tabla, ruta)
+
+
+def calcular_en_segundo_plano(df, ruta=TABLA_VECINOS):
+    """
+    Recalcula la tabla entera en un hilo aparte.
+    Retorna True si se ha lanzado un cálculo nuevo, False si ya había uno
+    en curso (que recogerá estos datos al terminar).
+    """
+    global _df_pendiente, _calculando
+    with _cache_tabla.lock:
+        _df_pendiente = df
+        if _calculando:
+            return False
+        _calculando = True
+    threading.Thread(target=_bucle_calculo, args=(ruta,), daemon=True, name="vecinos-microciclos").start()
+    return True
+
+
+def calculo_en_curso():
+    with _cache_tabla.lock:
+        return _calculando
+
+
+def obtener_tabla_vecinos(df=None, ruta=TABLA_VECINOS):
+    """
+    Tabla de vecinos guardada. Si se pasa df y la tabla no le corresponde
+    (o no existe), se lanza el recálculo en segundo plano y se retorna None.
+    """
+    with _cache_tabla.lock:
+        tabla = _cache_tabla.obtener(ruta)
+    if df is not None and (tabla is None or tabla.huella != huella_filas(df, COLUMNAS_TABLA)):
+        calcular_en_segundo_plano(df, ruta)
+        return None
+    return tabla
+
+
+def actualizar_tabla_tras_guardado(df_anterior, df_nuevo, unidades, ruta=TABLA_VECINOS):
+    """
+    Mantiene la tabla al día tras guardar planificación: incremental si la
+    tabla correspondía a los datos anteriores; si no, recálculo completo en
+    segundo plano.
+    """
+    global _df_pendiente
+    with _cache_tabla.lock:
+        if _calculando:
+            # El cálculo en curso ya no vale: al terminar recalcula con estos datos
+            _df_pendiente = df_nuevo
+            return False
+        tabla = _cache_tabla.obtener(ruta)
+        if tabla is not None and tabla.huella == huella_filas(df_anterior, COLUMNAS_TABLA):
+            tabla = tabla.copia()
+            if tabla.actualizar(df_nuevo, unidades):
+                tabla.huella = huella_filas(df_nuevo, COLUMNAS_TABLA)
+                _cache_tabla.publicar(tabla, ruta)
+                return True
+    calcular_en_segundo_plano(df_nuevo, ruta)
+    return False
+
+
+if __name__ == "__main__":
+    # Cálculo fuera de línea: python -m controllers.vecinos_microciclos
+    import time
+
+    inicio = time.perf_counter()
+    tabla = TablaVecinos.calcular(pd.read_csv(PLANIFICACION_CSV))
+    tabla.guardar()
+    print(f"Tabla de vecinos: {tabla.n_unidades} microciclos, k={tabla.k}, "
+          f"{time.perf_counter() - inicio:.2f}s → {TABLA_VECINOS}")
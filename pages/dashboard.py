@@ -6,7 +6,7 @@ import os
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
-from controllers.proteccion import verificar_acceso, mostrar_info_usuario_sidebar, obtener_info_usuario, es_admin, es_entrenador
+from controllers.proteccion import verificar_acceso, mostrar_info_usuario_sidebar, obtener_info_usuario, es_admin, es_entrenador, categorias_asignadas
 from controllers.planificador import cargar_datos_csv
 from controllers.auth import listar_usuarios
 from fpdf import FPDF
@@ -182,8 +182,12 @@ if not df_planif.empty:
         # Si es entrenador, filtrar solo sus datos
         df_temporal = df_planif.copy()
         if es_entrenador() and not es_admin():
-            # Aquí podrías filtrar por el entrenador actual si tienes esa información
-            st.info("Mostrando datos de todas las categorías. En futuras versiones se filtrarán solo tus categorías asignadas.")
+            mis_categorias = categorias_asignadas()
+            if mis_categorias and 'categoria' in df_temporal.columns:
+                df_temporal = df_temporal[df_temporal['categoria'].isin(mis_categorias)]
+                st.info(f"Mostrando solo tus categorías asignadas: {', '.join(sorted(mis_categorias))}")
+            else:
+                st.info("No tienes categorías asignadas. Mostrando datos de todas las categorías.")
         
         # Actividad por día de la semana
         if 'dia' in df_temporal.columns:
@@ -309,7 +313,26 @@ if not df_planif.empty:
         
         else:  # Para entrenadores
             st.subheader("📋 Mis Datos")
-            st.info("Vista personalizada en desarrollo. Próximamente podrás ver solo tus categorías asignadas.")
+            
+            mis_categorias = sorted(categorias_asignadas())
+            if mis_categorias:
+                st.markdown("#### Mis Categorías")
+                if 'categoria' in df_planif.columns:
+                    df_mias = df_planif[df_planif['categoria'].isin(mis_categorias)]
+                    resumen_mias = pd.DataFrame({
+                        "Categoría": mis_categorias,
+                        "Registros": [int((df_mias['categoria'] == c).sum()) for c in mis_categorias],
+                        "Microciclos": [
+                            df_mias.loc[df_mias['categoria'] == c, 'nombre_microciclo'].nunique()
+                            if 'nombre_microciclo' in df_mias.columns else 0
+                            for c in mis_categorias
+                        ]
+                    })
+                    st.dataframe(resumen_mias, use_container_width=True, hide_index=True)
+                else:
+                    st.write(", ".join(mis_categorias))
+            else:
+                st.info("No figuras como entrenador asignado en ninguna categoría.")
             
             # Mostrar info personal
             st.markdown("#### Mi Información")
@@ -5,6 +5,8 @@ from controllers.editor_microciclo import mostrar_editor_microciclo
 from controllers.resumen_microciclo import mostrar_resumen_microciclo
 from controllers.editor_avanzado import mostrar_editor_avanzado
 from controllers.proteccion import verificar_acceso, mostrar_info_usuario_sidebar, es_admin, obtener_info_usuario
+from controllers.proteccion import puede_editar_staff as permiso_editar_staff
+from controllers.asignaciones import obtener_indice_asignaciones, invalidar_indice_asignaciones
 import datetime
 import os
 import unicodedata
@@ -201,18 +203,17 @@ with col3:
 # ACTUALIZAR CUERPO TÉCNICO SEGÚN CATEGORÍA
 # =====================
 # Ahora que tenemos la categoría, cargar los datos reales
-df_staff = pd.read_csv(staff_csv)
-fila_categoria = df_staff[df_staff["categoria"] == categoria_seleccionada]
+fila_categoria = obtener_indice_asignaciones().fila(categoria_seleccionada) or {}
 
-entrenador = fila_categoria["entrenador"].values[0] if not fila_categoria.empty else ""
-staff = fila_categoria["staff"].values[0] if not fila_categoria.empty else ""
-fecha_guardada = fila_categoria["fecha"].values[0] if not fila_categoria.empty else str(fecha_actual)
+entrenador = "" if pd.isna(fila_categoria.get("entrenador", "")) else fila_categoria.get("entrenador", "")
+staff = "" if pd.isna(fila_categoria.get("staff", "")) else fila_categoria.get("staff", "")
+fecha_guardada = fila_categoria.get("fecha", str(fecha_actual))
 
 # Combinar entrenador y staff en un solo campo
 cuerpo_tecnico_actual = f"{entrenador}\n{staff}" if entrenador or staff else ""
 
-# Verificar permisos para editar
-puede_editar_staff = es_admin() or (info_usuario['usuario'] == entrenador)
+# Verificar permisos para editar (admin o entrenador asignado a la categoría)
+puede_editar_staff = permiso_editar_staff(categoria_seleccionada)
 
 # Actualizar el campo de cuerpo técnico con los datos reales
 st.markdown("### 👥 Información del Cuerpo Técnico")
@@ -271,6 +272,7 @@ if hay_cambios_club or hay_cambios_staff:
                 
                 # Guardar cambios en staff
                 if hay_cambios_staff and puede_editar_staff:
+                    df_staff = pd.read_csv(staff_csv)
                     df_staff_nuevo = df_staff[df_staff["categoria"] != categoria_seleccionada]
                     nueva_fila = {
                         "categoria": categoria_seleccionada,
@@ -280,6 +282,7 @@ if hay_cambios_club or hay_cambios_staff:
                     }
                     df_staff_nuevo = pd.concat([df_staff_nuevo, pd.DataFrame([nueva_fila])], ignore_index=True)
                     df_staff_nuevo.to_csv(staff_csv, index=False)
+                    invalidar_indice_asignaciones()
                     cambios_realizados.append("✅ Datos del cuerpo técnico")
                 
                 if cambios_realizados:
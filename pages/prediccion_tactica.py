@@ -5,7 +5,11 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from controllers.proteccion import verificar_acceso, mostrar_info_usuario_sidebar, es_admin, obtener_info_usuario
-from controllers.modelo_prediccion import obtener_predictor, resetear_modelo_global
+from controllers.modelo_prediccion import obtener_predictor, resetear_modelo_global, MOTORES_DISPONIBLES, activar_version_modelo, DIAS_SEMANA, BLOQUES_SESION
+from controllers.trabajos_entrenamiento import obtener_gestor_entrenamiento, ESTADO_COMPLETADO, ESTADO_CANCELADO, TIPO_BUSQUEDA
+from controllers.busqueda_hiperparametros import PRESUPUESTO_S, N_CANDIDATOS, hiperparametros_de
+from controllers.vecinos_microciclos import obtener_tabla_vecinos, AMBITO_CATEGORIA, AMBITO_GLOBAL
+from controllers.bitsets_principios import obtener_conjuntos_principios
 import os
 from fpdf import FPDF
 import io
@@ -113,6 +117,10 @@ df_planif, error = cargar_datos_planificacion()
 # Obtener predictor
 predictor = obtener_predictor()
 
+# Entrenamientos en segundo plano
+gestor_entrenamiento = obtener_gestor_entrenamiento()
+trabajo_activo = gestor_entrenamiento.trabajo_activo()
+
 # =====================
 # MANEJO DE ERRORES INICIALES
 # =====================
@@ -199,20 +207,44 @@ with col3:
 
 with col4:
     if es_admin():
+        motor_entrenamiento = st.selectbox(
+            "Motor", MOTORES_DISPONIBLES, key="motor_entrenamiento",
+            help="nativo: un único bosque multi-etiqueta · multioutput: un bosque por principio"
+        )
+        forzar_entrenamiento = st.checkbox(
+            "Forzar reentrenamiento", key="forzar_entrenamiento",
+            help="Reentrenar aunque los datos no hayan cambiado desde la versión activa"
+        )
+        incremental_entrenamiento = st.checkbox(
+            "Solo cambios (incremental)", key="incremental_entrenamiento",
+            disabled=not predictor.is_trained or forzar_entrenamiento,
+            help="Añade al modelo activo las franjas nuevas o modificadas sin reentrenar todo el histórico"
+        )
+        por_categoria_entrenamiento = st.checkbox(
+            "Un modelo por categoría", key="por_categoria_entrenamiento",
+            value=bool(predictor.stats.get('por_categoria')),
+            disabled=incremental_entrenamiento and predictor.is_trained and not forzar_entrenamiento,
+            help="Entrena en paralelo un modelo ligero para cada categoría con datos suficientes; "
+                 "el resto usa el modelo global. Al guardar solo se reentrena el de la categoría editada"
+        )
         col_btn1, col_btn2 = st.columns(2)
         
         with col_btn1:
-            # Botón de entrenamiento
-            entrenar_disabled = not datos_validos
+            # Botón de entrenamiento (se ejecuta en segundo plano)
+            entrenar_disabled = not datos_validos or trabajo_activo is not None
             if st.button("🔄 Entrenar", type="primary", disabled=entrenar_disabled, use_container_width=True, key="train_model_btn"):
-                with st.spinner("Entrenando modelo..."):
-                    exito, mensaje = predictor.entrenar_modelo(df_planif)
-                    if exito:
-                        st.success(mensaje)
-                        st.balloons()
-                        st.rerun()
-                    else:
-                        st.error(mensaje)
+                info_usuario = obtener_info_usuario() or {}
+                exito, mensaje, id_trabajo = gestor_entrenamiento.lanzar(
+                    df_planif, motor=motor_entrenamiento, usuario=info_usuario.get('usuario'),
+                    forzar=forzar_entrenamiento,
+                    incremental=incremental_entrenamiento and predictor.is_trained and not forzar_entrenamiento,
+                    por_categoria=por_categoria_entrenamiento
+                )
+                if exito:
+                    st.session_state["trabajo_entrenamiento"] = id_trabajo
+                    st.rerun()
+                else:
+                    st.error(mensaje)
         
         with col_btn2:
             # Botón de reset (nuevo)
@@ -229,6 +261,44 @@ with col4:
         if not datos_validos:
             st.caption("Datos insuficientes")
 
+# Progreso del entrenamiento en segundo plano (se consulta cada 2 segundos)
+@st.fragment(run_every=2)
+def mostrar_progreso_entrenamiento():
+    activo = gestor_entrenamiento.trabajo_activo()
+    
+    if activo is not None:
+        st.session_state["trabajo_entrenamiento"] = activo["id"]
+        fase = activo.get("fase") or "en cola"
+        if activo.get("tipo") == TIPO_BUSQUEDA:
+            texto = f"🔬 Buscando hiperparámetros (presupuesto {activo.get('presupuesto_s')}s) — {fase}"
+        else:
+            texto = f"🔄 Entrenando modelo ({activo.get('motor')}) — fase: {fase}"
+        st.progress(float(activo.get("progreso") or 0.0), text=texto)
+        if es_admin() and st.button("⏹️ Cancelar entrenamiento", key="cancel_train_btn"):
+            _, mensaje = gestor_entrenamiento.cancelar(activo["id"])
+            st.info(mensaje)
+        return
+    
+    # El trabajo ha terminado: refrescar la página completa con el nuevo modelo
+    id_trabajo = st.session_state.pop("trabajo_entrenamiento", None)
+    estado = gestor_entrenamiento.estado(id_trabajo) if id_trabajo else None
+    if estado is not None:
+        st.session_state["resultado_entrenamiento"] = (estado.get("estado"), estado.get("mensaje", ""))
+    st.rerun(scope="app")
+
+if trabajo_activo is not None or "trabajo_entrenamiento" in st.session_state:
+    mostrar_progreso_entrenamiento()
+
+if "resultado_entrenamiento" in st.session_state:
+    estado_final, mensaje_final = st.session_state.pop("resultado_entrenamiento")
+    if estado_final == ESTADO_COMPLETADO:
+        st.success(mensaje_final)
+        st.balloons()
+    elif estado_final == ESTADO_CANCELADO:
+        st.info(f"⏹️ {mensaje_final}")
+    else:
+        st.error(mensaje_final)
+
 # Línea divisoria
 st.markdown("---")
 
@@ -527,6 +597,28 @@ with tab1:
                                 st.error(f"Error al generar gráfico: {str(e)}")
                         else:
                             st.error(f"❌ {mensaje}")
+                
+                # Vista de todas las categorías a la vez (cubo de carga)
+                with st.expander("🏟️ Carga semanal de todo el club"):
+                    resumen_club, mensaje_club = predictor.predecir_carga_club(df_planif)
+                    
+                    if resumen_club is not None:
+                        st.dataframe(
+                            resumen_club.rename(columns={
+                                'categoria': 'Categoría',
+                                'total_principios_semana': 'Principios/Semana',
+                                'promedio_por_dia': 'Promedio/Día',
+                                'desviacion': 'Desviación',
+                                'microciclos_analizados': 'Microciclos',
+                                'rango_min': 'Mínimo',
+                                'rango_max': 'Máximo',
+                                'dias_activos': 'Días Activos'
+                            }).round(1),
+                            use_container_width=True,
+                            hide_index=True
+                        )
+                    else:
+                        st.info(mensaje_club)
         except Exception as e:
             st.error(f"Error inesperado: {str(e)}")
 
@@ -598,6 +690,130 @@ with tab2:
                             st.error(f"❌ {mensaje}")
         except Exception as e:
             st.error(f"Error inesperado: {str(e)}")
+        
+        # Vecinos precalculados por (temporada, categoría, microciclo)
+        st.markdown("##### 🧭 Semanas parecidas por categoría")
+        try:
+            tabla_vecinos = obtener_tabla_vecinos(df_planif)
+            if tabla_vecinos is None:
+                st.info("⏳ Calculando la tabla de vecinos en segundo plano; vuelve a cargar en unos segundos")
+            elif tabla_vecinos.n_unidades < 2:
+                st.warning("Se necesitan al menos 2 microciclos para comparar")
+            else:
+                col1, col2, col3, col4 = st.columns([1, 2, 2, 1])
+                
+                with col1:
+                    temp_vecinos = st.selectbox("Temporada", sorted(set(tabla_vecinos.temporadas)), key="temp_vecinos_sel")
+                
+                with col2:
+                    cats_temp = sorted({c for t, c, m in tabla_vecinos.filas if t == temp_vecinos})
+                    cat_vecinos = st.selectbox("Categoría", cats_temp, key="cat_vecinos_sel")
+                
+                with col3:
+                    micros_cat = sorted(m for t, c, m in tabla_vecinos.filas if t == temp_vecinos and c == cat_vecinos)
+                    micro_vecinos = st.selectbox("Microciclo", micros_cat, key="micro_vecinos_sel")
+                
+                with col4:
+                    solo_categoria = st.checkbox("Solo esta categoría", value=True, key="vecinos_solo_cat")
+                
+                vecinos = tabla_vecinos.vecinos_de(
+                    temp_vecinos, cat_vecinos, micro_vecinos,
+                    ambito=AMBITO_CATEGORIA if solo_categoria else AMBITO_GLOBAL
+                ) or []
+                
+                if vecinos:
+                    st.dataframe(
+                        pd.DataFrame(vecinos)[['temporada', 'categoria', 'microciclo', 'porcentaje']].rename(columns={
+                            'temporada': 'Temporada', 'categoria': 'Categoría', 'microciclo': 'Microciclo',
+                            'porcentaje': 'Similitud'
+                        }),
+                        use_container_width=True, hide_index=True
+                    )
+                else:
+                    st.caption("Sin microciclos con los que comparar en este ámbito")
+        except Exception as e:
+            st.error(f"Error al consultar la tabla de vecinos: {str(e)}")
+        
+        # Búsqueda por principios sobre los bitsets de todas las semanas
+        st.markdown("##### 🧩 Buscar semanas por principios")
+        try:
+            conjuntos = obtener_conjuntos_principios()
+            col1, col2 = st.columns([3, 1])
+            
+            with col1:
+                principios_buscar = st.multiselect("Principios", conjuntos.espacio.principios, key="bits_principios_sel")
+            
+            with col2:
+                modo_busqueda = st.radio("Semanas que usaron", ["todos", "alguno"], horizontal=True, key="bits_modo")
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                dia_buscar = st.selectbox("Día", ["(cualquiera)"] + DIAS_SEMANA, key="bits_dia")
+            with col2:
+                bloque_buscar = st.selectbox("Bloque", BLOQUES_SESION, key="bits_bloque", disabled=dia_buscar == "(cualquiera)")
+            with col3:
+                cat_buscar = st.selectbox("Categoría", ["(todas)"] + sorted(conjuntos.semanas['categoria'].unique()), key="bits_cat")
+            
+            if principios_buscar:
+                encontradas = conjuntos.buscar(
+                    principios_buscar, modo=modo_busqueda,
+                    franja=None if dia_buscar == "(cualquiera)" else (dia_buscar, bloque_buscar),
+                    categoria=None if cat_buscar == "(todas)" else cat_buscar,
+                    limite=50
+                )
+                st.caption(f"{len(encontradas)} semanas de {conjuntos.n_semanas}")
+                if not encontradas.empty:
+                    encontradas['jaccard'] = (encontradas['jaccard'] * 100).map("{:.1f}%".format)
+                    st.dataframe(
+                        encontradas.rename(columns={
+                            'id_temporada': 'Temporada', 'categoria': 'Categoría', 'nombre_microciclo': 'Microciclo',
+                            'comunes': 'En común', 'jaccard': 'Jaccard', 'principios_semana': 'Principios semana'
+                        }),
+                        use_container_width=True, hide_index=True
+                    )
+        except Exception as e:
+            st.error(f"Error en la búsqueda por principios: {str(e)}")
+        
+        # Semana siguiente a partir de esta (transiciones entre semanas consecutivas)
+        st.markdown("##### ⏭️ Sugerir la semana siguiente")
+        try:
+            columnas_semana = ['id_temporada', 'categoria', 'nombre_microciclo']
+            if any(c not in df_planif.columns for c in columnas_semana):
+                st.warning("Faltan columnas necesarias para el análisis")
+            else:
+                semanas_planif = df_planif[columnas_semana].dropna().drop_duplicates()
+                col1, col2, col3 = st.columns([2, 2, 1])
+                
+                with col1:
+                    cat_siguiente = st.selectbox("Categoría", sorted(semanas_planif['categoria'].astype(str).unique()), key="sig_cat_sel")
+                
+                with col2:
+                    semanas_cat = semanas_planif[semanas_planif['categoria'].astype(str) == cat_siguiente]
+                    semana_actual = st.selectbox(
+                        "Semana planificada",
+                        list(semanas_cat[['id_temporada', 'nombre_microciclo']].itertuples(index=False, name=None)),
+                        format_func=lambda s: f"{s[1]} (temporada {s[0]})",
+                        key="sig_semana_sel"
+                    )
+                
+                with col3:
+                    n_siguiente = st.number_input("N° por franja", min_value=1, max_value=5, value=3, key="sig_n_input")
+                
+                if semana_actual and st.button("⏭️ Sugerir", key="sig_btn"):
+                    sugerencias_sig, mensaje_sig = predictor.sugerir_siguiente_microciclo(
+                        df_planif, semana_actual[0], cat_siguiente, semana_actual[1], n_siguiente
+                    )
+                    filas_sig = [
+                        {'Día': dia, 'Bloque': bloque, 'Principio': s['principio'], 'Probabilidad': s['porcentaje']}
+                        for (dia, bloque), lista in sugerencias_sig.items() for s in lista
+                    ]
+                    if filas_sig:
+                        st.success(f"✅ {mensaje_sig}")
+                        st.dataframe(pd.DataFrame(filas_sig), use_container_width=True, hide_index=True)
+                    else:
+                        st.info(f"ℹ️ {mensaje_sig}")
+        except Exception as e:
+            st.error(f"Error al sugerir la semana siguiente: {str(e)}")
 
 with tab3:
     st.subheader("📊 Estadísticas del Modelo")
@@ -617,6 +833,9 @@ with tab3:
                 st.write(f"- F1 Score: {f1*100:.2f}%")
                 st.write(f"- Fecha de entrenamiento: {stats.get('fecha_entrenamiento', 'N/A')}")
                 st.write(f"- Versión del modelo: {stats.get('version', 'N/A')}")
+                st.write(f"- Motor: {stats.get('motor', 'N/A')}")
+                if stats.get('modo') == 'incremental':
+                    st.write(f"- Incrementos desde el último entrenamiento completo: {stats.get('incrementos', 0)}")
             
             with col2:
                 st.markdown("**Datos de Entrenamiento:**")
@@ -625,6 +844,40 @@ with tab3:
                 st.write(f"- Total principios: {stats.get('total_principios', 0)}")
                 st.write(f"- Días únicos: {len(stats.get('dias', []))}")
             
+            # Modelos por categoría
+            if stats.get('por_categoria'):
+                st.markdown("**Modelos por Categoría:**")
+                fragmentos = stats.get('fragmentos') or {}
+                if fragmentos:
+                    df_fragmentos = pd.DataFrame.from_dict(fragmentos, orient='index').rename_axis('Categoría').reset_index()
+                    st.dataframe(
+                        df_fragmentos.rename(columns={
+                            'franjas_entrenamiento': 'Franjas entrenamiento',
+                            'franjas_prueba': 'Franjas prueba',
+                            'principios': 'Principios',
+                            'tiempo_entrenamiento_s': 'Tiempo (s)',
+                            'accuracy': 'Precisión',
+                            'f1_score': 'F1'
+                        }),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                if stats.get('categorias_modelo_global'):
+                    st.caption(f"Con el modelo global (pocos datos): {', '.join(stats['categorias_modelo_global'])}")
+            
+            # Caché de predicciones
+            stats_cache = predictor.obtener_estadisticas_cache()
+            st.markdown("**Caché de Predicciones:**")
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Aciertos", f"{stats_cache['aciertos']:,}")
+            with col2:
+                st.metric("Fallos", f"{stats_cache['fallos']:,}")
+            with col3:
+                st.metric("Tasa de aciertos", f"{stats_cache['tasa_aciertos']*100:.1f}%")
+            with col4:
+                st.metric("Entradas", f"{stats_cache['entradas']}/{stats_cache['capacidad']}")
+            
             # =====================
             # EXPORTACIÓN ESTADÍSTICAS
             # =====================
@@ -779,6 +1032,121 @@ with tab3:
                 if all(col in df_planif.columns for col in ['categoria', 'bloque', 'dia']):
                     combinaciones = df_planif.groupby(['categoria', 'bloque', 'dia']).size()
                     st.metric("Combinaciones únicas", len(combinaciones))
+    
+    # Versiones registradas (rollback instantáneo)
+    versiones_modelo = predictor.listar_versiones()
+    if versiones_modelo:
+        with st.expander(f"🗂️ Versiones del modelo ({len(versiones_modelo)})"):
+            df_versiones = pd.DataFrame([{
+                "Versión": v.get("version"),
+                "Activa": "✅" if v.get("activa") else "",
+                "Fecha": v.get("fecha_entrenamiento") or v.get("fecha_registro", ""),
+                "Motor": v.get("motor", ""),
+                "Modo": v.get("modo", "completo"),
+                "Accuracy": v.get("accuracy"),
+                "F1": v.get("f1_score"),
+                "Ajuste (s)": v.get("tiempo_entrenamiento_s"),
+                "Registros": v.get("total_registros"),
+                "Huella datos": (v.get("huella_datos") or "")[:12],
+            } for v in versiones_modelo])
+            st.dataframe(df_versiones, use_container_width=True, hide_index=True)
+            
+            if es_admin():
+                no_activas = [v["version"] for v in versiones_modelo if not v.get("activa")]
+                if no_activas:
+                    col_v1, col_v2 = st.columns([3, 1])
+                    with col_v1:
+                        version_elegida = st.selectbox("Versión a activar", no_activas, key="version_rollback")
+                    with col_v2:
+                        st.write("")
+                        if st.button("↩️ Activar", use_container_width=True, key="rollback_btn"):
+                            exito, mensaje = activar_version_modelo(version_elegida)
+                            if exito:
+                                st.success(mensaje)
+                                st.rerun()
+                            else:
+                                st.error(mensaje)
+    
+    # Búsqueda de hiperparámetros (solo admin): coste y precisión de cada candidato
+    if es_admin():
+        with st.expander("🔬 Búsqueda de hiperparámetros"):
+            st.caption(
+                "Halving sucesivo con validación cruzada agrupada por categoría y mes, en paralelo y "
+                "con un tiempo máximo. Se registra el coste y la precisión de cada candidato."
+            )
+            col_b1, col_b2, col_b3 = st.columns([1, 1, 1])
+            with col_b1:
+                presupuesto_busqueda = st.number_input(
+                    "Tiempo máximo (s)", min_value=10, max_value=3600, value=PRESUPUESTO_S, step=10, key="presupuesto_busqueda"
+                )
+            with col_b2:
+                candidatos_busqueda = st.number_input(
+                    "Candidatos", min_value=2, max_value=200, value=N_CANDIDATOS, step=1, key="candidatos_busqueda"
+                )
+            with col_b3:
+                st.write("")
+                if st.button("🔬 Lanzar búsqueda", use_container_width=True, key="lanzar_busqueda_btn",
+                             disabled=not datos_validos or trabajo_activo is not None):
+                    info_usuario = obtener_info_usuario() or {}
+                    exito, mensaje, id_trabajo = gestor_entrenamiento.lanzar_busqueda(
+                        df_planif, int(presupuesto_busqueda), int(candidatos_busqueda), usuario=info_usuario.get('usuario')
+                    )
+                    if exito:
+                        st.session_state["trabajo_entrenamiento"] = id_trabajo
+                        st.rerun()
+                    else:
+                        st.error(mensaje)
+            
+            busquedas = predictor.registro.listar_busquedas(limite=1)
+            if busquedas:
+                busqueda = busquedas[0]
+                evaluados = [c for c in busqueda.get("candidatos", []) if "f1" in c]
+                st.markdown(
+                    f"**Última búsqueda** ({busqueda.get('fecha')}): {len(evaluados)} candidatos evaluados en "
+                    f"{busqueda.get('duracion_s', 0):.0f}s de {busqueda.get('presupuesto_s')}s"
+                    + (" — presupuesto agotado" if busqueda.get("agotado") else "")
+                )
+                if evaluados:
+                    df_candidatos = pd.DataFrame([{
+                        "Motor": c["motor"],
+                        "Árboles": c["n_estimators"],
+                        "Profundidad": c["max_depth"] if c["max_depth"] is not None else "sin límite",
+                        "Hojas mín.": c["min_samples_leaf"],
+                        "Características": str(c["max_features"]),
+                        "Ronda": c["ronda"] + 1,
+                        "F1": round(c["f1"], 3),
+                        "Accuracy": round(c["accuracy"], 3),
+                        "Ajuste (s)": c["tiempo_ajuste_s"],
+                        "Latencia 35 franjas (ms)": c["latencia_lote_ms"],
+                        "Nodos": c["nodos"],
+                    } for c in evaluados])
+                    st.dataframe(df_candidatos, use_container_width=True, hide_index=True)
+                    
+                    col_e1, col_e2 = st.columns([3, 1])
+                    with col_e1:
+                        elegido = st.selectbox(
+                            "Candidato a entrenar", range(len(evaluados)), key="candidato_busqueda",
+                            format_func=lambda i: (
+                                f"{evaluados[i]['motor']} · {evaluados[i]['n_estimators']} árboles · "
+                                f"profundidad {evaluados[i]['max_depth']} · F1 {evaluados[i]['f1']:.3f} · "
+                                f"ajuste {evaluados[i]['tiempo_ajuste_s']}s"
+                            )
+                        )
+                    with col_e2:
+                        st.write("")
+                        if st.button("🔄 Entrenar", use_container_width=True, key="entrenar_candidato_btn",
+                                     disabled=not datos_validos or trabajo_activo is not None):
+                            motor_elegido, hiperparametros = hiperparametros_de(evaluados[elegido])
+                            info_usuario = obtener_info_usuario() or {}
+                            exito, mensaje, id_trabajo = gestor_entrenamiento.lanzar(
+                                df_planif, motor=motor_elegido, usuario=info_usuario.get('usuario'),
+                                hiperparametros=hiperparametros
+                            )
+                            if exito:
+                                st.session_state["trabajo_entrenamiento"] = id_trabajo
+                                st.rerun()
+                            else:
+                                st.error(mensaje)
 
 # =====================
 # FOOTER CON INFORMACIÓN